@@ -1,22 +1,60 @@
-import redis
-from flask import Flask, render_template, request, redirect, url_for
+import json
+import os
+from flask import Flask, Response, render_template, request, redirect, url_for, abort
 import time
 from datetime import datetime
 
+import redis_pool
+import registry
+
 # --- НАСТРОЙКИ ---
-REDIS_HOST = 'redis'
-REDIS_PORT = 6379
-BOTS = ['macd_bot', 'sqzmom_bot']
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+SCANNER_ID = 'scanner'
+PROFILE_SECONDS = (10, 30, 60, 120)   # Длительности профилирования на панели
 
 app = Flask(__name__)
-r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+# Пул создается при первом запросе, уже в воркере gunicorn после fork
+r = redis_pool.client('app', host=REDIS_HOST, port=REDIS_PORT)
 
 # --- УТИЛИТЫ ---
-def get_bot_status(bot_id):
+def get_shadow_variants(bot_id):
+    """Итоги теневых вариантов (shadow.py): 'live' первым, остальные по PnL."""
+    raw = r.hgetall(f'bot_shadow:{bot_id}')
+    raw.pop('_meta', None)
+    variants = []
+    for name, value in raw.items():
+        stats = json.loads(value)
+        stats['name'] = name
+        stats['params'] = ', '.join(f"{k}={v}" for k, v in stats['params'].items())
+        variants.append(stats)
+    variants.sort(key=lambda v: (v['name'] != 'live', -v['pnl']))
+    return variants
+
+def get_profile(bot_id):
+    """Состояние последнего профилирования (profiler.py) без самих стеков."""
+    fields = ['state', 'seconds', 'started', 'finished', 'samples', 'overhead_pct']
+    profile = dict(zip(fields, r.hmget(f'bot_profile:{bot_id}', fields)))
+    if not profile['state']:
+        return None
+    ts = profile['finished'] if profile['state'] == 'done' else profile['started']
+    profile['time'] = datetime.fromtimestamp(float(ts)).strftime('%H:%M:%S %d.%m') if ts else 'N/A'
+    return profile
+
+def get_bots():
+    """Экземпляры ботов из реестра (registry.py) и воркеры, которые их запускают."""
+    bots = registry.list_bots(r)
+    owners = registry.lease_owners(r, bots)
+    return [(bot_id, spec, owners[bot_id]) for bot_id, spec in bots.items()]
+
+def get_bot_status(bot_id, spec, worker):
     """Получает статус и статистику бота из Redis."""
     status = r.hgetall(f'bot_status:{bot_id}')
     stats = r.hgetall(f'bot_stats:{bot_id}')
+    triggers = r.hgetall(f'bot_triggers:{bot_id}')
     summary = r.get(f'bot_summary:{bot_id}')
+    shadow = get_shadow_variants(bot_id)
+    profile = get_profile(bot_id)
     
     # Парсинг данных
     running = status.get('running') == '1'
@@ -37,32 +75,66 @@ def get_bot_status(bot_id):
 
     return {
         'id': bot_id,
+        'symbol': spec['symbol'],
+        'worker': worker,
         'running': running,
         'in_position': in_position,
         'status_text': state_message,
         'last_update': last_update,
         'runtime': runtime,
         'stats': stats,
+        'triggers': triggers,
+        'shadow': shadow,
+        'profile': profile,
+        'redis': {k: v for k, v in status.items() if k.startswith('redis_')},
         'summary': summary
     }
 
+def get_scanner_status():
+    """Последний результат сканера всех USDT пар (scanner.py)."""
+    status = r.hgetall(f'{SCANNER_ID}:status')
+    candidates = r.get(f'{SCANNER_ID}:candidates')
+    if not status:
+        return None
+
+    last_update_ts = status.get('last_update')
+    bar_time = status.get('bar_time')
+    return {
+        'candidates': json.loads(candidates) if candidates else [],
+        'symbols': status.get('symbols', 'N/A'),
+        'scan_ms': status.get('scan_ms', 'N/A'),
+        'bar_time': datetime.fromtimestamp(int(bar_time) / 1000).strftime('%H:%M %d.%m') if bar_time else 'N/A',
+        'last_update': datetime.fromtimestamp(float(last_update_ts)).strftime('%H:%M:%S %d.%m') if last_update_ts else 'N/A'
+    }
+
 # --- МАРШРУТЫ ---
 @app.route('/')
 def dashboard():
     """Главная страница с панелью управления."""
-    bot_data = [get_bot_status(bot_id) for bot_id in BOTS]
-    return render_template('dashboard.html', bots=bot_data)
+    bot_data = [get_bot_status(*bot) for bot in get_bots()]
+    return render_template('dashboard.html', bots=bot_data, scanner=get_scanner_status(),
+                           profile_seconds=PROFILE_SECONDS)
 
 @app.route('/command', methods=['POST'])
 def command():
-    """Обработка команд START/STOP."""
+    """Обработка команд START/STOP/PROFILE."""
     bot_id = request.form.get('bot_id')
     action = request.form.get('action')
     
-    if bot_id in BOTS and action in ['START', 'STOP']:
+    if bot_id in registry.list_bots(r) and action in ['START', 'STOP', 'PROFILE']:
         try:
+            if action == 'PROFILE':
+                # Профилирование на N секунд: бот читает PROFILE:<сек> из того же ключа команд
+                seconds = request.form.get('seconds', type=int)
+                if seconds not in PROFILE_SECONDS:
+                    return "Invalid profile duration", 400
+                action = f'PROFILE:{seconds}'
+
             # Отправка команды в Redis
             r.set(f'command:{bot_id}', action)
+            if action in ('START', 'STOP'):
+                # Желаемое состояние: воркер повторит START при запуске экземпляра на новом месте
+                registry.set_run_state(r, bot_id, action)
             
             if action == 'START':
                 # Запись времени старта для расчета времени работы
@@ -77,6 +149,15 @@ def command():
     
     return "Invalid command", 400
 
+@app.route('/profile/<bot_id>')
+def profile(bot_id):
+    """Свернутые стеки последнего профилирования (flamegraph.pl, speedscope.app)."""
+    stacks = r.hget(f'bot_profile:{bot_id}', 'stacks')
+    if not stacks:
+        abort(404)
+    return Response(stacks, mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={bot_id}.folded'})
+
 if __name__ == '__main__':
     # Flask будет запущен через gunicorn/supervisord в Docker
     # Для локального тестирования можно использовать app.run()
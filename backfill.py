@@ -0,0 +1,268 @@
+# Загрузка истории свечей за произвольный период для тестов и исследований:
+#   python backfill.py ETHUSDT BTCUSDT --interval 5m --start 2021-01-01
+# Период делится на страницы по 1000 свечей, страницы скачиваются параллельно
+# через общий пул соединений с учетом веса запросов Binance. Результат - файл
+# data/<SYMBOL>_<interval>.npz (колонки NumPy); повторный запуск докачивает
+# свечи после последней сохраненной и перед первой, если --start раньше нее.
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import msgspec
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+from klines import INTERVAL_MS, parse_klines
+
+# --- НАСТРОЙКИ ---
+BASE_URL = 'https://api.binance.com'
+DATA_DIR = 'data'
+WORKERS = 8
+PAGE_LIMIT = 1000        # Максимум свечей в ответе /api/v3/klines
+PAGE_WEIGHT = 2          # Вес запроса /api/v3/klines
+WEIGHT_LIMIT = 6000      # Лимит веса на IP в минуту
+WEIGHT_SHARE = 0.8       # Доля лимита для загрузчика, остальное - ботам на том же IP
+MAX_ATTEMPTS = 5
+REQUEST_TIMEOUT = 10
+COLUMNS = ('open_time', 'Open', 'High', 'Low', 'Close', 'Volume')
+
+
+# --- БЮДЖЕТ ВЕСА ЗАПРОСОВ ---
+class WeightBudget:
+    """Вес запросов за текущую минуту: резерв перед запросом, ожидание новой минуты при исчерпании.
+
+    Binance считает вес по IP в пределах минуты. Значение заголовка
+    X-MBX-USED-WEIGHT-1M уточняет оценку: вес расходуют и другие процессы.
+    После 429/418 все потоки ждут до blocked_until (Retry-After): запросы во
+    время блокировки продлевают бан IP.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.minute = 0
+        self.used = 0
+        self.blocked_until = 0.0
+        self.waited = 0.0
+
+    def acquire(self, weight):
+        while True:
+            with self.lock:
+                now = time.time()
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                else:
+                    minute = int(now // 60)
+                    if minute != self.minute:
+                        self.minute = minute
+                        self.used = 0
+                    if self.used + weight <= self.limit:
+                        self.used += weight
+                        return
+                    wait = (minute + 1) * 60 - now
+                self.waited += wait
+            time.sleep(wait)
+
+    def update(self, used):
+        with self.lock:
+            if int(time.time() // 60) == self.minute:
+                self.used = max(self.used, used)
+
+    def block(self, seconds):
+        """Запрет запросов всем потокам на seconds (Retry-After ответа 429/418)."""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.time() + seconds)
+
+
+# --- ХРАНЕНИЕ ---
+def store_path(data_dir, symbol, interval):
+    return os.path.join(data_dir, f"{symbol}_{interval}.npz")
+
+
+def load_store(path):
+    """Сохраненные колонки или None, если файла нет."""
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as f:
+        return {name: f[name] for name in COLUMNS}
+
+
+def save_store(path, data):
+    """Атомарная запись: временный файл и замена, прерванный запуск не портит данные."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(f, **{name: data[name] for name in COLUMNS})
+    os.replace(tmp, path)
+
+
+def merge(*parts):
+    """Склеивает колонки и сортирует по времени открытия.
+
+    Повторы не убираются: страницы и хранилище покрывают непересекающиеся
+    диапазоны, повтор - ошибка данных, его находит verify.
+    """
+    parts = [p for p in parts if p is not None and len(p['open_time'])]
+    if not parts:
+        return {name: np.empty(0, dtype=np.int64 if name == 'open_time' else np.float64) for name in COLUMNS}
+    data = {name: np.concatenate([p[name] for p in parts]) for name in COLUMNS}
+    idx = np.argsort(data['open_time'], kind='stable')
+    return {name: data[name][idx] for name in COLUMNS}
+
+
+def verify(open_time, interval_ms):
+    """Возвращает (число повторов, список пропусков [(первый пропущенный, следующий имеющийся)])."""
+    diff = np.diff(open_time)
+    duplicates = int((diff <= 0).sum())
+    gap_idx = np.flatnonzero(diff > interval_ms)
+    gaps = [(int(open_time[i]) + interval_ms, int(open_time[i + 1])) for i in gap_idx]
+    return duplicates, gaps
+
+
+# --- ЗАГРУЗКА ---
+class Downloader:
+    """Параллельная постраничная загрузка /api/v3/klines через общий пул соединений."""
+
+    def __init__(self, base_url=BASE_URL, workers=WORKERS, weight_limit=int(WEIGHT_LIMIT * WEIGHT_SHARE)):
+        self.base_url = base_url.rstrip('/')
+        self.workers = workers
+        self.budget = WeightBudget(weight_limit)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.pool = ThreadPoolExecutor(workers)
+        self.requests = 0
+
+    def close(self):
+        self.pool.shutdown()
+        self.session.close()
+
+    def get_klines(self, symbol, interval, start_ms, end_ms, limit=PAGE_LIMIT):
+        params = {'symbol': symbol, 'interval': interval, 'startTime': start_ms, 'endTime': end_ms, 'limit': limit}
+        for attempt in range(MAX_ATTEMPTS):
+            self.budget.acquire(PAGE_WEIGHT)
+            try:
+                resp = self.session.get(f"{self.base_url}/api/v3/klines", params=params, timeout=REQUEST_TIMEOUT)
+                self.requests += 1
+                used = resp.headers.get('X-MBX-USED-WEIGHT-1M')
+                if used:
+                    self.budget.update(int(used))
+                if resp.status_code in (418, 429):
+                    # Лимит превышен: ни один поток не шлет запросов, пока не пройдет Retry-After
+                    wait = int(resp.headers.get('Retry-After', 60))
+                    self.budget.block(wait)
+                    print(f"Rate limit {resp.status_code} for {symbol}, waiting {wait}s")
+                    continue
+                resp.raise_for_status()
+                return msgspec.json.decode(resp.content)
+            except requests.RequestException as e:
+                print(f"Retry {attempt+1}/{MAX_ATTEMPTS}: {e}")
+                time.sleep(2 ** attempt)
+        raise Exception("Max retries exceeded")
+
+    def first_open_time(self, symbol, interval):
+        """Время открытия первой свечи символа (начало торгов)."""
+        rows = self.get_klines(symbol, interval, 0, int(time.time() * 1000), limit=1)
+        return rows[0][0] if rows else None
+
+    def fetch_range(self, symbol, interval, start_ms, end_ms):
+        """Свечи с временем открытия в [start_ms, end_ms): страницы параллельно, результат по порядку."""
+        step = INTERVAL_MS[interval] * PAGE_LIMIT
+        pages = [(s, min(s + step, end_ms) - 1) for s in range(start_ms, end_ms, step)]
+        results = self.pool.map(lambda page: parse_klines(self.get_klines(symbol, interval, *page)), pages)
+        return merge(*results)
+
+    def fetch_checked(self, symbol, interval, start_ms, end_ms):
+        """fetch_range с проверкой повторов и повторной загрузкой пропусков внутри диапазона."""
+        interval_ms = INTERVAL_MS[interval]
+        start_ms = -(-start_ms // interval_ms) * interval_ms
+        if start_ms >= end_ms:
+            return merge()
+        new = self.fetch_range(symbol, interval, start_ms, end_ms)
+        duplicates, gaps = verify(new['open_time'], interval_ms)
+        if duplicates:
+            raise ValueError(f"{symbol}: {duplicates} duplicate klines in fetched pages")
+        if gaps:
+            # Повторная загрузка пропусков; оставшиеся - пропуски на бирже (техработы)
+            new = merge(new, *(self.fetch_range(symbol, interval, a, b) for a, b in gaps))
+        return new
+
+    def backfill(self, symbol, interval, start_ms, end_ms, data_dir=DATA_DIR):
+        """Докачивает свечи символа в файл хранилища; возвращает итог загрузки."""
+        interval_ms = INTERVAL_MS[interval]
+        path = store_path(data_dir, symbol, interval)
+        stored = load_store(path)
+        # Только закрытые свечи: граница - открытие текущей свечи
+        end_ms = min(end_ms, int(time.time() * 1000) // interval_ms * interval_ms)
+
+        # Диапазоны загрузки: после последней сохраненной свечи и, если --start
+        # раньше первой сохраненной, начало истории. Каждый проверяется отдельно:
+        # сохраненный период между ними - не пропуск
+        ranges = []
+        if stored is not None and len(stored['open_time']):
+            first = int(stored['open_time'][0])
+            if -(-start_ms // interval_ms) * interval_ms < first:
+                listed = self.first_open_time(symbol, interval)
+                ranges.append((max(start_ms, listed if listed is not None else first), first))
+            ranges.append((max(start_ms, int(stored['open_time'][-1]) + interval_ms), end_ms))
+        else:
+            listed = self.first_open_time(symbol, interval)
+            if listed is None:
+                print(f"{symbol}: no klines")
+                return {'symbol': symbol, 'new': 0, 'total': 0, 'gaps': []}
+            ranges.append((max(start_ms, listed), end_ms))
+
+        new = merge(*(self.fetch_checked(symbol, interval, a, b) for a, b in ranges))
+        data = merge(stored, new)
+        duplicates, gaps = verify(data['open_time'], interval_ms)
+        if duplicates:
+            raise ValueError(f"{symbol}: {duplicates} duplicate klines after merge")
+        if len(new['open_time']):
+            save_store(path, data)
+
+        for a, b in gaps:
+            print(f"{symbol}: gap {(b - a) // interval_ms} klines from {datetime.fromtimestamp(a / 1000, timezone.utc):%Y-%m-%d %H:%M}")
+        return {'symbol': symbol, 'new': len(new['open_time']), 'total': len(data['open_time']), 'gaps': gaps}
+
+
+def parse_date(value):
+    return int(datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Загрузка истории свечей Binance в файлы .npz')
+    parser.add_argument('symbols', nargs='+')
+    parser.add_argument('--interval', default='5m', choices=sorted(INTERVAL_MS))
+    parser.add_argument('--start', default='2020-01-01', help='YYYY-MM-DD (UTC)')
+    parser.add_argument('--end', default=None, help='YYYY-MM-DD (UTC), по умолчанию - сейчас')
+    parser.add_argument('--dir', default=DATA_DIR)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--base-url', default=BASE_URL)
+    args = parser.parse_args(argv)
+
+    start_ms = parse_date(args.start)
+    end_ms = parse_date(args.end) if args.end else int(time.time() * 1000)
+    downloader = Downloader(args.base_url, args.workers)
+    started = time.perf_counter()
+    try:
+        for symbol in args.symbols:
+            result = downloader.backfill(symbol.upper(), args.interval, start_ms, end_ms, args.dir)
+            print(f"{result['symbol']}: +{result['new']} klines, total {result['total']}, gaps {len(result['gaps'])}")
+    finally:
+        downloader.close()
+    elapsed = time.perf_counter() - started
+    print(f"Done in {elapsed:.1f}s: {downloader.requests} requests, rate limit wait {downloader.budget.waited:.1f}s")
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"Critical error: {e}")
+        sys.exit(1)
@@ -0,0 +1,152 @@
+"""Загрузчик истории (backfill.py) против локального mock REST сервера.
+
+Сервер отдает детерминированные свечи /api/v3/klines с задержкой ответа,
+заголовком X-MBX-USED-WEIGHT-1M, пропуском данных (техработы) и одним ответом 429.
+Проверяются полнота и значения, возобновление после частичной записи
+(докачка хвоста и начала истории при --start раньше первой сохраненной свечи),
+скорость при 1 и WORKERS потоках, отсутствие запросов в течение Retry-After
+и отказ от записи, если страницы перекрываются.
+
+Запуск: python benchmarks/bench_backfill.py [дней 5m истории]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import backfill
+
+INTERVAL = '5m'
+STEP = 300_000
+LISTED = 1_600_000_200_000 // STEP * STEP   # Начало торгов
+GAP = (LISTED + 1000 * STEP, LISTED + 1012 * STEP)  # Пропуск на бирже
+LATENCY = 0.02
+RETRY_AFTER = 2
+
+
+def expected_open_times(end_ms):
+    t = np.arange(LISTED, end_ms, STEP, dtype=np.int64)
+    return t[(t < GAP[0]) | (t >= GAP[1])]
+
+
+def price(t):
+    return 1000 + (t // STEP) % 997 * 0.5
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    lock = threading.Lock()
+    requests = 0
+    throttled = False
+    overlap = False   # Страницы начинаются на свечу раньше запрошенного (повтор на стыке)
+    blocked_until = 0.0
+    during_block = 0  # Запросы до истечения Retry-After
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = {k: int(v[0]) if v[0].lstrip('-').isdigit() else v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+        with MockHandler.lock:
+            MockHandler.requests += 1
+            count = MockHandler.requests
+            MockHandler.during_block += time.time() < MockHandler.blocked_until
+            throttle = count == 20 and not MockHandler.throttled
+            MockHandler.throttled |= throttle
+            if throttle:
+                MockHandler.blocked_until = time.time() + RETRY_AFTER
+        time.sleep(LATENCY)
+        if throttle:
+            self.send_response(429)
+            self.send_header('Retry-After', str(RETRY_AFTER))
+            self.end_headers()
+            return
+
+        start = max(query['startTime'] - (STEP if MockHandler.overlap else 0), LISTED)
+        start = -(-start // STEP) * STEP
+        times = np.arange(start, query['endTime'] + 1, STEP, dtype=np.int64)
+        times = times[(times < GAP[0]) | (times >= GAP[1])][:query['limit']]
+        rows = [[int(t), f"{price(t):.2f}", f"{price(t) + 1:.2f}", f"{price(t) - 1:.2f}", f"{price(t) + 0.5:.2f}",
+                 "12.5", int(t) + STEP - 1, "0", 10, "0", "0", "0"] for t in times]
+        body = json.dumps(rows).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-MBX-USED-WEIGHT-1M', str(count * backfill.PAGE_WEIGHT))
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def run(base_url, data_dir, end_ms, workers):
+    downloader = backfill.Downloader(base_url, workers, weight_limit=10 ** 9)
+    start = time.perf_counter()
+    try:
+        result = downloader.backfill('ETHUSDT', INTERVAL, 0, end_ms, data_dir)
+    finally:
+        downloader.close()
+    return time.perf_counter() - start, downloader.requests, result
+
+
+def check(data_dir, end_ms):
+    data = backfill.load_store(backfill.store_path(data_dir, 'ETHUSDT', INTERVAL))
+    expected = expected_open_times(end_ms)
+    ok = np.array_equal(data['open_time'], expected) and np.allclose(data['Close'], price(expected) + 0.5)
+    return ok, len(expected)
+
+
+if __name__ == '__main__':
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 365
+    end_ms = LISTED + days * 288 * STEP
+    server = ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    data_dir = tempfile.mkdtemp()
+
+    try:
+        for workers in (1, backfill.WORKERS):
+            shutil.rmtree(data_dir, ignore_errors=True)
+            elapsed, requests, result = run(base_url, data_dir, end_ms, workers)
+            ok, n = check(data_dir, end_ms)
+            print(f"{workers} workers: {n} klines in {elapsed:.2f}s ({requests} requests), "
+                  f"gaps {len(result['gaps'])}, {'OK' if ok else 'MISMATCH'}")
+        print(f"requests during Retry-After {RETRY_AFTER}s: {MockHandler.during_block}")
+
+        # Возобновление: обрезаем файл и докачиваем хвост
+        path = backfill.store_path(data_dir, 'ETHUSDT', INTERVAL)
+        data = backfill.load_store(path)
+        backfill.save_store(path, {k: v[:len(v) // 2] for k, v in data.items()})
+        elapsed, requests, result = run(base_url, data_dir, end_ms, backfill.WORKERS)
+        ok, _ = check(data_dir, end_ms)
+        print(f"resume: +{result['new']} klines in {elapsed:.2f}s ({requests} requests), {'OK' if ok else 'MISMATCH'}")
+
+        # --start раньше первой сохраненной свечи: докачиваем начало истории
+        data = backfill.load_store(path)
+        backfill.save_store(path, {k: v[len(v) // 2:] for k, v in data.items()})
+        elapsed, requests, result = run(base_url, data_dir, end_ms, backfill.WORKERS)
+        ok, _ = check(data_dir, end_ms)
+        print(f"resume head: +{result['new']} klines in {elapsed:.2f}s ({requests} requests), {'OK' if ok else 'MISMATCH'}")
+
+        elapsed, requests, result = run(base_url, data_dir, end_ms, backfill.WORKERS)
+        print(f"up to date: +{result['new']} klines ({requests} requests)")
+        print(f"file size: {os.path.getsize(path) / 1024:.0f} KiB")
+
+        # Перекрывающиеся страницы: загрузка прерывается, файл не пишется
+        shutil.rmtree(data_dir, ignore_errors=True)
+        MockHandler.overlap = True
+        try:
+            run(base_url, data_dir, end_ms, backfill.WORKERS)
+            print("overlapping pages: written, MISMATCH")
+        except ValueError as e:
+            print(f"overlapping pages: {e}, file written: {os.path.exists(path)}")
+        MockHandler.overlap = False
+    finally:
+        server.shutdown()
+        shutil.rmtree(data_dir, ignore_errors=True)
@@ -0,0 +1,114 @@
+"""Сравнение пропускной способности разбора сообщений WebSocket.
+
+Старый путь: json.loads каждого сообщения + проверка data['k']['x'].
+Новый путь: предфильтр '"x":true' + msgspec сразу в буфер NumPy.
+С тиками (вход внутри бара, bot-macd.py): незакрытые обновления разбираются
+до интервала и цены (decode_tick), против полного decode_kline каждого сообщения.
+
+Запуск: python benchmarks/bench_decode.py [кол-во символов]
+"""
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from decoder import is_closed_kline, decode_kline, decode_tick
+from klines import KlineBuffer
+
+UPDATES_PER_CANDLE = 150  # 5m свеча, обновление каждые ~2с
+
+
+def make_messages(symbols, candles):
+    messages = []
+    for n in range(candles):
+        open_time = 1_700_000_000_000 + n * 300_000
+        for u in range(UPDATES_PER_CANDLE):
+            closed = u == UPDATES_PER_CANDLE - 1
+            for s in symbols:
+                price = 100 + random.random()
+                messages.append(json.dumps({
+                    "e": "kline", "E": open_time + u * 2000, "s": s,
+                    "k": {
+                        "t": open_time, "T": open_time + 299_999, "s": s, "i": "5m",
+                        "f": 100, "L": 200, "o": f"{price:.4f}", "c": f"{price:.4f}",
+                        "h": f"{price + 1:.4f}", "l": f"{price - 1:.4f}", "v": "1000.5",
+                        "n": 100, "x": closed, "q": "1.0000", "V": "500", "Q": "0.500", "B": "0"
+                    }
+                }, separators=(',', ':')))
+    return messages
+
+
+def old_path(messages, buffers):
+    for message in messages:
+        data = json.loads(message)
+        if data.get('e') == 'kline' and data['k']['x']:
+            k = data['k']
+            buffers[k['s']].add(int(k['t']), float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v']))
+
+
+def new_path(messages, buffers):
+    for message in messages:
+        if not is_closed_kline(message):
+            continue
+        k = decode_kline(message)
+        if k is not None:
+            buffers[k.s].add_kline(k)
+
+
+def full_tick_path(messages, buffers, ticks):
+    for message in messages:
+        k = decode_kline(message)
+        if k is None:
+            continue
+        if k.x:
+            buffers[k.s].add_kline(k)
+        else:
+            ticks.append(k.c)
+
+
+def tick_path(messages, buffers, ticks):
+    for message in messages:
+        if not is_closed_kline(message):
+            tick = decode_tick(message)
+            if tick is not None:
+                ticks.append(tick.c)
+            continue
+        k = decode_kline(message)
+        if k is not None:
+            buffers[k.s].add_kline(k)
+
+
+def run(path, messages, symbols, *args):
+    buffers = {s: KlineBuffer('5m') for s in symbols}
+    start = time.perf_counter()
+    path(messages, buffers, *args)
+    elapsed = time.perf_counter() - start
+    return len(messages) / elapsed, buffers
+
+
+if __name__ == '__main__':
+    n_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    symbols = [f"SYM{i}USDT" for i in range(n_symbols)]
+    messages = make_messages(symbols, candles=2)
+    print(f"{len(messages)} messages, {n_symbols} symbols")
+
+    old_rate, old_buffers = run(old_path, messages, symbols)
+    new_rate, new_buffers = run(new_path, messages, symbols)
+    for s in symbols:
+        assert (old_buffers[s].close == new_buffers[s].close).all()
+
+    print(f"json.loads:       {old_rate:12,.0f} msg/s")
+    print(f"prefilter+msgspec: {new_rate:12,.0f} msg/s  (x{new_rate / old_rate:.1f})")
+
+    full_ticks, ticks = [], []
+    full_rate, full_buffers = run(full_tick_path, messages, symbols, full_ticks)
+    tick_rate, tick_buffers = run(tick_path, messages, symbols, ticks)
+    assert full_ticks == ticks
+    for s in symbols:
+        assert (full_buffers[s].close == tick_buffers[s].close).all()
+    print("with ticks:")
+    print(f"decode_kline all:  {full_rate:12,.0f} msg/s")
+    print(f"decode_tick:       {tick_rate:12,.0f} msg/s  (x{tick_rate / full_rate:.1f})")
@@ -0,0 +1,98 @@
+"""Распределение экземпляров ботов между воркерами и время переезда при отказе.
+
+Нужен локальный Redis (REDIS_HOST/REDIS_PORT, по умолчанию 127.0.0.1:6379):
+реестр на время проверки заменяется тестовыми экземплярами и затем
+восстанавливается. Запускаются несколько процессов worker.py, затем:
+добавление воркера (перебалансировка), SIGKILL воркера (переезд после
+истечения аренды) и SIGTERM воркера (аренда освобождается сразу).
+
+Запуск: python benchmarks/bench_failover.py [экземпляров] [воркеров]
+"""
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import redis
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import registry
+
+REDIS_HOST = os.environ.get('REDIS_HOST', '127.0.0.1')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+SCRIPTS = ['bot-macd.py', 'bot-sqzmom.py']
+
+
+def start_worker(worker_id):
+    env = dict(os.environ, WORKER_ID=worker_id, REDIS_HOST=REDIS_HOST, REDIS_PORT=str(REDIS_PORT))
+    return subprocess.Popen([sys.executable, 'worker.py'], cwd=ROOT, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def assignment(r, bots):
+    """{воркер: [экземпляры]} по аренде; экземпляры без аренды - под ключом None."""
+    result = {}
+    for bot_id, owner in registry.lease_owners(r, bots).items():
+        result.setdefault(owner, []).append(bot_id)
+    return result
+
+
+def wait_for(r, bots, condition, timeout=30):
+    start = time.time()
+    while time.time() - start < timeout:
+        current = assignment(r, bots)
+        if condition(current):
+            return time.time() - start, current
+        time.sleep(0.05)
+    raise TimeoutError(f"condition not reached: {assignment(r, bots)}")
+
+
+def balanced(alive):
+    def check(current):
+        if None in current or set(current) - set(alive):
+            return False
+        sizes = [len(current.get(w, [])) for w in alive]
+        return max(sizes) - min(sizes) <= 1
+    return check
+
+
+def show(title, elapsed, current):
+    layout = ', '.join(f"{w}: {len(b)}" for w, b in sorted(current.items(), key=lambda x: str(x[0])))
+    print(f"{title:28s} {elapsed:5.2f}s ({elapsed / registry.HEARTBEAT_INTERVAL:.1f} heartbeats)  [{layout}]")
+
+
+if __name__ == '__main__':
+    instances = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+    saved = r.hgetall(registry.REGISTRY_KEY)
+    r.delete(registry.REGISTRY_KEY, registry.WORKERS_KEY)
+    for i in range(instances):
+        registry.add_bot(r, f'bench_bot_{i}', SCRIPTS[i % len(SCRIPTS)], 'ETHUSDT')
+    bots = registry.list_bots(r)
+
+    workers = {f'w{i + 1}': start_worker(f'w{i + 1}') for i in range(count)}
+    try:
+        show(f'{count} workers start', *wait_for(r, bots, balanced(list(workers))))
+
+        workers[f'w{count + 1}'] = start_worker(f'w{count + 1}')
+        show('worker added', *wait_for(r, bots, balanced(list(workers))))
+
+        workers.pop('w1').send_signal(signal.SIGKILL)
+        show('SIGKILL w1 (lease expiry)', *wait_for(r, bots, balanced(list(workers))))
+
+        process = workers.pop('w2')
+        process.send_signal(signal.SIGTERM)
+        show('SIGTERM w2 (lease release)', *wait_for(r, bots, balanced(list(workers))))
+        process.wait(30)
+    finally:
+        for process in workers.values():
+            process.send_signal(signal.SIGTERM)
+        for process in workers.values():
+            process.wait(30)
+        r.delete(registry.REGISTRY_KEY, registry.WORKERS_KEY, *(registry.lease_key(b) for b in bots))
+        if saved:
+            r.hset(registry.REGISTRY_KEY, mapping=saved)
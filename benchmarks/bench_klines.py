@@ -0,0 +1,56 @@
+"""Сравнение разбора ответа REST API: DataFrame из строк против колонок NumPy.
+
+Запуск: python benchmarks/bench_klines.py [кол-во свечей]
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from klines import parse_klines
+
+
+def make_rows(n):
+    rows = []
+    for i in range(n):
+        t = 1_700_000_000_000 + i * 300_000
+        price = 3000 + (i % 100) * 0.37
+        rows.append([t, f"{price:.8f}", f"{price + 2:.8f}", f"{price - 2:.8f}", f"{price + 1:.8f}",
+                     "1234.56780000", t + 299_999, "3703703.70000000", 1500, "617.28390000", "1851851.85000000", "0"])
+    return rows
+
+
+def old_parse(rows):
+    df = pd.DataFrame(rows, columns=['open_time', 'Open', 'High', 'Low', 'Close', 'Volume', 'close_time', 'qav', 'trades', 'tbav', 'tqav', 'ignore'])
+    df['Close'] = pd.to_numeric(df['Close'])
+    df['High'] = pd.to_numeric(df['High'])
+    df['Low'] = pd.to_numeric(df['Low'])
+    df['Open'] = pd.to_numeric(df['Open'])
+    return df
+
+
+def best_time(func, rows, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(rows)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rows = make_rows(n)
+
+    old_time, df = best_time(old_parse, rows)
+    new_time, data = best_time(parse_klines, rows)
+    old_mem = df.memory_usage(deep=True).sum()
+    new_mem = sum(a.nbytes for a in data.values())
+
+    print(f"{n} candles")
+    print(f"DataFrame:  {old_time * 1000:8.2f} ms  {old_mem / 1024:10.1f} KiB")
+    print(f"NumPy:      {new_time * 1000:8.2f} ms  {new_mem / 1024:10.1f} KiB")
+    print(f"speedup x{old_time / new_time:.1f}, memory x{old_mem / new_mem:.1f}")
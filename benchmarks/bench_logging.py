@@ -0,0 +1,121 @@
+"""Стоимость вывода в торговом потоке: print() против botlog (очередь + фоновый поток).
+
+stdout - pipe с медленным читателем (как supervisord под нагрузкой): читатель
+забирает READ_CHUNK байт раз в READ_DELAY сек. print() блокирует поток, как
+только буфер pipe заполнен; botlog только ставит запись в очередь.
+Вызовы идут подряд, поэтому время botlog включает конкуренцию за GIL с
+фоновым потоком, занятым форматированием; при обычном темпе (несколько
+событий на свечу) фоновый поток простаивает.
+Журнал пишется во временный каталог; у него своя очередь, события entry в
+нем должны быть все, сколько бы записей ни отбросил медленный stdout.
+
+Запуск: python benchmarks/bench_logging.py
+"""
+import gzip
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import botlog
+
+CALLS = 20000
+READ_CHUNK = 4096
+READ_DELAY = 0.01
+
+
+def slow_pipe():
+    """Файл для записи, читаемый медленным потоком; возвращает (файл, остановка)."""
+    r, w = os.pipe()
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            if not os.read(r, READ_CHUNK):
+                break
+            time.sleep(READ_DELAY)
+        # Дочитываем остаток без задержки, чтобы писатель не завис при закрытии
+        while os.read(r, 1 << 16):
+            pass
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    return os.fdopen(w, 'w', buffering=1), stop
+
+
+def timed(fn):
+    samples = np.empty(CALLS)
+    for i in range(CALLS):
+        start = time.perf_counter()
+        fn(i)
+        samples[i] = time.perf_counter() - start
+    return samples * 1e6
+
+
+def report(name, us):
+    print(f"{name:34s} mean {us.mean():8.2f} us  p99 {np.percentile(us, 99):8.2f} us  "
+          f"max {us.max() / 1000:8.2f} ms  total {us.sum() / 1e6:6.2f} s")
+
+
+def main():
+    price, size = 3150.25, 630.05
+    real_stdout = sys.stdout
+
+    # 1. print() в медленный pipe
+    pipe, stop = slow_pipe()
+    sys.stdout = pipe
+    try:
+        us_print = timed(lambda i: print(f"Enter LONG: Price {price + i:.2f}, Size {size:.2f} USDT, SL {price:.2f}, TP {price:.2f}"))
+    finally:
+        sys.stdout = real_stdout
+        stop.set()
+
+    # 2. botlog: тот же медленный pipe как stdout, журнал во временный каталог
+    pipe, stop = slow_pipe()
+    tmp = tempfile.mkdtemp()
+    sys.stdout = pipe
+    try:
+        log = botlog.setup('bench', log_dir=tmp)
+    finally:
+        sys.stdout = real_stdout
+    us_event = timed(lambda i: botlog.event(log, 'entry', "Enter %s: Price %.2f, Size %.2f USDT, SL %.2f, TP %.2f",
+                                            'LONG', price + i, size, price, price,
+                                            side='LONG', price=price + i, size_usdt=size, sl=price, tp=price))
+    us_info = timed(lambda i: log.info("Backfilled %d %s candles", i, '5m'))
+    us_error = timed(lambda i: log.error("WebSocket message error: %s", 'bad frame'))
+    us_debug = timed(lambda i: log.debug("Tick %.2f", price))
+    stats = botlog.stats()
+    started = time.perf_counter()
+    botlog.shutdown()
+    drain = time.perf_counter() - started
+    stop.set()
+
+    print(f"{CALLS} calls each, stdout = pipe read {READ_CHUNK} B per {READ_DELAY * 1000:.0f} ms")
+    report("print() (blocking)", us_print)
+    report("botlog.event entry (+journal)", us_event)
+    report("log.info", us_info)
+    report("log.error (rate-limited)", us_error)
+    report("log.debug (level disabled)", us_debug)
+    print(f"botlog: dropped {stats['dropped']}, suppressed errors {stats['suppressed']}, "
+          f"queue drained in background in {drain:.2f} s after the hot path finished")
+    journal = os.path.join(tmp, 'bench.jsonl')
+    entries = 0
+    for name in os.listdir(tmp):
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(os.path.join(tmp, name), 'rt', encoding='utf-8') as f:
+            entries += sum('"event": "entry"' in line for line in f)
+    print(f"journal: {entries}/{CALLS} entry events {'OK' if entries == CALLS else 'LOST'}")
+    size_mb = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp)) / 1e6
+    print(f"journal: {journal} and {len(os.listdir(tmp)) - 1} rotated .gz files, {size_mb:.1f} MB total")
+    logging.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""Накладные расходы сэмплирующего профайлера (profiler.py) на обработку свечей.
+
+Поток 'candles' в цикле считает индикаторы бота MACD (MACD 15m, облако EMA 5m)
+и шадоу-варианты SQZMOM на буфере из 500 баров; еще несколько потоков
+простаивают, как фоновые потоки бота. Сравнивается число свечей в секунду
+без профайлера и с профайлером на разных периодах сэмплирования; для
+последнего прогона выводятся самые частые функции на вершине стека.
+
+Запуск: python benchmarks/bench_profiler.py [сек на прогон]
+"""
+import collections
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import indicators
+from profiler import SamplingProfiler
+from shadow import IndicatorCache
+
+BARS = 500
+IDLE_THREADS = 4
+
+
+def process_candle(data):
+    indicators.macd(data['Close'], 20, 30, 9)
+    for p in (50, 100):
+        indicators.ema(data['Close'], p)
+    cache = IndicatorCache(data)
+    for bb_mult in (1.6, 1.8, 2.0, 2.2):
+        cache.squeeze_momentum(30, bb_mult, 30, 1.9, 14)
+
+
+def run(data, seconds, interval=None):
+    """Свечей в секунду в потоке 'candles'; с interval - под профайлером."""
+    profiler = SamplingProfiler(interval) if interval else None
+    done = threading.Event()
+    count = [0]
+
+    def candles():
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            process_candle(data)
+            count[0] += 1
+        done.set()
+
+    thread = threading.Thread(target=candles, name='candles')
+    if profiler:
+        profiler.start(seconds + 1)
+    thread.start()
+    thread.join()
+    if profiler:
+        profiler.stop()
+    return count[0] / seconds, profiler
+
+
+def top_leaves(profiler, thread_name, n=8):
+    leaves = collections.Counter()
+    for stack, count in profiler.stacks.items():
+        frames = stack.split(';')
+        if frames[0] == thread_name:
+            leaves[frames[-1]] += count
+    total = sum(leaves.values())
+    return [(frame, 100 * count / total) for frame, count in leaves.most_common(n)]
+
+
+if __name__ == '__main__':
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 3.0
+    rng = np.random.default_rng(0)
+    close = 3000 + np.cumsum(rng.normal(0, 2, BARS))
+    data = {'Close': close, 'High': close + rng.random(BARS) * 3, 'Low': close - rng.random(BARS) * 3}
+
+    stop = threading.Event()
+    for i in range(IDLE_THREADS):
+        threading.Thread(target=stop.wait, name=f'idle-{i}', daemon=True).start()
+
+    indicators.warmup()
+    process_candle(data)
+    base, _ = run(data, seconds)
+    print(f"{BARS} bars, {IDLE_THREADS} idle threads, {seconds:.0f}s per run")
+    print(f"profiler off               {base:9.0f} candles/s")
+    profiler = None
+    for interval in (0.01, 0.005, 0.001):
+        rate, profiler = run(data, seconds, interval)
+        print(f"profiler {interval * 1000:4.0f} ms interval   {rate:9.0f} candles/s  "
+              f"slowdown {100 * (base - rate) / base:5.1f}%  samples {profiler.samples:5d}  "
+              f"sampling {profiler.overhead_percent():.2f}% of wall time")
+    stop.set()
+
+    print("\nTop of stack in 'candles' thread (1 ms run):")
+    for frame, share in top_leaves(profiler, 'candles'):
+        print(f"  {share:5.1f}%  {frame}")
+    print(f"\n{len(profiler.stacks)} unique stacks, collapsed size {len(profiler.collapsed()) / 1024:.1f} KiB")
@@ -0,0 +1,149 @@
+"""Общий пул Redis (redis_pool.py): ожидание соединения и задержка при сбое Redis.
+
+1. Потоки (как поток WebSocket, главный цикл и RedisPublisher бота) выполняют
+   команды через пулы разного размера: пропускная способность, среднее и
+   максимальное ожидание соединения, пик занятости. Нужен локальный Redis
+   (REDIS_HOST/REDIS_PORT, по умолчанию 127.0.0.1:6379).
+2. Сбой Redis: сервер, который принимает соединение и не отвечает, и закрытый
+   порт. Время до исключения у клиента из пула против redis.Redis без
+   таймаутов (ждет, пока ждет тест).
+3. fork: дочерний процесс работает через свой пул, а не через сокеты родителя.
+
+Запуск: python benchmarks/bench_redis_pool.py [потоков] [команд на поток]
+"""
+import os
+import socket
+import sys
+import threading
+import time
+
+import redis
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import redis_pool
+
+REDIS_HOST = os.environ.get('REDIS_HOST', '127.0.0.1')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+HANG_LIMIT = 10.0   # Сколько ждать клиента без таймаутов (сек)
+
+
+def load(client, threads, commands):
+    def work(i):
+        for n in range(commands):
+            try:
+                client.set(f'bench_pool:{i}', n)
+                client.get(f'bench_pool:{i}')
+            except redis.ConnectionError:
+                pass   # Пул исчерпан дольше POOL_TIMEOUT - в счетчике timeouts
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - start
+    client.delete(*[f'bench_pool:{i}' for i in range(threads)])
+    return 2 * threads * commands / elapsed
+
+
+def silent_server():
+    """Порт, который принимает соединения и ничего не отвечает (зависший Redis)."""
+    server = socket.socket()
+    server.bind(('127.0.0.1', 0))
+    server.listen(64)
+    accepted = []
+
+    def accept():
+        while True:
+            try:
+                accepted.append(server.accept()[0])
+            except OSError:
+                return
+
+    threading.Thread(target=accept, daemon=True).start()
+    return server, server.getsockname()[1]
+
+
+def closed_port():
+    s = socket.socket()
+    s.bind(('127.0.0.1', 0))
+    port = s.getsockname()[1]
+    s.close()
+    return port
+
+
+def time_to_error(client, threads):
+    """Время до исключения в каждом из threads потоков; None - поток еще ждет."""
+    results = [None] * threads
+
+    def call(i):
+        start = time.perf_counter()
+        try:
+            client.get('bench_pool:x')
+        except Exception as e:
+            results[i] = (time.perf_counter() - start, type(e).__name__)
+
+    workers = [threading.Thread(target=call, args=(i,), daemon=True) for i in range(threads)]
+    for t in workers:
+        t.start()
+    deadline = time.perf_counter() + HANG_LIMIT
+    for t in workers:
+        t.join(max(deadline - time.perf_counter(), 0))
+    return results
+
+
+def print_errors(title, results):
+    done = [r for r in results if r]
+    line = f"{title:34s}"
+    if done:
+        kinds = ', '.join(sorted({kind for _, kind in done}))
+        line += f" {min(t for t, _ in done):5.2f}-{max(t for t, _ in done):5.2f} s  {kinds}"
+    hung = len(results) - len(done)
+    if hung:
+        line += f"  {hung} threads still blocked after {HANG_LIMIT:.0f} s"
+    print(line)
+
+
+if __name__ == '__main__':
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    commands = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    print(f"Load: {threads} threads x {2 * commands} commands, Redis {REDIS_HOST}:{REDIS_PORT}")
+    for size in (2, 4, 8, threads):
+        name = f'load-{size}'
+        client = redis_pool.get_redis(name, host=REDIS_HOST, port=REDIS_PORT, max_connections=size)
+        rate = load(client, threads, commands)
+        s = redis_pool.stats()[name]
+        print(f"pool {size:3d}  {rate:8.0f} cmd/s  wait avg {s['wait_ms_avg']:6.3f} ms  "
+              f"max {s['wait_ms_max']:7.2f} ms  peak {s['in_use_peak']}/{size}  timeouts {s['timeouts']}")
+
+    server, port = silent_server()
+    print(f"\nOutage: 4 threads, pool of 2, socket/connect timeout {redis_pool.SOCKET_TIMEOUT}s, "
+          f"pool timeout {redis_pool.POOL_TIMEOUT}s, {redis_pool.RETRIES} retries")
+    print_errors('silent server, plain redis.Redis', time_to_error(redis.Redis(port=port), 4))
+    print_errors('silent server, redis_pool', time_to_error(
+        redis_pool.get_redis('silent', host='127.0.0.1', port=port, max_connections=2), 4))
+    print_errors('closed port, redis_pool', time_to_error(
+        redis_pool.get_redis('closed', host='127.0.0.1', port=closed_port(), max_connections=2), 4))
+    server.close()
+    for name in ('silent', 'closed'):
+        s = redis_pool.stats()[name]
+        print(f"  {name}: pool timeouts {s['timeouts']}, connect errors {s['errors']}")
+
+    client = redis_pool.client('fork', host=REDIS_HOST, port=REDIS_PORT)
+    client.ping()
+    parent_pool = redis_pool.get_redis('fork').connection_pool
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read)
+        ok = client.ping() and redis_pool.get_redis('fork').connection_pool is not parent_pool
+        os.write(write, b'1' if ok else b'0')
+        os._exit(0)
+    os.close(write)
+    child_ok = os.read(read, 1) == b'1'
+    os.waitpid(pid, 0)
+    print(f"\nfork: child uses its own pool {'yes' if child_ok else 'NO'}, parent still works {client.ping()}")
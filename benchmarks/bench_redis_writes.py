@@ -0,0 +1,153 @@
+"""Обращения к Redis из обработчика свечи бота: число round-trip и время ожидания.
+
+Бот загружается из файла, вместо Redis подставляется счетчик с задержкой
+ответа LATENCY (как у сетевого Redis). На синтетических свечах вызывается
+on_candle и считается, сколько round-trip выполнено в потоке свечей и сколько
+всего (включая фоновый RedisPublisher, если бот его использует).
+
+Запуск: python benchmarks/bench_redis_writes.py [файл бота ...]
+"""
+import contextlib
+import importlib.util
+import inspect
+import io
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from klines import INTERVAL_MS, KlineBuffer
+
+LATENCY = 0.002
+CANDLES = 300
+
+
+class CountingRedis:
+    """Заглушка redis.Redis: каждый запрос или pipeline.execute() - один round-trip."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.round_trips = {}
+
+    def _trip(self):
+        time.sleep(LATENCY)
+        thread = threading.current_thread().name
+        with self.lock:
+            self.round_trips[thread] = self.round_trips.get(thread, 0) + 1
+
+    def get(self, key):
+        self._trip()
+        return None
+
+    def hset(self, key, mapping=None, **kwargs):
+        self._trip()
+
+    def set(self, key, value, **kwargs):
+        self._trip()
+
+    def delete(self, key):
+        self._trip()
+
+    def expire(self, key, ttl):
+        self._trip()
+
+    def hgetall(self, key):
+        self._trip()
+        return {}
+
+    def pipeline(self, transaction=True):
+        return CountingPipeline(self)
+
+
+class CountingPipeline:
+    def __init__(self, r):
+        self.r = r
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        self.r._trip()
+        return []
+
+
+def load_bot(path):
+    spec = importlib.util.spec_from_file_location('bench_bot', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def make_buffers(intervals, n, rng):
+    """Буферы с историей и цены следующих свечей рабочего интервала."""
+    step = INTERVAL_MS[intervals[0]]
+    close = 3000 + np.cumsum(rng.normal(0, 6, n + CANDLES))
+    start = (int(time.time() * 1000) // step - n - CANDLES - 2) * step
+    buffers = {}
+    for interval in intervals:
+        buffers[interval] = KlineBuffer(interval)
+        ratio = INTERVAL_MS[interval] // step
+        idx = np.arange(0, n, ratio)
+        buffers[interval].load({
+            'open_time': start + idx * step,
+            'close_time': start + idx * step + INTERVAL_MS[interval] - 1,
+            'Open': close[idx], 'High': close[idx] + 2, 'Low': close[idx] - 2,
+            'Close': close[idx], 'Volume': np.ones(len(idx)),
+        })
+    return buffers, start + n * step, step, close[n:]
+
+
+def run(path):
+    module = load_bot(path)
+    r = CountingRedis()
+    module.r = r
+    if hasattr(module, 'publisher'):
+        module.publisher = type(module.publisher)(r)
+
+    import indicators
+    indicators.warmup()
+    intervals = [module.INTERVAL] + ([module.HIGHER_INTERVAL] if module.HIGHER_INTERVAL != module.INTERVAL else [])
+    buffers, open_time, step, prices = make_buffers(intervals, 400, np.random.default_rng(0))
+
+    account = module.PaperAccount(initial_balance=1000.0)
+    account.session_started = True
+    params = inspect.signature(module.on_candle).parameters
+    kwargs = {}
+    if 'watcher' in params:
+        from triggers import TriggerWatcher
+        kwargs['watcher'] = TriggerWatcher()
+    if 'shadow' in params and getattr(module, 'SHADOW_MODE', False):
+        with contextlib.redirect_stdout(io.StringIO()):
+            kwargs['shadow'] = module.make_shadow(account)
+
+    thread = threading.current_thread().name
+    before = dict(r.round_trips)
+    spent = 0.0
+    for price in prices:
+        for interval, buffer in buffers.items():
+            if open_time % INTERVAL_MS[interval] == 0:
+                buffer.add(open_time, price, price + 2, price - 2, price, 1.0)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            module.on_candle(module.INTERVAL, buffers, account, **kwargs)
+        spent += time.perf_counter() - start
+        open_time += step
+        # Свечи идут с интервалом в минуты: фоновая запись успевает отправить все до следующей
+        if hasattr(module, 'publisher'):
+            module.publisher.flush()
+    in_thread = r.round_trips.get(thread, 0) - before.get(thread, 0)
+    total = sum(r.round_trips.values()) - sum(before.values())
+    print(f"{os.path.basename(path)}: {len(prices)} candles, {len(account.trade_history)} trades")
+    print(f"  candle thread: {in_thread / len(prices):.2f} round-trips/candle, {spent / len(prices) * 1000:.2f} ms/candle")
+    print(f"  total:         {total / len(prices):.2f} round-trips/candle")
+
+
+if __name__ == '__main__':
+    paths = sys.argv[1:] or [os.path.join(ROOT, 'bot-macd.py'), os.path.join(ROOT, 'bot-sqzmom.py')]
+    for path in paths:
+        run(path)
@@ -0,0 +1,34 @@
+"""Время Monte Carlo из robustness.py: пути x сделки, bootstrap и перестановка.
+
+Сделки - синтетический журнал с риском 1 USDT и тейком 3R (как у ботов),
+30% прибыльных. Сравнивается один поток и все ядра (блоки матрицы в потоках).
+
+Запуск: python benchmarks/bench_robustness.py [пути] [сделки]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import robustness
+
+
+if __name__ == '__main__':
+    paths = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    trades = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    rng = np.random.default_rng(0)
+    pnl = np.where(rng.random(trades) < 0.3, 2.9, -1.1)
+
+    cores = os.cpu_count() or 1
+    print(f"{paths} paths x {trades} trades, {cores} cores")
+    for method in ('bootstrap', 'permutation'):
+        for workers in sorted({1, cores}):
+            start = time.perf_counter()
+            result = robustness.monte_carlo(pnl, paths, trades, method, per_day=3, workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f"{method:12s} {workers:2d} threads  {elapsed:6.2f} s  "
+                  f"{paths * trades / elapsed / 1e6:6.1f} M trade-steps/s")
+    robustness.print_summary(robustness.summarize(result), 'last run:')
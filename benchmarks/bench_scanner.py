@@ -0,0 +1,42 @@
+"""Время одного прохода сканера по матрице (символы x бары) на одном ядре.
+
+Запуск: python benchmarks/bench_scanner.py [символов] [баров]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import indicators
+import scanner
+
+if __name__ == '__main__':
+    n_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 400
+    bars = int(sys.argv[2]) if len(sys.argv) > 2 else scanner.BARS
+    rng = np.random.default_rng(0)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.004, (n_symbols, bars)), axis=1))
+    high = close * (1 + rng.random((n_symbols, bars)) * 0.003)
+    low = close * (1 - rng.random((n_symbols, bars)) * 0.003)
+    symbols = [f"SYM{i}USDT" for i in range(n_symbols)]
+
+    indicators.warmup()
+    scanner.scan(close, high, low)
+
+    times = []
+    for _ in range(20):
+        start = time.perf_counter()
+        result = scanner.scan(close, high, low)
+        candidates = scanner.rank_candidates(symbols, result, close[:, -1])
+        times.append(time.perf_counter() - start)
+
+    # Сверка с посимвольным расчетом
+    i = int(np.argmax(result['strength']))
+    sqz, mom, _ = indicators.squeeze_momentum(close[i], high[i], low[i], scanner.SQZ_BB_ДЛИНА, scanner.SQZ_BB_МУЛЬТИФАКТОР,
+                                              scanner.SQZ_KC_ДЛИНА, scanner.SQZ_KC_МУЛЬТИФАКТОР, scanner.SQZ_ATR_ПЕРИОД)
+    assert np.isclose(mom[-1], result['momentum'][i]) and sqz[-1] == result['is_squeeze'][i]
+
+    print(f"{n_symbols} symbols x {bars} bars: median {np.median(times) * 1000:.2f} ms, min {min(times) * 1000:.2f} ms per scan")
+    print(f"{int((result['direction'] != 0).sum())} signals, top: {candidates[:3]}")
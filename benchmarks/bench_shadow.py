@@ -0,0 +1,62 @@
+"""Стоимость одной свечи в теневом режиме в зависимости от числа вариантов.
+
+Сравнивается расчет SQZMOM для каждого варианта отдельно (indicators.squeeze_momentum)
+и через общий IndicatorCache из shadow.py. Варианты - сетка по длинам и множителям,
+как в SHADOW_VARIANTS бота.
+
+Запуск: python benchmarks/bench_shadow.py [кол-во баров]
+"""
+import itertools
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import indicators
+from shadow import IndicatorCache
+
+ATR_PERIOD = 14
+
+
+def make_variants(count):
+    grid = itertools.product((30, 20), (1.8, 2.0, 1.6, 2.2), (1.9, 1.5, 2.1, 1.7), (1.0, 0.9))
+    return [(length, bb_mult, length, kc_mult * scale, ATR_PERIOD)
+            for length, bb_mult, kc_mult, scale in itertools.islice(grid, count)]
+
+
+def separate(data, variants):
+    for params in variants:
+        indicators.squeeze_momentum(data['Close'], data['High'], data['Low'], *params)
+
+
+def shared(data, variants):
+    cache = IndicatorCache(data)
+    for params in variants:
+        cache.squeeze_momentum(*params)
+
+
+def best_time(func, *args, repeat=20):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    rng = np.random.default_rng(0)
+    close = 3000 + np.cumsum(rng.normal(0, 2, n))
+    data = {'Close': close, 'High': close + rng.random(n) * 3, 'Low': close - rng.random(n) * 3}
+
+    indicators.warmup()
+    print(f"{n} bars per candle")
+    for count in (1, 4, 16, 64):
+        variants = make_variants(count)
+        separate_time = best_time(separate, data, variants)
+        shared_time = best_time(shared, data, variants)
+        print(f"{count:3d} variants: separate {separate_time * 1000:7.2f} ms, shared cache {shared_time * 1000:7.2f} ms (x{separate_time / shared_time:.1f})")
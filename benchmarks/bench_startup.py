@@ -0,0 +1,54 @@
+"""Время импорта и память (RSS) процесса бота в состоянии ожидания START.
+
+Для каждого бота в отдельном процессе загружается модуль (без run_bot) и
+измеряются время и пиковый RSS. Для сравнения отдельно загружается набор
+модулей, который раньше импортировался при старте (без сетевого ping Client()).
+
+Запуск: python benchmarks/bench_startup.py
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+MEASURE = '''
+import resource, sys, time
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+'''
+
+LOAD_BOT = '''
+import importlib.util
+spec = importlib.util.spec_from_file_location('bot', {path!r})
+module = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(module)
+'''
+
+EAGER = '''
+import redis, numpy, websocket, requests
+from binance.client import Client
+import klines, decoder, ws_stream, indicators
+'''
+
+
+def measure(body):
+    out = subprocess.run([sys.executable, '-c', MEASURE.format(body=body)], cwd=ROOT,
+                         capture_output=True, text=True, check=True).stdout.split()
+    return float(out[0]), int(out[1])
+
+
+def report(name, body, runs=5):
+    results = [measure(body) for _ in range(runs)]
+    elapsed = min(r[0] for r in results)
+    rss_kib = min(r[1] for r in results)
+    print(f"{name:30s} import {elapsed * 1000:7.1f} ms   RSS {rss_kib / 1024:6.1f} MiB")
+
+
+if __name__ == '__main__':
+    report('interpreter only', 'pass')
+    for script in ('bot-macd.py', 'bot-sqzmom.py'):
+        report(f'{script} (waiting START)', LOAD_BOT.format(path=os.path.join(ROOT, script)))
+    report('eager heavy imports', EAGER)
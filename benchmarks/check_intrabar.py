@@ -0,0 +1,110 @@
+"""Проверка входов внутри бара bot-macd.py.
+
+1. Обратный сигнал: позиция, открытая на тике, переживает закрытие своего бара
+   с сигналом того же направления и закрывается (REVERSE_SIGNAL) только
+   сигналом против своей стороны. Плюс прогон синтетических свечей с тиками:
+   сколько выходов REVERSE_SIGNAL пришлось на бар входа.
+2. Ожидание закрытия 15m: свеча 5m на границе 15m откладывает оценку, уровни
+   основного счета и теневых вариантов снимаются, тики за старыми уровнями
+   в это время не открывают позиций.
+
+Redis заменяется заглушкой (как в check_shadow_parity.py).
+
+Запуск: python benchmarks/check_intrabar.py [свечей]
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from check_shadow_parity import HISTORY, ROOT, load_bot, make_candles, run
+from triggers import TriggerWatcher
+from klines import INTERVAL_MS, KlineBuffer
+
+BALANCE = 1000.0
+
+
+def check_reverse(bot):
+    """Вход на тике и закрытие бара с каждым сигналом: (сторона, сигнал, позиция осталась)."""
+    price = 3000.0
+    results = []
+    for side in ('LONG', 'SHORT'):
+        for signal in ('LONG', 'SHORT', None):
+            account = bot.PaperAccount(initial_balance=BALANCE)
+            account.session_started = True
+            account.reset_daily()
+            assert bot.enter_on_signal(account, side, price)
+            bot.trade_on_candle(account, signal, price)
+            results.append((side, signal, account.is_in_position))
+    return results
+
+
+def reverse_exits_on_entry_bar(bot, n):
+    """Выходы REVERSE_SIGNAL на закрытии бара входа в прогоне с тиками."""
+    candles = make_candles(INTERVAL_MS[bot.INTERVAL], HISTORY + n, np.random.default_rng(1))
+    account, _ = run(bot, candles, BALANCE)
+    reverse = [t for t in account.trade_history if t['reason'] == 'REVERSE_SIGNAL']
+    same_bar = 0
+    for t in reverse:
+        # Вход и выход по ценам: выход на закрытии бара, вход - тик этого же бара
+        i = np.flatnonzero(candles[4] == t['exit_price'])
+        same_bar += bool(len(i)) and t['entry_price'] in candles[5][i[0]]
+    return len(account.trade_history), len(reverse), same_bar
+
+
+def check_deferred_ticks(bot, ticks=(2990.0, 3010.0, 2950.0, 3050.0)):
+    """Тики за уровнями прошлого бара, пока 5m ждет 15m: (отложено, позиция счета, позиции вариантов)."""
+    step, higher_step = INTERVAL_MS[bot.INTERVAL], INTERVAL_MS[bot.HIGHER_INTERVAL]
+    boundary = 1_700_000_000_000 // higher_step * higher_step
+    buffers = {bot.INTERVAL: KlineBuffer(bot.INTERVAL), bot.HIGHER_INTERVAL: KlineBuffer(bot.HIGHER_INTERVAL)}
+    # Последняя 5m закрывается на границе 15m, последняя закрытая 15m - предыдущая
+    for t in range(boundary - 30 * step, boundary, step):
+        buffers[bot.INTERVAL].add(t, 3000.0, 3001.0, 2999.0, 3000.0, 1.0)
+    for t in range(boundary - 11 * higher_step, boundary - higher_step, higher_step):
+        buffers[bot.HIGHER_INTERVAL].add(t, 3000.0, 3001.0, 2999.0, 3000.0, 1.0)
+
+    account = bot.PaperAccount(initial_balance=BALANCE)
+    account.session_started = True
+    account.reset_daily()
+    shadow = bot.shadow_runner(None, [('live', bot.live_params())], BALANCE)
+    watchers = [TriggerWatcher()] + [ledger.watcher for ledger in shadow.ledgers]
+    for watcher in watchers:
+        watcher.update(3005.0, 2995.0, 'LONG')   # Уровень бара, который только что закрылся
+
+    bot.awaiting_higher = 0.0
+    bot.on_candle(bot.INTERVAL, buffers, account, watchers[0], shadow)
+    deferred = bool(bot.awaiting_higher)
+    for price in ticks:
+        bot.on_tick(bot.INTERVAL, price, buffers, account, watchers[0], shadow)
+    bot.awaiting_higher = 0.0
+    return deferred, account.is_in_position, [ledger.account.is_in_position for ledger in shadow.ledgers]
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    import logging
+    logging.getLogger('bot').disabled = True
+    import indicators
+    indicators.warmup()
+
+    bot = load_bot(os.path.join(ROOT, 'bot-macd.py'))
+    failed = False
+    for side, signal, kept in check_reverse(bot):
+        expected = signal != ('SHORT' if side == 'LONG' else 'LONG')
+        failed |= kept != expected
+        print(f"{side:5s} position, bar close signal {str(signal):5s}: "
+              f"{'kept' if kept else 'closed'}  {'OK' if kept == expected else 'FAIL'}")
+
+    trades, reverse, same_bar = reverse_exits_on_entry_bar(bot, n)
+    failed |= same_bar > 0
+    print(f"{n} candles with ticks: {trades} trades, {reverse} REVERSE_SIGNAL exits, "
+          f"{same_bar} on the entry bar  {'OK' if same_bar == 0 else 'FAIL'}")
+    deferred, in_position, shadow_positions = check_deferred_ticks(bot)
+    ok = deferred and not in_position and not any(shadow_positions)
+    failed |= not ok
+    print(f"ticks while waiting for {bot.HIGHER_INTERVAL}: deferred {deferred}, account entered {in_position}, "
+          f"shadow entered {any(shadow_positions)}  {'OK' if ok else 'FAIL'}")
+    bot.publisher.stop()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,67 @@
+"""Проверка разбора команды PROFILE[:<сек>] (profiler.BotProfiler.handle_command).
+
+Длительности nan/inf не запускают сбор (nan прошел бы через ограничение
+min/max, и профайлер не остановился бы никогда); PROFILE:1 завершается сам
+за секунду с небольшим; нечисловая длительность - значение по умолчанию.
+Результат пишется во временный каталог, Redis заменяется записью в словарь.
+
+Запуск: python benchmarks/check_profiler_command.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import profiler
+
+
+class DictPublisher:
+    """hset/delete RedisPublisher в словарь."""
+
+    def __init__(self):
+        self.data = {}
+
+    def hset(self, key, mapping, ttl=None):
+        self.data.setdefault(key, {}).update(mapping)
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def run(command, wait, profile_dir):
+    """(запущен ли сбор, остановился ли сам за wait сек, длительность в bot_profile)."""
+    publisher = DictPublisher()
+    bot_profiler = profiler.BotProfiler(publisher, 'check', profile_dir=profile_dir)
+    started = bot_profiler.handle_command(command)
+    deadline = time.time() + wait
+    while bot_profiler.sampler.is_running() and time.time() < deadline:
+        time.sleep(0.05)
+    finished = not bot_profiler.sampler.is_running()
+    bot_profiler.sampler.stop()
+    return started, finished, publisher.data.get('bot_profile:check', {}).get('seconds')
+
+
+if __name__ == '__main__':
+    profile_dir = tempfile.mkdtemp()
+    failed = False
+    try:
+        cases = [
+            # команда, ожидание, ожидается запуск, длительность
+            ('PROFILE:nan', 0.5, False, None),
+            ('PROFILE:inf', 0.5, False, None),
+            ('PROFILE:-inf', 0.5, False, None),
+            ('PROFILE:1', 3.0, True, 1.0),
+            ('PROFILE:abc', 0.2, True, float(profiler.PROFILE_SECONDS)),
+        ]
+        for command, wait, expect_start, expect_seconds in cases:
+            started, finished, seconds = run(command, wait, profile_dir)
+            ok = started == expect_start and seconds == expect_seconds and (finished or command == 'PROFILE:abc')
+            failed |= not ok
+            print(f"{command:14s} started {started!s:5s} stopped by itself {finished!s:5s} seconds {seconds}  "
+                  f"{'OK' if ok else 'FAIL'}")
+    finally:
+        shutil.rmtree(profile_dir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
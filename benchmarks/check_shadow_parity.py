@@ -0,0 +1,133 @@
+"""Проверка: теневой вариант 'live' торгует так же, как основной счет бота.
+
+Бот загружается из файла, Redis заменяется заглушкой. На синтетических свечах
+(случайное блуждание, тики внутри бара для ботов со входом внутри бара)
+вызываются on_tick/on_candle бота, как из потока: основной счет и теневые
+варианты получают одни и те же свечи. Сделки варианта 'live' (тип, цены
+входа/выхода, причина, PnL) и итоговый баланс должны совпасть с основным
+счетом. Балансы: 100 USDT (как в run_bot) и 1000 USDT.
+
+Запуск: python benchmarks/check_shadow_parity.py [свечей] [файл бота ...]
+"""
+import importlib.util
+import inspect
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from klines import INTERVAL_MS, KlineBuffer
+
+HISTORY = 400
+TICKS = 4           # Тиков внутри бара
+BALANCES = (100.0, 1000.0)
+
+
+class NullRedis:
+    def get(self, key):
+        return None
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    def pipeline(self, transaction=True):
+        return NullPipeline()
+
+
+class NullPipeline:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self
+
+    def execute(self):
+        return []
+
+
+def load_bot(path):
+    spec = importlib.util.spec_from_file_location('parity_bot', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.r = NullRedis()
+    module.publisher = type(module.publisher)(module.r)
+    return module
+
+
+def make_candles(step, n, rng):
+    """(open_time, open, high, low, close) рабочего интервала и тики каждой свечи."""
+    close = 3000 * np.exp(np.cumsum(rng.normal(0, 0.004, n)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    ticks = open_[:, None] + (close - open_)[:, None] * rng.random((n, TICKS)) + rng.normal(0, 4, (n, TICKS))
+    high = np.maximum(np.maximum(open_, close), ticks.max(axis=1))
+    low = np.minimum(np.minimum(open_, close), ticks.min(axis=1))
+    start = 1_700_000_000_000 // INTERVAL_MS['1h'] * INTERVAL_MS['1h']
+    return start + np.arange(n) * step, open_, high, low, close, ticks
+
+
+def trades(account):
+    return [(t['type'], t['entry_price'], t['exit_price'], t['reason'], t['pnl_usdt']) for t in account.trade_history]
+
+
+def run(module, candles, balance):
+    intervals = [module.INTERVAL] + ([module.HIGHER_INTERVAL] if module.HIGHER_INTERVAL != module.INTERVAL else [])
+    step = INTERVAL_MS[module.INTERVAL]
+    open_time, open_, high, low, close, ticks = candles
+    buffers = {interval: KlineBuffer(interval) for interval in intervals}
+
+    def add_closed(i):
+        """Свеча i рабочего интервала и закрывшиеся вместе с ней свечи старших интервалов."""
+        buffers[module.INTERVAL].add(int(open_time[i]), open_[i], high[i], low[i], close[i], 1.0)
+        end = int(open_time[i]) + step
+        for interval in intervals[1:]:
+            ms = INTERVAL_MS[interval]
+            if end % ms == 0 and i + 1 >= ms // step:
+                first = i + 1 - ms // step
+                buffers[interval].add(end - ms, open_[first], high[first:i + 1].max(), low[first:i + 1].min(), close[i], 1.0)
+
+    for i in range(HISTORY):
+        add_closed(i)
+
+    account = module.PaperAccount(initial_balance=balance)
+    account.session_started = True
+    account.reset_daily()
+    shadow = module.shadow_runner(None, [('live', module.live_params())], balance)
+    kwargs = {'shadow': shadow}
+    watcher = None
+    if 'watcher' in inspect.signature(module.on_candle).parameters:
+        from triggers import TriggerWatcher
+        watcher = kwargs['watcher'] = TriggerWatcher()
+    with_ticks = getattr(module, 'INTRABAR_ENTRIES', False) and hasattr(module, 'on_tick')
+
+    for i in range(HISTORY, len(open_time)):
+        if not account.session_started:
+            break
+        if with_ticks:
+            for price in ticks[i]:
+                module.on_tick(module.INTERVAL, price, buffers, account, watcher, shadow)
+        add_closed(i)
+        module.on_candle(module.INTERVAL, buffers, account, **kwargs)
+    return account, shadow.ledgers[0].account
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 5000
+    paths = [p for p in sys.argv[1:] if not p.isdigit()] or [os.path.join(ROOT, 'bot-macd.py'), os.path.join(ROOT, 'bot-sqzmom.py')]
+    import logging
+    logging.getLogger('bot').disabled = True
+    import indicators
+    indicators.warmup()
+
+    failed = False
+    for path in paths:
+        module = load_bot(path)
+        candles = make_candles(INTERVAL_MS[module.INTERVAL], HISTORY + n, np.random.default_rng(1))
+        for balance in BALANCES:
+            account, live = run(module, candles, balance)
+            ok = trades(account) == trades(live) and account.balance_usdt == live.balance_usdt
+            failed |= not ok
+            print(f"{os.path.basename(path):14s} balance {balance:7.1f}: bot {len(account.trade_history):4d} trades, "
+                  f"balance {account.balance_usdt:9.4f} | live {len(live.trade_history):4d} trades, "
+                  f"balance {live.balance_usdt:9.4f}  {'OK' if ok else 'MISMATCH'}")
+        module.publisher.stop()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,113 @@
+"""Проверка: прогон на истории (robustness.replay) и walk-forward торгуют все недели.
+
+Синтетическая история (случайное блуждание 5m и 15m из нее) пишется во
+временный каталог в формате backfill.py. Дневной лимит убытка должен
+сбрасываться по дням UTC: в каждой неделе многонедельного прогона есть сделки
+(раньше варианты замолкали после первых дней); вариант, остановленный лимитом
+просадки (MAX_DRAWDOWN_PERCENT), - до недели остановки. Каждое окно walk-forward
+начинает out-of-sample с новых счетов: во всех окнах есть сделки OOS.
+
+Запуск: python benchmarks/check_walkforward.py [недель] [файл бота ...]
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import backfill
+import robustness
+from klines import INTERVAL_MS
+
+SYMBOL = 'TESTUSDT'
+BALANCE = 1000.0
+IS_DAYS = 14
+OOS_DAYS = 7
+WEEK_MS = 7 * robustness.DAY_SECONDS * 1000
+
+
+def make_history(data_dir, weeks, rng):
+    """5m и 15m свечи на weeks недель после разгона индикаторов."""
+    step = INTERVAL_MS['5m']
+    n = (weeks * WEEK_MS + 3 * robustness.WINDOW * INTERVAL_MS['15m']) // step
+    close = 3000 * np.exp(np.cumsum(rng.normal(0, 0.003, n)))
+    open_ = np.concatenate(([close[0]], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.002, n)) * close
+    start = 1_700_000_000_000 // INTERVAL_MS['1d'] * INTERVAL_MS['1d']
+    data = {
+        'open_time': start + np.arange(n, dtype=np.int64) * step,
+        'Open': open_, 'High': np.maximum(open_, close) + spread, 'Low': np.minimum(open_, close) - spread,
+        'Close': close, 'Volume': np.ones(n)
+    }
+    backfill.save_store(backfill.store_path(data_dir, SYMBOL, '5m'), data)
+    m = n // 3 * 3
+    groups = {k: v[:m].reshape(-1, 3) for k, v in data.items()}
+    backfill.save_store(backfill.store_path(data_dir, SYMBOL, '15m'), {
+        'open_time': groups['open_time'][:, 0], 'Open': groups['Open'][:, 0], 'High': groups['High'].max(axis=1),
+        'Low': groups['Low'].min(axis=1), 'Close': groups['Close'][:, -1], 'Volume': groups['Volume'].sum(axis=1)
+    })
+
+
+def check_replay(bot, variants, history):
+    """Сделки по неделям для каждого варианта; True, если каждая неделя до остановки не пустая."""
+    times = history[bot.INTERVAL]['open_time']
+    start = int(times[robustness.WINDOW])
+    weeks = (int(times[-1]) - start) // WEEK_MS
+    # Счета вариантов после прогона: остановлен ли вариант лимитом просадки
+    runners = []
+    make_runner = bot.shadow_runner
+    bot.shadow_runner = lambda *args, **kwargs: runners.append(make_runner(*args, **kwargs)) or runners[-1]
+    try:
+        trades = robustness.replay(bot, history, variants, start, start + weeks * WEEK_MS, BALANCE)
+    finally:
+        bot.shadow_runner = make_runner
+    halted = {ledger.name: not ledger.account.session_started for ledger in runners[0].ledgers}
+    ok = True
+    for name, (ts, _) in trades.items():
+        # ts - время закрытия свечи: сделка на последней свече попадает в последнюю неделю
+        week = ((ts * 1000 - start - 1) // WEEK_MS).astype(np.int64)
+        per_week = np.bincount(week, minlength=weeks)
+        active = week[-1] + 1 if halted[name] else weeks
+        ok &= bool((per_week[:active] > 0).all())
+        print(f"    replay {name:12s} trades per week {per_week.tolist()}{'  (max drawdown stop)' if halted[name] else ''}")
+    return ok
+
+
+def check_walk_forward(bot, path, variants, history, data_dir):
+    times = history[bot.INTERVAL]['open_time']
+    folds = robustness.make_folds(int(times[robustness.WINDOW]), int(times[-1]), IS_DAYS, OOS_DAYS)
+    rows, _, _ = robustness.walk_forward(path, SYMBOL, variants, folds, data_dir, BALANCE)
+    for row in rows:
+        print(f"    fold {robustness._date(row['split'])}: best {row['best']:12s} "
+              f"IS trades {row['is_trades']:3d}  OOS trades {row['oos_trades']:3d}")
+    return bool(rows) and all(row['oos_trades'] > 0 for row in rows)
+
+
+if __name__ == '__main__':
+    weeks = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].isdigit() else 6
+    paths = [p for p in sys.argv[1:] if not p.isdigit()] or [os.path.join(ROOT, 'bot-macd.py'), os.path.join(ROOT, 'bot-sqzmom.py')]
+    import logging
+    logging.getLogger('bot').disabled = True
+
+    data_dir = tempfile.mkdtemp()
+    failed = False
+    try:
+        make_history(data_dir, weeks, np.random.default_rng(1))
+        for path in paths:
+            bot = robustness.load_bot(path)
+            variants = robustness.make_variants(bot.live_params(), bot.SHADOW_VARIANTS)
+            history = robustness.load_history(SYMBOL, robustness.bot_intervals(bot), data_dir)
+            print(f"{os.path.basename(path)}: {weeks} weeks, {len(variants)} variants, balance {BALANCE:.0f}")
+            replay_ok = check_replay(bot, variants, history)
+            folds_ok = check_walk_forward(bot, path, variants, history, data_dir)
+            print(f"  replay every week traded: {'OK' if replay_ok else 'FAIL'}, "
+                  f"every OOS fold traded: {'OK' if folds_ok else 'FAIL'}")
+            failed |= not (replay_ok and folds_ok)
+            bot.publisher.stop()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+    sys.exit(1 if failed else 0)
@@ -1,21 +1,24 @@
-import pandas as pd
-from binance.client import Client
-from binance.exceptions import BinanceAPIException
-import websocket
-import json
+# Тяжелые модули (numpy, numba, python-binance, websocket) импортируются при первом START,
+# чтобы процесс в ожидании команды стартовал быстро и занимал минимум памяти
 import time
-import threading
 import sys
-import requests
-from datetime import datetime, timezone
-import redis # <-- НОВЫЙ ИМПОРТ
+import os
+import logging
+import botlog
+import redis_pool
+import registry
+from redis_publisher import RedisPublisher
 
 # --- НАСТРОЙКИ (Обновлено для MTF MACD/EMA Cloud стратегии) ---
-SYMBOL = 'ETHUSDT'
-INTERVAL = Client.KLINE_INTERVAL_5MINUTE
-HIGHER_INTERVAL = Client.KLINE_INTERVAL_15MINUTE
+SYMBOL = os.environ.get('SYMBOL', 'ETHUSDT') # Задается воркером (worker.py) для экземпляра из реестра
+INTERVAL = '5m' # Client.KLINE_INTERVAL_5MINUTE
+HIGHER_INTERVAL = '15m' # Client.KLINE_INTERVAL_15MINUTE
 
 # Настройки MACD (Фильтр 15m)
+# Фильтр считается по закрытым свечам 15m. Свеча 5m, закрывающаяся на границе 15m,
+# ждет закрытия этой 15m свечи (оно приходит отдельным сообщением, иногда позже),
+# чтобы фильтр не отставал на целую свечу 15m; не дольше HIGHER_CLOSE_WAIT
+HIGHER_CLOSE_WAIT = 5  # сек
 MACD_FAST = 20
 MACD_SLOW = 30
 MACD_SIGNAL = 9
@@ -23,6 +26,19 @@ MACD_SIGNAL = 9
 # Настройки EMA Cloud (Вход 5m)
 EMA_PERIODS = [50, 100]
 
+# Вход внутри бара: после закрытия свечи рассчитываются цены пересечения облака,
+# и вход срабатывает на первом тике за уровнем, не дожидаясь закрытия
+INTRABAR_ENTRIES = True
+
+# Теневой режим: варианты параметров MACD/EMA на том же потоке свечей, каждый со своим
+# бумажным счетом (shadow.py). Варианты можно задать в Redis: shadow_variants:<BOT_ID>
+SHADOW_MODE = True
+SHADOW_VARIANTS = [
+    {'name': 'macd_12_26', 'MACD_FAST': 12, 'MACD_SLOW': 26},
+    {'name': 'ema_20_50', 'EMA_PERIODS': [20, 50]},
+    {'name': 'ema_50_200', 'EMA_PERIODS': [50, 200]},
+]
+
 # Настройки Риска и Прибыли (Заменяют ATR-расчеты)
 RISK_AMOUNT_USD = 1.00    # Фиксированный риск на сделку в USD
 RISK_PERCENT_SL = 0.005   # 0.5% Стоп-Лосс от цены входа
@@ -37,15 +53,43 @@ COMMISSION_PERCENT = 0.001
 SLIPPAGE_PERCENT = 0.0005
 
 # --- НАСТРОЙКИ REDIS И ИДЕНТИФИКАТОР БОТА ---
-BOT_ID = 'macd_bot' # Уникальный ID бота
-REDIS_HOST = 'redis' # Имя сервиса Redis в docker-compose
-REDIS_PORT = 6379
-r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+BOT_ID = os.environ.get('BOT_ID', 'macd_bot') # Уникальный ID бота
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis') # Имя сервиса Redis в docker-compose
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+# Общий пул (redis_pool.py) для потока WebSocket, главного цикла и фоновой записи:
+# таймауты, проверка соединений и переподключение
+r = redis_pool.client('bot', host=REDIS_HOST, port=REDIS_PORT)
+# Запись состояния идет через фоновый поток (redis_publisher.py): торговый поток не ждет Redis
+publisher = RedisPublisher(r)
+STATUS_TTL = 60          # bot_status без обновлений дольше - бот не работает
+STATUS_HEARTBEAT = 10    # Обновление bot_status во время работы (сек)
+STATS_TTL = 7 * 24 * 3600
+
+# Вывод через очередь и фоновый поток (botlog.py): торговый поток не ждет stdout
+log = logging.getLogger('bot')
 
 # API клиент (публичный) - для получения данных. Для реальной торговли нужен Key/Secret
 API_KEY = ''
 API_SECRET = ''
-client = Client(API_KEY, API_SECRET)
+client = None # Создается при первом START (см. get_client)
+
+def get_client():
+    """Ленивое создание клиента: Client() импортирует python-binance и пингует API."""
+    global client
+    if client is None:
+        from binance.client import Client
+        client = Client(API_KEY, API_SECRET)
+    return client
+
+bot_profiler = None # Создается при первой команде PROFILE (см. get_profiler)
+
+def get_profiler():
+    """Сэмплирующий профайлер (profiler.py), включается командой PROFILE:<сек> с панели."""
+    global bot_profiler
+    if bot_profiler is None:
+        from profiler import BotProfiler
+        bot_profiler = BotProfiler(publisher, BOT_ID)
+    return bot_profiler
 
 # Retry для API
 def retry_api(max_attempts=3, delay=2):
@@ -55,34 +99,37 @@ def retry_api(max_attempts=3, delay=2):
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
-                    print(f"Retry {attempt+1}/{max_attempts}: {e}")
+                    log.warning("Retry %d/%d: %s", attempt + 1, max_attempts, e)
                     time.sleep(delay * (2 ** attempt))
             raise Exception("Max retries exceeded")
         return wrapper
     return decorator
 
 # --- ФУНКЦИИ РАСЧЕТА ИНДИКАТОРОВ ---
-def calculate_macd(df, fast, slow, signal):
+# data - словарь колонок NumPy (parse_klines / KlineBuffer.columns), индикаторы добавляются в него
+def calculate_macd(data, fast, slow, signal):
     """Вычисляет MACD и сигнальную линию."""
-    # Используется pandas.ewm для расчета MACD
-    ema_fast = df['Close'].ewm(span=fast, adjust=False).mean()
-    ema_slow = df['Close'].ewm(span=slow, adjust=False).mean()
-    df['MACD'] = ema_fast - ema_slow
-    df['MACD_Signal'] = df['MACD'].ewm(span=signal, adjust=False).mean()
-    return df
-
-def calculate_ema_cloud(df, periods):
+    # Ядра из indicators.py (эквивалент pandas.ewm)
+    import indicators
+    data['MACD'], data['MACD_Signal'] = indicators.macd(data['Close'], fast, slow, signal)
+    return data
+
+def calculate_ema_cloud(data, periods):
     """Вычисляет EMA для облака и определяет его границы."""
-    # Используется pandas.ewm для расчета EMA Cloud
+    import numpy as np
+    import indicators
     for p in periods:
-        df[f'EMA_{p}'] = df['Close'].ewm(span=p, adjust=False).mean()
+        data[f'EMA_{p}'] = indicators.ema(data['Close'], p)
     # Определение границ облака
-    df['EMA_Cloud_High'] = df[[f'EMA_{p}' for p in periods]].max(axis=1)
-    df['EMA_Cloud_Low'] = df[[f'EMA_{p}' for p in periods]].min(axis=1)
-    return df
+    emas = [data[f'EMA_{p}'] for p in periods]
+    data['EMA_Cloud_High'] = np.maximum.reduce(emas)
+    data['EMA_Cloud_Low'] = np.minimum.reduce(emas)
+    return data
 
 # --- УПРАВЛЕНИЕ ТОРГОВЫМ СЧЕТОМ (МОДИФИЦИРОВАНО) ---
 class PaperAccount:
+    log = log # Теневые счета (ShadowAccount) пишут в свой логгер без вывода
+
     def __init__(self, initial_balance):
         self.initial_balance = initial_balance
         self.balance_usdt = initial_balance
@@ -96,6 +143,7 @@ class PaperAccount:
         self.trade_history = []
         self.session_started = False
         self.daily_loss = 0.0
+        self.day = None # День UTC последней закрытой свечи (roll_day)
         self.last_hourly_report = time.time()
 
     def reset_daily(self):
@@ -103,17 +151,23 @@ class PaperAccount:
         self.daily_loss = 0.0
         # send_telegram_message(f"Daily reset: Start balance {self.daily_start_balance:.2f} USDT") # УДАЛЕНО
 
+    def roll_day(self, ts):
+        """Смена дня UTC по времени закрытия свечи ts (сек): сброс дневного лимита убытка."""
+        day = int(ts // 86400)
+        if self.day is not None and day != self.day:
+            self.reset_daily()
+        self.day = day
+
     def check_limits(self, potential_loss):
         if self.balance_usdt <= self.initial_balance * (1 - MAX_DRAWDOWN_PERCENT):
             # send_telegram_message("Max drawdown reached! Stopping bot.") # УДАЛЕНО
-            print("Max drawdown reached! Stopping bot.")
+            self.log.warning("Max drawdown reached! Stopping bot.")
             self.session_started = False
             return False
-        # Проверка дневного лимита потерь
-        current_daily_loss_abs = abs(sum(t['pnl_usdt'] for t in self.trade_history if t['pnl_usdt'] < 0))
-        if current_daily_loss_abs + potential_loss >= self.daily_start_balance * DAILY_MAX_LOSS_PERCENT:
+        # Проверка дневного лимита потерь (убытки с последнего reset_daily)
+        if abs(self.daily_loss) + potential_loss >= self.daily_start_balance * DAILY_MAX_LOSS_PERCENT:
             # send_telegram_message("Daily max loss reached! Stopping for today.") # УДАЛЕНО
-            print("Daily max loss reached! Stopping for today.")
+            self.log.warning("Daily max loss reached! Stopping for today.")
             return False
         return True
 
@@ -137,8 +191,11 @@ class PaperAccount:
         slippage = position_size_usdt * SLIPPAGE_PERCENT
         self.balance_usdt -= commission + slippage
 
-        msg = f"Enter {'LONG' if is_long else 'SHORT'}: Price {current_price:.2f}, Size {position_size_usdt:.2f} USDT, SL {self.stop_loss_level:.2f}, TP {self.take_profit_level:.2f}"
-        print(msg)
+        side = 'LONG' if is_long else 'SHORT'
+        botlog.event(self.log, 'entry', "Enter %s: Price %.2f, Size %.2f USDT, SL %.2f, TP %.2f",
+                     side, current_price, position_size_usdt, sl_level, tp_level,
+                     symbol=SYMBOL, side=side, price=float(current_price), size_usdt=float(position_size_usdt),
+                     sl=float(sl_level), tp=float(tp_level))
         # send_telegram_message(msg) # УДАЛЕНО
         self.update_redis_status(is_in_position=True) # <-- НОВОЕ
         return True
@@ -172,11 +229,17 @@ class PaperAccount:
         self.is_in_position = False
         self.position = 0.0
 
-        msg = f"Close {'LONG' if self.is_long else 'SHORT'}: Price {current_price:.2f}, PnL {pnl_usdt:.2f} ({pnl_percent:.2f}%), Reason: {reason}\nBalance: {self.balance_usdt:.2f}"
-        print(msg)
+        side = 'LONG' if self.is_long else 'SHORT'
+        botlog.event(self.log, 'exit', "Close %s: Price %.2f, PnL %.2f (%.2f%%), Reason: %s, Balance: %.2f",
+                     side, current_price, pnl_usdt, pnl_percent, reason, self.balance_usdt,
+                     symbol=SYMBOL, side=side, price=float(current_price), pnl_usdt=float(pnl_usdt),
+                     pnl_percent=float(pnl_percent), reason=reason, balance=float(self.balance_usdt))
         # send_telegram_message(msg) # УДАЛЕНО
         self.update_redis_status(is_in_position=False) # <-- НОВОЕ
 
+    def equity(self, current_price):
+        return self.balance_usdt + (abs(self.position) * current_price if self.is_in_position else 0)
+
     def get_pnl(self, current_price):
         if self.is_in_position:
             direction = 1 if self.is_long else -1
@@ -188,84 +251,101 @@ class PaperAccount:
         """Отправляет текущий статус бота в Redis.""" # <-- НОВАЯ ФУНКЦИЯ
         if is_running is None: is_running = self.session_started
         if is_in_position is None: is_in_position = self.is_in_position
-        try:
-            r.hset(f'bot_status:{BOT_ID}', mapping={
-                'running': 1 if is_running else 0,
-                'in_position': 1 if is_in_position else 0,
-                'last_update': time.time()
-            })
-        except Exception as e:
-            print(f"Redis status update error: {e}")
+        publisher.hset(f'bot_status:{BOT_ID}', ttl=STATUS_TTL, mapping={
+            'running': 1 if is_running else 0,
+            'in_position': 1 if is_in_position else 0,
+            'last_update': time.time(),
+            **redis_pool.summary('bot')
+        })
 
     def generate_report(self, current_price):
         """Генерирует отчет и отправляет его в Redis.""" # <-- МОДИФИЦИРОВАНО
         pnl_usdt, pnl_percent = self.get_pnl(current_price)
-        equity = self.balance_usdt + (abs(self.position) * current_price if self.is_in_position else 0)
+        equity = self.equity(current_price)
         
         # Обновление статистики в Redis
-        try:
-            r.hset(f'bot_stats:{BOT_ID}', mapping={
-                'balance': f"{self.balance_usdt:.2f}",
-                'equity': f"{equity:.2f}",
-                'pnl_unrealized': f"{pnl_usdt:.2f}",
-                'pnl_percent_unrealized': f"{pnl_percent:.2f}",
-                'trades_count': len(self.trade_history),
-                'session_pnl': f"{sum(t['pnl_usdt'] for t in self.trade_history):.2f}",
-                'current_price': f"{current_price:.2f}",
-                'is_long': self.is_long,
-                'entry_price': f"{self.entry_price:.2f}"
-            })
-        except Exception as e:
-            print(f"Redis report update error: {e}")
+        publisher.hset(f'bot_stats:{BOT_ID}', ttl=STATS_TTL, mapping={
+            'balance': f"{self.balance_usdt:.2f}",
+            'equity': f"{equity:.2f}",
+            'pnl_unrealized': f"{pnl_usdt:.2f}",
+            'pnl_percent_unrealized': f"{pnl_percent:.2f}",
+            'trades_count': len(self.trade_history),
+            'session_pnl': f"{sum(t['pnl_usdt'] for t in self.trade_history):.2f}",
+            'current_price': f"{current_price:.2f}",
+            'is_long': self.is_long,
+            'entry_price': f"{self.entry_price:.2f}"
+        })
 
     def session_summary(self):
         """Отправляет итоговый отчет в Redis.""" # <-- МОДИФИЦИРОВАНО
         total_pnl = sum(t['pnl_usdt'] for t in self.trade_history)
         # Отправляем итоговый отчет в специальный ключ
-        try:
-            r.set(f'bot_summary:{BOT_ID}', f"Final Balance {self.balance_usdt:.2f}, Total PnL {total_pnl:.2f}, Trades {len(self.trade_history)}")
-        except Exception as e:
-            print(f"Redis summary update error: {e}")
-        print(f"Session Summary: Final Balance {self.balance_usdt:.2f}, Total PnL {total_pnl:.2f}, Trades {len(self.trade_history)}")
+        publisher.set(f'bot_summary:{BOT_ID}', f"Final Balance {self.balance_usdt:.2f}, Total PnL {total_pnl:.2f}, Trades {len(self.trade_history)}")
+        self.log.info("Session Summary: Final Balance %.2f, Total PnL %.2f, Trades %d", self.balance_usdt, total_pnl, len(self.trade_history))
+
+class ShadowAccount(PaperAccount):
+    """Счет теневого варианта (shadow.py): правила и лимиты PaperAccount без записи статуса в Redis."""
+    def __init__(self, initial_balance):
+        super().__init__(initial_balance)
+        self.session_started = True
+
+    def update_redis_status(self, is_running=None, is_in_position=None):
+        pass
 
 # --- ДАННЫЕ И СИГНАЛЫ (Обновлено) ---
 @retry_api()
 def get_data(symbol, interval, limit=200):
-    klines = client.get_historical_klines(symbol, interval, limit=500)
+    from klines import parse_klines
+    klines = get_client().get_historical_klines(symbol, interval, limit=500)
     if len(klines) < 200:
         raise ValueError("Incomplete data")
-    df = pd.DataFrame(klines, columns=['open_time', 'Open', 'High', 'Low', 'Close', 'Volume', 'close_time', 'qav', 'trades', 'tbav', 'tqav', 'ignore'])
-    df['Close'] = pd.to_numeric(df['Close'])
-    df['High'] = pd.to_numeric(df['High'])
-    df['Low'] = pd.to_numeric(df['Low'])
-    df['Open'] = pd.to_numeric(df['Open'])
-    return df
-
-def calculate_indicators(df):
+    # Колонки NumPy вместо DataFrame из строк
+    return parse_klines(klines)
+
+@retry_api()
+def fetch_klines(symbol, interval, start_ms, end_ms):
+    """Свечи по диапазону времени открытия (докачка пропусков после переподключения)."""
+    return get_client().get_historical_klines(symbol, interval, start_str=start_ms, end_str=end_ms)
+
+def calculate_indicators(data):
     """Рассчитывает индикаторы MACD и EMA Cloud."""
-    df = calculate_macd(df, MACD_FAST, MACD_SLOW, MACD_SIGNAL)
-    df = calculate_ema_cloud(df, EMA_PERIODS)
-    return df
+    data = calculate_macd(data, MACD_FAST, MACD_SLOW, MACD_SIGNAL)
+    data = calculate_ema_cloud(data, EMA_PERIODS)
+    return data
+
+def macd_filter(df_higher):
+    """Направление фильтра MACD 15m: 'LONG', 'SHORT' или None."""
+    macd_curr = df_higher['MACD'][-1]
+    macd_signal_curr = df_higher['MACD_Signal'][-1]
+    if macd_curr > macd_signal_curr:
+        return 'LONG'
+    if macd_curr < macd_signal_curr:
+        return 'SHORT'
+    return None
+
+def calculate_trigger_levels(df_main):
+    """Уровни цены текущего бара, при которых EMA Cloud даст сигнал (long, short)."""
+    import indicators
+    emas = [df_main[f'EMA_{p}'][-1] for p in EMA_PERIODS]
+    return indicators.ema_cloud_cross_levels(emas, EMA_PERIODS, df_main['Close'][-1])
 
 def generate_signals(df_main, df_higher):
     """Генерирует сигнал на основе MACD 15m (фильтр) и EMA Cloud 5m (вход)."""
-    if len(df_main) < 2 or len(df_higher) < 2:
+    if len(df_main['Close']) < 2 or len(df_higher['Close']) < 2:
         return None
 
     # Фильтр 15m (MACD)
-    macd_curr = df_higher['MACD'].iloc[-1]
-    macd_signal_curr = df_higher['MACD_Signal'].iloc[-1]
-    
-    bullish_filter = macd_curr > macd_signal_curr
-    bearish_filter = macd_curr < macd_signal_curr
+    direction = macd_filter(df_higher)
+    bullish_filter = direction == 'LONG'
+    bearish_filter = direction == 'SHORT'
 
     # Сигнал 5m (Пересечение EMA Cloud) - смотрим на последнюю закрытую свечу (-1)
-    prev_close = df_main['Close'].iloc[-2]
-    current_close = df_main['Close'].iloc[-1]
+    prev_close = df_main['Close'][-2]
+    current_close = df_main['Close'][-1]
     
     # EMA Cloud на текущей свече
-    ema_cloud_high = df_main['EMA_Cloud_High'].iloc[-1]
-    ema_cloud_low = df_main['EMA_Cloud_Low'].iloc[-1]
+    ema_cloud_high = df_main['EMA_Cloud_High'][-1]
+    ema_cloud_low = df_main['EMA_Cloud_Low'][-1]
     
     # Пересечение вверх (вход в Лонг)
     cross_up = (prev_close < ema_cloud_high) and (current_close > ema_cloud_high)
@@ -281,147 +361,278 @@ def generate_signals(df_main, df_higher):
         
     return None
 
-# --- WEBSOCKET ЛОГИКА (Небольшие изменения) ---
-def on_message(ws, message, account):
+def enter_on_signal(account, signal, current_price):
+    """Расчет SL/TP и размера позиции, вход при соблюдении лимитов."""
+    direction = 1 if signal == 'LONG' else -1
+    
+    # 1. Расчет SL/TP на основе фиксированных процентов
+    stop_loss_level = current_price * (1 - direction * RISK_PERCENT_SL)
+    take_profit_level = current_price * (1 + direction * PROFIT_PERCENT_TP)
+    
+    # 2. Расчет расстояния до SL в USD (Риск на 1 монету)
+    if signal == 'LONG':
+        price_diff_sl = current_price - stop_loss_level
+    else: # SHORT
+        price_diff_sl = stop_loss_level - current_price
+    
+    # 3. Расчет размера позиции в USDT для входа (Стоимость позиции)
+    if price_diff_sl <= 0: 
+        log.error("SL distance is zero or negative.")
+        return False
+        
+    position_size_usdt_entry = (RISK_AMOUNT_USD / price_diff_sl) * current_price
+    
+    # 4. Проверка лимитов и минимального размера
+    if account.check_limits(RISK_AMOUNT_USD) and position_size_usdt_entry >= 10:
+        return account.enter_position(current_price, signal == 'LONG', position_size_usdt_entry, stop_loss_level, take_profit_level)
+    return False
+
+def trade_on_candle(account, signal, current_price):
+    """Выход по SL/TP/обратному сигналу или вход на закрытой свече (основной и теневые счета)."""
+    if account.is_in_position:
+        # Проверка Stop-Loss
+        if (account.is_long and current_price <= account.stop_loss_level) or (not account.is_long and current_price >= account.stop_loss_level):
+            account.close_position(current_price, "STOP_LOSS")
+        # Проверка Take-Profit
+        elif (account.is_long and current_price >= account.take_profit_level) or (not account.is_long and current_price <= account.take_profit_level):
+            account.close_position(current_price, "TAKE_PROFIT")
+        # Проверка Обратного Сигнала (против стороны позиции: вход внутри бара
+        # того же направления не закрывается на закрытии своего бара)
+        elif (account.is_long and signal == 'SHORT') or (not account.is_long and signal == 'LONG'):
+            account.close_position(current_price, "REVERSE_SIGNAL")
+
+    elif signal:
+        enter_on_signal(account, signal, current_price)
+
+def publish_triggers(watcher):
+    """Отправляет уровни входа текущего бара в Redis."""
+    publisher.hset(f'bot_triggers:{BOT_ID}', ttl=STATS_TTL, mapping={
+        'long_level': f"{watcher.long_level:.2f}",
+        'short_level': f"{watcher.short_level:.2f}",
+        'filter': watcher.direction or 'NONE',
+        'last_update': time.time()
+    })
+
+# --- ТЕНЕВЫЕ ВАРИАНТЫ ---
+def live_params():
+    """Рабочий набор параметров MACD/EMA Cloud (вариант 'live')."""
+    return {
+        'MACD_FAST': MACD_FAST,
+        'MACD_SLOW': MACD_SLOW,
+        'MACD_SIGNAL': MACD_SIGNAL,
+        'EMA_PERIODS': EMA_PERIODS
+    }
+
+def shadow_evaluate(caches, params):
+    """Сигнал и уровни входа варианта по общему кэшу индикаторов."""
+    import indicators
+    main, higher = caches[INTERVAL], caches[HIGHER_INTERVAL]
+    macd_line, macd_signal = higher.macd(params['MACD_FAST'], params['MACD_SLOW'], params['MACD_SIGNAL'])
+    df_higher = {'Close': higher.close, 'MACD': macd_line, 'MACD_Signal': macd_signal}
+    cloud_high, cloud_low = main.ema_cloud(params['EMA_PERIODS'])
+    df_main = {'Close': main.close, 'EMA_Cloud_High': cloud_high, 'EMA_Cloud_Low': cloud_low}
+
+    levels = None
+    if INTRABAR_ENTRIES:
+        periods = params['EMA_PERIODS']
+        emas = [main.ema(p)[-1] for p in periods]
+        long_level, short_level = indicators.ema_cloud_cross_levels(emas, periods, main.close[-1])
+        levels = (long_level, short_level, macd_filter(df_higher))
+    return generate_signals(df_main, df_higher), levels
+
+def shadow_runner(publisher, variants, balance, **kwargs):
+    """ShadowRunner со счетами и сделками бота (также для прогона на истории в robustness.py)."""
+    from shadow import ShadowRunner
+    return ShadowRunner(
+        publisher, BOT_ID, variants, balance, shadow_evaluate,
+        ShadowAccount, trade_on_candle, enter_on_signal, **kwargs
+    )
+
+def make_shadow(account):
+    from shadow import load_variants
+    variants = load_variants(r, BOT_ID, live_params(), SHADOW_VARIANTS)
+    shadow = shadow_runner(publisher, variants, account.initial_balance)
+    shadow.reset()
+    log.info("Shadow mode: %d variants (%s)", len(variants), ', '.join(name for name, _ in variants))
+    return shadow
+
+# --- WEBSOCKET ЛОГИКА (Буферы свечей вместо загрузки истории на каждой свече) ---
+awaiting_higher = 0.0 # Время закрытия 5m свечи, ждущей закрытия 15m свечи (0 - не ждет)
+
+def higher_is_current(buffers):
+    """Закрыта ли уже 15m свеча, заканчивающаяся вместе с последней закрытой 5m."""
+    main, higher = buffers[INTERVAL], buffers[HIGHER_INTERVAL]
+    return higher.last_open_time + 2 * higher.interval_ms > main.last_open_time + main.interval_ms
+
+def on_tick(interval, price, buffers, account, watcher, shadow=None):
+    """Тик незакрытой свечи: вход по заранее рассчитанным уровням, O(1)."""
+    global awaiting_higher
+    if awaiting_higher and time.time() - awaiting_higher >= HIGHER_CLOSE_WAIT:
+        # 15m свеча не пришла - сигнал по последней закрытой, как без ожидания
+        log.warning("No %s close within %ss, evaluating %s candle without it", HIGHER_INTERVAL, HIGHER_CLOSE_WAIT, INTERVAL)
+        awaiting_higher = 0.0
+        evaluate_candle(buffers, account, watcher, shadow)
+    if interval != INTERVAL or not account.session_started:
+        return
+    if shadow:
+        shadow.on_tick(price)
+    if account.is_in_position:
+        return
+    signal = watcher.check(price)
+    if signal:
+        botlog.event(log, 'signal', "Intrabar trigger %s at %.2f", signal, price,
+                     symbol=SYMBOL, signal=signal, price=float(price), source='intrabar')
+        enter_on_signal(account, signal, price)
+
+def on_candle(interval, buffers, account, watcher, shadow=None):
+    """Закрытие свечи: сигнал проверяется по закрытию 5m, при необходимости после закрытия 15m."""
+    global awaiting_higher
+    if interval == INTERVAL:
+        if not account.session_started:
+            return
+        # Повторное закрытие 5m без 15m - не ждем дальше
+        if not awaiting_higher and not higher_is_current(buffers):
+            awaiting_higher = time.time()
+            # Уровни закрывшегося бара устарели: до оценки новой свечи входов на тиках нет
+            watcher.disarm()
+            if shadow:
+                shadow.disarm()
+            return
+    elif interval != HIGHER_INTERVAL or not awaiting_higher:
+        return
+    awaiting_higher = 0.0
+    evaluate_candle(buffers, account, watcher, shadow)
+
+def evaluate_candle(buffers, account, watcher, shadow=None):
     try:
-        data = json.loads(message)
-        # Проверяем, что это сообщение о закрытии свечи
-        if data.get('e') == 'kline' and data['k']['x']: 
-            if not account.session_started:
-                return
-
-            # Получаем и рассчитываем данные
-            df_main = get_data(SYMBOL, INTERVAL)
-            df_higher = get_data(SYMBOL, HIGHER_INTERVAL)
-            if df_main is None or df_higher is None:
-                return
-
-            df_main = calculate_indicators(df_main)
-            df_higher = calculate_indicators(df_higher)
-
-            current_price = float(data['k']['c'])
+        if account.session_started:
+            started = time.perf_counter()
+
+            # Рассчитываем индикаторы по буферам закрытых свечей
+            df_main = calculate_indicators(buffers[INTERVAL].columns())
+            df_higher = calculate_indicators(buffers[HIGHER_INTERVAL].columns())
+
+            current_price = buffers[INTERVAL].close[-1]
+            close_ts = (buffers[INTERVAL].last_open_time + buffers[INTERVAL].interval_ms) / 1000
+            account.roll_day(close_ts)
             signal = generate_signals(df_main, df_higher)
+            if signal:
+                botlog.event(log, 'signal', "Signal %s at %.2f", signal, current_price,
+                             symbol=SYMBOL, signal=signal, price=float(current_price), source='candle')
 
-            if account.is_in_position:
-                direction = 1 if account.is_long else -1
-                
-                # Проверка Stop-Loss
-                if (account.is_long and current_price <= account.stop_loss_level) or (not account.is_long and current_price >= account.stop_loss_level):
-                    account.close_position(current_price, "STOP_LOSS")
-                # Проверка Take-Profit
-                elif (account.is_long and current_price >= account.take_profit_level) or (not account.is_long and current_price <= account.take_profit_level):
-                    account.close_position(current_price, "TAKE_PROFIT")
-                # Проверка Обратного Сигнала
-                elif (account.is_in_position and signal == 'SHORT') or (not account.is_in_position and signal == 'LONG'):
-                    account.close_position(current_price, "REVERSE_SIGNAL")
-
-            elif signal:
-                direction = 1 if signal == 'LONG' else -1
-                
-                # 1. Расчет SL/TP на основе фиксированных процентов
-                stop_loss_level = current_price * (1 - direction * RISK_PERCENT_SL)
-                take_profit_level = current_price * (1 + direction * PROFIT_PERCENT_TP)
-                
-                # 2. Расчет расстояния до SL в USD (Риск на 1 монету)
-                if signal == 'LONG':
-                    price_diff_sl = current_price - stop_loss_level
-                else: # SHORT
-                    price_diff_sl = stop_loss_level - current_price
-                
-                # 3. Расчет размера позиции в USDT для входа (Стоимость позиции)
-                if price_diff_sl <= 0: 
-                    print("Error: SL distance is zero or negative.")
-                    return
-                    
-                position_size_usdt_entry = (RISK_AMOUNT_USD / price_diff_sl) * current_price
-                
-                # 4. Проверка лимитов и минимального размера
-                if account.check_limits(RISK_AMOUNT_USD) and position_size_usdt_entry >= 10:
-                    account.enter_position(current_price, signal == 'LONG', position_size_usdt_entry, stop_loss_level, take_profit_level)
+            trade_on_candle(account, signal, current_price)
+
+            # Уровни входа для следующего бара (проверяются на тиках в on_tick)
+            if INTRABAR_ENTRIES:
+                long_level, short_level = calculate_trigger_levels(df_main)
+                watcher.update(long_level, short_level, macd_filter(df_higher))
+                publish_triggers(watcher)
 
             account.generate_report(current_price)
+
+            # Теневые варианты на тех же закрытых свечах
+            if shadow:
+                datasets = {i: buffers[i].columns() for i in (INTERVAL, HIGHER_INTERVAL)}
+                shadow.on_candle(datasets, current_price, ts=close_ts)
+            botlog.latency(log, 'on_candle', started, symbol=SYMBOL, interval=INTERVAL)
     except Exception as e:
-        print(f"WebSocket message error: {e}")
+        log.exception("WebSocket message error: %s", e)
         # send_telegram_message(f"Error processing WebSocket message: {e}") # УДАЛЕНО
 
-def on_error(ws, error):
-    print(f"WebSocket error: {error}")
-    # send_telegram_message(f"WebSocket error: {error}") # УДАЛЕНО
-
-def on_close(ws, close_status_code, close_msg):
-    print("WebSocket closed")
-    # send_telegram_message("WebSocket connection closed.") # УДАЛЕНО
-
-def on_open(ws):
-    print("WebSocket opened")
-    ws.send(json.dumps({
-        "method": "SUBSCRIBE",
-        "params": [f"{SYMBOL.lower()}@kline_{INTERVAL}"],
-        "id": 1
-    }))
-
 # --- run_websocket (МОДИФИЦИРОВАНО) ---
 def run_websocket(account):
-    websocket_url = "wss://stream.binance.com:9443/ws"
-    ws = websocket.WebSocketApp(
-        websocket_url,
-        on_message=lambda ws, msg: on_message(ws, msg, account),
-        on_error=on_error,
-        on_close=on_close,
-        on_open=on_open
-    )
-    ws_thread = threading.Thread(target=ws.run_forever)
-    ws_thread.daemon = True
-    ws_thread.start()
+    global awaiting_higher
+    from klines import KlineBuffer
+    from ws_stream import KlineStream
+    from triggers import TriggerWatcher
+    import indicators
+
+    # Компиляция/загрузка ядер индикаторов до первой свечи
+    indicators.warmup()
+
+    # Начальная загрузка истории один раз, далее буферы пополняются из потока
+    buffers = {}
+    for interval in (INTERVAL, HIGHER_INTERVAL):
+        buffers[interval] = KlineBuffer(interval)
+        buffers[interval].load(get_data(SYMBOL, interval))
+
+    # Уровни входа для текущего бара по загруженной истории
+    watcher = TriggerWatcher()
+    if INTRABAR_ENTRIES:
+        df_main = calculate_indicators(buffers[INTERVAL].columns())
+        df_higher = calculate_indicators(buffers[HIGHER_INTERVAL].columns())
+        long_level, short_level = calculate_trigger_levels(df_main)
+        watcher.update(long_level, short_level, macd_filter(df_higher))
+        publish_triggers(watcher)
+
+    shadow = make_shadow(account) if SHADOW_MODE else None
+    awaiting_higher = 0.0
+
+    on_candle_cb = lambda interval: on_candle(interval, buffers, account, watcher, shadow)
+    on_tick_cb = (lambda interval, price: on_tick(interval, price, buffers, account, watcher, shadow)) if INTRABAR_ENTRIES else None
+    stream = KlineStream(SYMBOL, buffers, fetch_klines, on_candle_cb, on_tick_cb)
+    stream.start()
 
     # --- ПРОВЕРКА КОМАНДЫ СТОП ЧЕРЕЗ REDIS ---
+    last_heartbeat = time.time()
     while account.session_started:
         time.sleep(1)
+        if time.time() - last_heartbeat >= STATUS_HEARTBEAT:
+            account.update_redis_status()
+            last_heartbeat = time.time()
         try:
+            command = r.get(f'command:{BOT_ID}')
             # Если в Redis есть команда STOP для этого бота, останавливаем
-            if r.get(f'command:{BOT_ID}') == 'STOP':
-                print(f"Received STOP command from Redis for {BOT_ID}.")
+            if command == 'STOP':
+                log.info("Received STOP command from Redis for %s.", BOT_ID)
                 r.delete(f'command:{BOT_ID}') # Удаляем команду
                 account.session_started = False
                 break
+            # Профилирование работающего бота на N секунд
+            if command and command.startswith('PROFILE'):
+                r.delete(f'command:{BOT_ID}')
+                get_profiler().handle_command(command)
         except Exception as e:
-            print(f"Redis command check error: {e}")
+            log.warning("Redis command check error: %s", e)
             
-        if not ws_thread.is_alive():
-            print("WebSocket thread died, restarting...")
+        if not stream.is_alive():
+            log.warning("WebSocket stream died, restarting...")
             # send_telegram_message("WebSocket connection lost, attempting to restart...") # УДАЛЕНО
-            ws_thread = threading.Thread(target=ws.run_forever)
-            ws_thread.daemon = True
-            ws_thread.start()
+            stream.stop()
+            stream = KlineStream(SYMBOL, buffers, fetch_klines, on_candle_cb, on_tick_cb)
+            stream.start()
     # --- КОНЕЦ ПРОВЕРКИ ---
 
     # При остановке (либо по команде, либо по MAX_DRAWDOWN)
     if not account.session_started:
-        ws.close()
+        stream.stop()
         # При остановке получаем актуальную цену с API для закрытия
         try:
-            current_price = float(client.get_symbol_ticker(symbol=SYMBOL)['price'])
+            current_price = float(get_client().get_symbol_ticker(symbol=SYMBOL)['price'])
             if account.is_in_position:
                 account.close_position(current_price, "COMMAND_STOP")
             account.session_summary()
         except Exception as e:
-            print(f"Error during final closing: {e}")
+            log.error("Error during final closing: %s", e)
         
     account.update_redis_status() # Обновить статус в Redis на 'остановлен'
 
 # --- ЗАПУСК (МОДИФИЦИРОВАН) ---
 def run_bot(bot_id):
-    # При запуске проверяем Redis на команду START
-    if r.get(f'command:{bot_id}') == 'START':
-        r.delete(f'command:{bot_id}')
-        
+    # START, ожидающий при запуске, выполняется: его ставит воркер (worker.py),
+    # если последней командой панели для экземпляра был START
     demo_account = PaperAccount(initial_balance=100.00)
     
     # Основной цикл для ожидания команды START
     while True:
         try:
-            if r.get(f'command:{bot_id}') == 'START':
-                print(f"Received START command from Redis for {bot_id}. Starting...")
+            command = r.get(f'command:{bot_id}')
+            if command and command.startswith('PROFILE'):
+                # Профилируется только работающий бот: команда не ждет следующего START
+                r.delete(f'command:{bot_id}')
+                log.warning("PROFILE command ignored: bot %s is not running.", bot_id)
+            if command == 'START':
+                log.info("Received START command from Redis for %s. Starting...", bot_id)
                 r.delete(f'command:{bot_id}')
                 demo_account.session_started = True
                 demo_account.reset_daily()
@@ -429,10 +640,12 @@ def run_bot(bot_id):
                 demo_account.update_redis_status(is_running=True)
                 # Запускаем торговую логику
                 run_websocket(demo_account)
-                print(f"Bot {bot_id} finished run_websocket, waiting for next START command.")
+                # Сессия завершена (STOP или лимит): при перезапуске процесса торговля не возобновляется
+                registry.set_run_state(r, bot_id, 'STOP')
+                log.info("Bot %s finished run_websocket, waiting for next START command.", bot_id)
             
             # Обновление статуса 'ожидает' в Redis
-            r.hset(f'bot_status:{bot_id}', mapping={
+            publisher.hset(f'bot_status:{bot_id}', ttl=STATUS_TTL, mapping={
                 'running': 0,
                 'in_position': 0,
                 'last_update': time.time(),
@@ -441,14 +654,15 @@ def run_bot(bot_id):
             time.sleep(5) # Ожидание команды START
             
         except Exception as e:
-            print(f"Critical error in main loop: {e}")
+            log.exception("Critical error in main loop: %s", e)
             time.sleep(5)
 
 if __name__ == "__main__":
-    print(f"Бот {BOT_ID} запущен, ожидает команды START.")
+    botlog.setup(BOT_ID)
+    log.info("Бот %s запущен, ожидает команды START.", BOT_ID)
     # send_telegram_message("Бот запущен, ожидает команды.\nВведите команду для старта 'старт' или 'start' и для остановки 'стоп' или 'stop'.") # УДАЛЕНО
     try:
         run_bot(BOT_ID)
     except Exception as e:
-        print(f"Critical error: {e}")
+        log.critical("Critical error: %s", e, exc_info=True)
         sys.exit(1)
\ No newline at end of file
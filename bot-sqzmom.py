@@ -1,20 +1,18 @@
-import pandas as pd
-import numpy as np
-from binance.client import Client
-from binance.exceptions import BinanceAPIException
-import websocket
-import json
+# Тяжелые модули (numpy, numba, python-binance, websocket) импортируются при первом START,
+# чтобы процесс в ожидании команды стартовал быстро и занимал минимум памяти
 import time
-import threading
 import sys
-import requests
-from datetime import datetime, timezone, timedelta
-import redis # <-- НОВЫЙ ИМПОРТ
+import os
+import logging
+import botlog
+import redis_pool
+import registry
+from redis_publisher import RedisPublisher
 
 # --- НАСТРОЙКИ (Обновлено для SQZMOM стратегии) ---
-SYMBOL = 'ETHUSDT'
-INTERVAL = Client.KLINE_INTERVAL_15MINUTE
-HIGHER_INTERVAL = Client.KLINE_INTERVAL_15MINUTE # Не используется, но оставляем для структуры
+SYMBOL = os.environ.get('SYMBOL', 'ETHUSDT') # Задается воркером (worker.py) для экземпляра из реестра
+INTERVAL = '15m' # Client.KLINE_INTERVAL_15MINUTE
+HIGHER_INTERVAL = '15m' # Не используется, но оставляем для структуры
 
 # Настройки Squeeze Momentum
 SQZ_BB_ДЛИНА = 30
@@ -23,6 +21,15 @@ SQZ_KC_ДЛИНА = 30
 SQZ_KC_МУЛЬТИФАКТОР = 1.9
 SQZ_ATR_ПЕРИОД = 14
 
+# Теневой режим: варианты параметров SQZ на том же потоке свечей, каждый со своим
+# бумажным счетом (shadow.py). Варианты можно задать в Redis: shadow_variants:<BOT_ID>
+SHADOW_MODE = True
+SHADOW_VARIANTS = [
+    {'name': 'bb_mult_2.0', 'SQZ_BB_МУЛЬТИФАКТОР': 2.0},
+    {'name': 'kc_mult_1.5', 'SQZ_KC_МУЛЬТИФАКТОР': 1.5},
+    {'name': 'len_20', 'SQZ_BB_ДЛИНА': 20, 'SQZ_KC_ДЛИНА': 20},
+]
+
 # Настройки Риска и Прибыли
 RISK_AMOUNT_USD = 1.00    # Фиксированный риск на сделку в USD
 RISK_PERCENT_SL = 0.005   # 0.5% Стоп-Лосс от цены входа
@@ -37,15 +44,43 @@ COMMISSION_PERCENT = 0.001
 SLIPPAGE_PERCENT = 0.0001 # <-- Изменено, чтобы соответствовать ПРОСКАЛЬЗЫВАНИЕ_ДОЛЯ из backtest
 
 # --- НАСТРОЙКИ REDIS И ИДЕНТИФИКАТОР БОТА ---
-BOT_ID = 'sqzmom_bot' # Уникальный ID бота (ИЗМЕНЕНО)
-REDIS_HOST = 'redis' # Имя сервиса Redis в docker-compose
-REDIS_PORT = 6379
-r = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, db=0, decode_responses=True)
+BOT_ID = os.environ.get('BOT_ID', 'sqzmom_bot') # Уникальный ID бота (ИЗМЕНЕНО)
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis') # Имя сервиса Redis в docker-compose
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+# Общий пул (redis_pool.py) для потока WebSocket, главного цикла и фоновой записи:
+# таймауты, проверка соединений и переподключение
+r = redis_pool.client('bot', host=REDIS_HOST, port=REDIS_PORT)
+# Запись состояния идет через фоновый поток (redis_publisher.py): торговый поток не ждет Redis
+publisher = RedisPublisher(r)
+STATUS_TTL = 60          # bot_status без обновлений дольше - бот не работает
+STATUS_HEARTBEAT = 10    # Обновление bot_status во время работы (сек)
+STATS_TTL = 7 * 24 * 3600
+
+# Вывод через очередь и фоновый поток (botlog.py): торговый поток не ждет stdout
+log = logging.getLogger('bot')
 
 # API клиент (публичный)
 API_KEY = ''
 API_SECRET = ''
-client = Client(API_KEY, API_SECRET)
+client = None # Создается при первом START (см. get_client)
+
+def get_client():
+    """Ленивое создание клиента: Client() импортирует python-binance и пингует API."""
+    global client
+    if client is None:
+        from binance.client import Client
+        client = Client(API_KEY, API_SECRET)
+    return client
+
+bot_profiler = None # Создается при первой команде PROFILE (см. get_profiler)
+
+def get_profiler():
+    """Сэмплирующий профайлер (profiler.py), включается командой PROFILE:<сек> с панели."""
+    global bot_profiler
+    if bot_profiler is None:
+        from profiler import BotProfiler
+        bot_profiler = BotProfiler(publisher, BOT_ID)
+    return bot_profiler
 
 # =========================================================================
 # --- ФУНКЦИИ УПРАВЛЕНИЯ (Без Telegram) ---
@@ -61,7 +96,7 @@ def retry_api(max_attempts=3, delay=2):
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
-                    print(f"Retry {attempt+1}/{max_attempts}: {e}")
+                    log.warning("Retry %d/%d: %s", attempt + 1, max_attempts, e)
                     time.sleep(delay * (2 ** attempt))
             raise Exception("Max retries exceeded")
         return wrapper
@@ -70,6 +105,8 @@ def retry_api(max_attempts=3, delay=2):
 # --- УПРАВЛЕНИЕ ТОРГОВЫМ СЧЕТОМ (PaperAccount - Модифицировано) ---
 class PaperAccount:
     """Класс для управления демо-счетом (Из bot.py, с небольшим изменением в PnL)."""
+    log = log # Теневые счета (ShadowAccount) пишут в свой логгер без вывода
+
     def __init__(self, initial_balance):
         self.initial_balance = initial_balance
         self.balance_usdt = initial_balance
@@ -83,6 +120,7 @@ class PaperAccount:
         self.trade_history = []
         self.session_started = False
         self.daily_loss = 0.0
+        self.day = None # День UTC последней закрытой свечи (roll_day)
         self.last_hourly_report = time.time()
         self.last_position_size_usdt = 0.0
 
@@ -91,16 +129,23 @@ class PaperAccount:
         self.daily_loss = 0.0
         # send_telegram_message(f"Daily reset: Start balance {self.daily_start_balance:.2f} USDT") # УДАЛЕНО
 
+    def roll_day(self, ts):
+        """Смена дня UTC по времени закрытия свечи ts (сек): сброс дневного лимита убытка."""
+        day = int(ts // 86400)
+        if self.day is not None and day != self.day:
+            self.reset_daily()
+        self.day = day
+
     def check_limits(self, potential_loss):
         if self.balance_usdt <= self.initial_balance * (1 - MAX_DRAWDOWN_PERCENT):
             # send_telegram_message("Max drawdown reached! Stopping bot.") # УДАЛЕНО
-            print("Max drawdown reached! Stopping bot.")
+            self.log.warning("Max drawdown reached! Stopping bot.")
             self.session_started = False
             return False
         
         if abs(self.daily_loss) + potential_loss >= self.daily_start_balance * DAILY_MAX_LOSS_PERCENT:
             # send_telegram_message("Daily max loss reached! Stopping for today.") # УДАЛЕНО
-            print("Daily max loss reached! Stopping for today.")
+            self.log.warning("Daily max loss reached! Stopping for today.")
             return False
         return True
 
@@ -123,8 +168,11 @@ class PaperAccount:
         commission = position_size_usdt_entry * COMMISSION_PERCENT
         self.balance_usdt -= commission
 
-        msg = f"Enter {'LONG' if is_long else 'SHORT'}: Price {current_price:.4f} (w/ Slippage), SL {self.stop_loss_level:.4f}, TP {self.take_profit_level:.4f}"
-        print(msg)
+        side = 'LONG' if is_long else 'SHORT'
+        botlog.event(self.log, 'entry', "Enter %s: Price %.4f (w/ Slippage), SL %.4f, TP %.4f",
+                     side, current_price, sl_level, tp_level,
+                     symbol=SYMBOL, side=side, price=float(current_price), size_usdt=float(position_size_usdt_entry),
+                     sl=float(sl_level), tp=float(tp_level))
         # send_telegram_message(msg) # УДАЛЕНО
         self.update_redis_status(is_in_position=True) # <-- НОВОЕ
         return True
@@ -159,11 +207,17 @@ class PaperAccount:
         self.position = 0.0
         self.last_position_size_usdt = 0.0
 
-        msg = f"Close {'LONG' if self.is_long else 'SHORT'}: Price {current_price:.4f}, PnL {pnl_usdt:.2f} ({pnl_percent:.2f}%), Reason: {reason}\nBalance: {self.balance_usdt:.2f}"
-        print(msg)
+        side = 'LONG' if self.is_long else 'SHORT'
+        botlog.event(self.log, 'exit', "Close %s: Price %.4f, PnL %.2f (%.2f%%), Reason: %s, Balance: %.2f",
+                     side, current_price, pnl_usdt, pnl_percent, reason, self.balance_usdt,
+                     symbol=SYMBOL, side=side, price=float(current_price), pnl_usdt=float(pnl_usdt),
+                     pnl_percent=float(pnl_percent), reason=reason, balance=float(self.balance_usdt))
         # send_telegram_message(msg) # УДАЛЕНО
         self.update_redis_status(is_in_position=False) # <-- НОВОЕ
         
+    def equity(self, current_price):
+        return self.balance_usdt + (abs(self.position) * current_price if self.is_in_position else 0)
+
     def get_pnl(self, current_price):
         if self.is_in_position:
             direction = 1 if self.is_long else -1
@@ -175,86 +229,61 @@ class PaperAccount:
         """Отправляет текущий статус бота в Redis.""" # <-- НОВАЯ ФУНКЦИЯ
         if is_running is None: is_running = self.session_started
         if is_in_position is None: is_in_position = self.is_in_position
-        try:
-            r.hset(f'bot_status:{BOT_ID}', mapping={
-                'running': 1 if is_running else 0,
-                'in_position': 1 if is_in_position else 0,
-                'last_update': time.time()
-            })
-        except Exception as e:
-            print(f"Redis status update error: {e}")
+        publisher.hset(f'bot_status:{BOT_ID}', ttl=STATUS_TTL, mapping={
+            'running': 1 if is_running else 0,
+            'in_position': 1 if is_in_position else 0,
+            'last_update': time.time(),
+            **redis_pool.summary('bot')
+        })
 
     def generate_report(self, current_price):
         """Генерирует отчет и отправляет его в Redis.""" # <-- МОДИФИЦИРОВАНО
         pnl_usdt, pnl_percent = self.get_pnl(current_price)
-        equity = self.balance_usdt + (abs(self.position) * current_price if self.is_in_position else 0)
+        equity = self.equity(current_price)
         
         # Обновление статистики в Redis
-        try:
-            r.hset(f'bot_stats:{BOT_ID}', mapping={
-                'balance': f"{self.balance_usdt:.2f}",
-                'equity': f"{equity:.2f}",
-                'pnl_unrealized': f"{pnl_usdt:.2f}",
-                'pnl_percent_unrealized': f"{pnl_percent:.2f}",
-                'trades_count': len(self.trade_history),
-                'session_pnl': f"{sum(t['pnl_usdt'] for t in self.trade_history):.2f}",
-                'current_price': f"{current_price:.4f}", # Изменено для ETHUSDT
-                'is_long': self.is_long,
-                'entry_price': f"{self.entry_price:.4f}" # Изменено для ETHUSDT
-            })
-        except Exception as e:
-            print(f"Redis report update error: {e}")
+        publisher.hset(f'bot_stats:{BOT_ID}', ttl=STATS_TTL, mapping={
+            'balance': f"{self.balance_usdt:.2f}",
+            'equity': f"{equity:.2f}",
+            'pnl_unrealized': f"{pnl_usdt:.2f}",
+            'pnl_percent_unrealized': f"{pnl_percent:.2f}",
+            'trades_count': len(self.trade_history),
+            'session_pnl': f"{sum(t['pnl_usdt'] for t in self.trade_history):.2f}",
+            'current_price': f"{current_price:.4f}", # Изменено для ETHUSDT
+            'is_long': self.is_long,
+            'entry_price': f"{self.entry_price:.4f}" # Изменено для ETHUSDT
+        })
 
     def session_summary(self):
         """Отправляет итоговый отчет в Redis.""" # <-- МОДИФИЦИРОВАНО
         total_pnl = sum(t['pnl_usdt'] for t in self.trade_history)
         # Отправляем итоговый отчет в специальный ключ
-        try:
-            r.set(f'bot_summary:{BOT_ID}', f"Final Balance {self.balance_usdt:.2f}, Total PnL {total_pnl:.2f}, Trades {len(self.trade_history)}")
-        except Exception as e:
-            print(f"Redis summary update error: {e}")
-        print(f"Session Summary: Final Balance {self.balance_usdt:.2f}, Total PnL {total_pnl:.2f}, Trades {len(self.trade_history)}")
+        publisher.set(f'bot_summary:{BOT_ID}', f"Final Balance {self.balance_usdt:.2f}, Total PnL {total_pnl:.2f}, Trades {len(self.trade_history)}")
+        self.log.info("Session Summary: Final Balance %.2f, Total PnL %.2f, Trades %d", self.balance_usdt, total_pnl, len(self.trade_history))
+
+class ShadowAccount(PaperAccount):
+    """Счет теневого варианта (shadow.py): правила и лимиты PaperAccount без записи статуса в Redis."""
+    def __init__(self, initial_balance):
+        super().__init__(initial_balance)
+        self.session_started = True
+
+    def update_redis_status(self, is_running=None, is_in_position=None):
+        pass
 
 # =========================================================================
 # --- ФУНКЦИИ РАСЧЕТА ИНДИКАТОРОВ (Логика SQZMOM из sqzmom_backtest.py) ---
 # =========================================================================
 
-def calculate_atr(df, period):
-    """Вычисляет Средний Истинный Диапазон (ATR)."""
-    tr = pd.DataFrame({
-        'h1': df['High'] - df['Low'],
-        'hc': (df['High'] - df['Close'].shift(1)).abs(),
-        'lc': (df['Low'] - df['Close'].shift(1)).abs()
-    }).max(axis=1)
-    df['atr'] = tr.ewm(span=period, adjust=False).mean() 
-    return df
-
-def calculate_sqzmom(df, bb_длина, bb_мульти, kc_длина, kc_мульти, atr_период):
+# data - словарь колонок NumPy (parse_klines / KlineBuffer.columns), индикаторы добавляются в него
+def calculate_sqzmom(data, bb_длина, bb_мульти, kc_длина, kc_мульти, atr_период):
     """Вычисляет Squeeze Momentum Indicator."""
-    
-    # 1. Каналы Келтнера (KC)
-    df = calculate_atr(df, atr_период)
-    kc_mid = df['Close'].ewm(span=kc_длина, adjust=False).mean()
-    kc_верх = kc_mid + (kc_мульти * df['atr'])
-    kc_низ = kc_mid - (kc_мульти * df['atr'])
-    
-    # 2. Полосы Боллинджера (BB)
-    bb_mid = df['Close'].rolling(bb_длина).mean()
-    stddev = df['Close'].rolling(bb_длина).std()
-    bb_верх = bb_mid + (bb_мульти * stddev)
-    bb_низ = bb_mid - (bb_мульти * stddev)
-    
-    # 3. Определение Сжатия (Squeeze)
-    df['is_squeeze'] = (bb_верх < kc_верх) & (bb_низ > kc_низ)
-    
-    # 4. Расчет Импульса (Momentum)
-    highest_high = df['High'].rolling(bb_длина).max()
-    lowest_low = df['Low'].rolling(bb_длина).min()
-    val1 = ((df['Close'] - ((highest_high + lowest_low) / 2)) / (bb_мульти * stddev))
-    val2 = val1.ewm(span=kc_длина, adjust=False).mean()
-    df['momentum'] = val2 - val2.ewm(span=10, adjust=False).mean() 
-    
-    return df
+    # Ядра из indicators.py: KC (EMA + ATR), BB, сжатие и импульс
+    import indicators
+    data['is_squeeze'], data['momentum'], data['atr'] = indicators.squeeze_momentum(
+        data['Close'], data['High'], data['Low'],
+        bb_длина, bb_мульти, kc_длина, kc_мульти, atr_период
+    )
+    return data
 
 # =========================================================================
 # --- ДАННЫЕ И СИГНАЛЫ ---
@@ -263,41 +292,47 @@ def calculate_sqzmom(df, bb_длина, bb_мульти, kc_длина, kc_му
 @retry_api()
 def get_data(symbol, interval, limit=500):
     """Получение исторических данных."""
-    klines = client.get_historical_klines(symbol, interval, limit=limit)
+    from klines import parse_klines
+    klines = get_client().get_historical_klines(symbol, interval, limit=limit)
     if len(klines) < 200: 
         raise ValueError("Incomplete data")
-    df = pd.DataFrame(klines, columns=['open_time', 'Open', 'High', 'Low', 'Close', 'Volume', 'close_time', 'qav', 'trades', 'tbav', 'tqav', 'ignore'])
-    df['Close'] = pd.to_numeric(df['Close'])
-    df['High'] = pd.to_numeric(df['High'])
-    df['Low'] = pd.to_numeric(df['Low'])
-    df['Open'] = pd.to_numeric(df['Open'])
-    return df
-
-def calculate_indicators(df):
+    # Колонки NumPy вместо DataFrame из строк
+    return parse_klines(klines)
+
+@retry_api()
+def fetch_klines(symbol, interval, start_ms, end_ms):
+    """Свечи по диапазону времени открытия (докачка пропусков после переподключения)."""
+    return get_client().get_historical_klines(symbol, interval, start_str=start_ms, end_str=end_ms)
+
+def calculate_indicators(data):
     """Рассчитывает индикатор SQZMOM."""
-    df = calculate_sqzmom(
-        df, 
+    data = calculate_sqzmom(
+        data, 
         SQZ_BB_ДЛИНА, SQZ_BB_МУЛЬТИФАКТОР, 
         SQZ_KC_ДЛИНА, SQZ_KC_МУЛЬТИФАКТОР,
         SQZ_ATR_ПЕРИОД
     )
-    return df
+    return data
+
+def generate_signals(data):
+    """Генерирует сигнал на основе Squeeze Momentum.
 
-def generate_signals(df):
-    """Генерирует сигнал на основе Squeeze Momentum."""
+    data содержит только закрытые свечи: последний элемент - только что закрытая свеча,
+    вход выполняется по ее цене закрытия (= открытие следующей свечи).
+    """
     
-    if len(df) < 3:
+    if len(data['Close']) < 2:
         return None, None
 
-    prev_row = df.iloc[-2]
-    prev_prev_row = df.iloc[-3]
-    current_open_price = df['Open'].iloc[-1]
+    is_squeeze = data['is_squeeze']
+    momentum = data['momentum'][-1]
+    current_open_price = data['Close'][-1]
     
-    было_сжатие = prev_prev_row['is_squeeze']
-    сжатие_закончилось = было_сжатие and not prev_row['is_squeeze']
+    было_сжатие = is_squeeze[-2]
+    сжатие_закончилось = было_сжатие and not is_squeeze[-1]
     
-    моментум_положительный = prev_row['momentum'] > 0
-    моментум_отрицательный = prev_row['momentum'] < 0
+    моментум_положительный = momentum > 0
+    моментум_отрицательный = momentum < 0
 
     if сжатие_закончилось and моментум_положительный:
         return 'LONG', current_open_price
@@ -306,140 +341,192 @@ def generate_signals(df):
         
     return None, None
 
+def trade_on_candle(account, signal, current_price, entry_price=None):
+    """Выход по SL/TP или вход на закрытой свече (основной и теневые счета).
+
+    entry_price - цена входа до проскальзывания, по умолчанию - закрытие свечи.
+    """
+    if entry_price is None:
+        entry_price = current_price
+    if account.is_in_position:
+        # Проверка SL/TP - используем цену закрытия текущей свечи (current_price)
+        if (account.is_long and current_price <= account.stop_loss_level) or \
+           (not account.is_long and current_price >= account.stop_loss_level):
+            account.close_position(account.stop_loss_level, "STOP_LOSS") # Закрытие по цене SL
+        elif (account.is_long and current_price >= account.take_profit_level) or \
+             (not account.is_long and current_price <= account.take_profit_level):
+            account.close_position(account.take_profit_level, "TAKE_PROFIT") # Закрытие по цене TP
+        # Обратный сигнал не используется в этой версии
+
+    # Вход
+    elif signal and entry_price: 
+        
+        # Учет Проскальзывания в Цене Входа
+        if signal == 'LONG':
+            current_entry_price = entry_price * (1 + SLIPPAGE_PERCENT)
+        else: # SHORT
+            current_entry_price = entry_price * (1 - SLIPPAGE_PERCENT)
+        
+        direction = 1 if signal == 'LONG' else -1
+        
+        # 1. Расчет SL/TP на основе фиксированных процентов
+        stop_loss_level = current_entry_price * (1 - direction * RISK_PERCENT_SL)
+        take_profit_level = current_entry_price * (1 + direction * PROFIT_PERCENT_TP)
+        
+        # 2. Расчет расстояния до SL в USD (Риск на 1 монету)
+        if signal == 'LONG':
+            price_diff_sl = current_entry_price - stop_loss_level
+        else: # SHORT
+            price_diff_sl = stop_loss_level - current_entry_price
+        
+        # 3. Расчет размера позиции в USDT для входа
+        if price_diff_sl <= 0: 
+            log.error("SL distance is zero or negative.")
+            return
+        
+        position_size_usdt_entry = (RISK_AMOUNT_USD / price_diff_sl) * current_entry_price
+        
+        # 4. Проверка лимитов и минимального размера
+        if account.check_limits(RISK_AMOUNT_USD) and position_size_usdt_entry >= 10:
+            account.enter_position(current_entry_price, signal == 'LONG', position_size_usdt_entry, stop_loss_level, take_profit_level, margin_usdt=RISK_AMOUNT_USD) 
+
+# =========================================================================
+# --- ТЕНЕВЫЕ ВАРИАНТЫ ---
+# =========================================================================
+
+def live_params():
+    """Рабочий набор параметров SQZ (вариант 'live')."""
+    return {
+        'SQZ_BB_ДЛИНА': SQZ_BB_ДЛИНА,
+        'SQZ_BB_МУЛЬТИФАКТОР': SQZ_BB_МУЛЬТИФАКТОР,
+        'SQZ_KC_ДЛИНА': SQZ_KC_ДЛИНА,
+        'SQZ_KC_МУЛЬТИФАКТОР': SQZ_KC_МУЛЬТИФАКТОР,
+        'SQZ_ATR_ПЕРИОД': SQZ_ATR_ПЕРИОД
+    }
+
+def shadow_evaluate(caches, params):
+    """Сигнал варианта по общему кэшу индикаторов; уровней внутри бара нет."""
+    cache = caches[INTERVAL]
+    is_squeeze, momentum = cache.squeeze_momentum(
+        params['SQZ_BB_ДЛИНА'], params['SQZ_BB_МУЛЬТИФАКТОР'],
+        params['SQZ_KC_ДЛИНА'], params['SQZ_KC_МУЛЬТИФАКТОР'],
+        params['SQZ_ATR_ПЕРИОД']
+    )
+    signal, _ = generate_signals({'Close': cache.close, 'is_squeeze': is_squeeze, 'momentum': momentum})
+    return signal, None
+
+def shadow_runner(publisher, variants, balance, **kwargs):
+    """ShadowRunner со счетами и сделками бота (также для прогона на истории в robustness.py)."""
+    from shadow import ShadowRunner
+    return ShadowRunner(
+        publisher, BOT_ID, variants, balance, shadow_evaluate,
+        ShadowAccount, trade_on_candle, **kwargs
+    )
+
+def make_shadow(account):
+    from shadow import load_variants
+    variants = load_variants(r, BOT_ID, live_params(), SHADOW_VARIANTS)
+    shadow = shadow_runner(publisher, variants, account.initial_balance)
+    shadow.reset()
+    log.info("Shadow mode: %d variants (%s)", len(variants), ', '.join(name for name, _ in variants))
+    return shadow
+
 # =========================================================================
 # --- WEBSOCKET ЛОГИКА (Модифицировано для SQZMOM) ---
 # =========================================================================
 
-def on_message(ws, message, account):
+def on_candle(interval, buffers, account, shadow=None):
     try:
-        data = json.loads(message)
-        # Проверяем, что это сообщение о закрытии свечи на нашем рабочем ТФ
-        if data.get('e') == 'kline' and data['k']['x'] and data['k']['i'] == INTERVAL: 
+        # Проверяем только закрытие свечи на нашем рабочем ТФ
+        if interval == INTERVAL: 
             if not account.session_started:
                 return
+            started = time.perf_counter()
 
-            # Получаем и рассчитываем данные
-            df = get_data(SYMBOL, INTERVAL)
-            if df is None:
-                return
-
-            df = calculate_indicators(df)
+            # Рассчитываем индикаторы по буферу закрытых свечей
+            data = calculate_indicators(buffers[INTERVAL].columns())
 
-            current_price = float(data['k']['c']) 
+            current_price = buffers[INTERVAL].close[-1]
+            close_ts = (buffers[INTERVAL].last_open_time + buffers[INTERVAL].interval_ms) / 1000
+            account.roll_day(close_ts)
             
-            signal, entry_price_for_next_candle_raw = generate_signals(df) 
+            signal, entry_price_for_next_candle_raw = generate_signals(data) 
+            if signal:
+                botlog.event(log, 'signal', "Signal %s at %.4f", signal, current_price,
+                             symbol=SYMBOL, signal=signal, price=float(current_price), source='candle')
 
-            if account.is_in_position:
-                # Проверка SL/TP - используем цену закрытия текущей свечи (current_price)
-                if (account.is_long and current_price <= account.stop_loss_level) or \
-                   (not account.is_long and current_price >= account.stop_loss_level):
-                    account.close_position(account.stop_loss_level, "STOP_LOSS") # Закрытие по цене SL
-                elif (account.is_long and current_price >= account.take_profit_level) or \
-                     (not account.is_long and current_price <= account.take_profit_level):
-                    account.close_position(account.take_profit_level, "TAKE_PROFIT") # Закрытие по цене TP
-                # Обратный сигнал не используется в этой версии
-
-            # Вход
-            elif signal and entry_price_for_next_candle_raw: 
-                
-                # Учет Проскальзывания в Цене Входа
-                if signal == 'LONG':
-                    current_entry_price = entry_price_for_next_candle_raw * (1 + SLIPPAGE_PERCENT)
-                else: # SHORT
-                    current_entry_price = entry_price_for_next_candle_raw * (1 - SLIPPAGE_PERCENT)
-                
-                direction = 1 if signal == 'LONG' else -1
-                
-                # 1. Расчет SL/TP на основе фиксированных процентов
-                stop_loss_level = current_entry_price * (1 - direction * RISK_PERCENT_SL)
-                take_profit_level = current_entry_price * (1 + direction * PROFIT_PERCENT_TP)
-                
-                # 2. Расчет расстояния до SL в USD (Риск на 1 монету)
-                if signal == 'LONG':
-                    price_diff_sl = current_entry_price - stop_loss_level
-                else: # SHORT
-                    price_diff_sl = stop_loss_level - current_entry_price
-                
-                # 3. Расчет размера позиции в USDT для входа
-                if price_diff_sl <= 0: 
-                    print("Error: SL distance is zero or negative.")
-                    return
-                
-                position_size_usdt_entry = (RISK_AMOUNT_USD / price_diff_sl) * current_entry_price
-                
-                # 4. Проверка лимитов и минимального размера
-                if account.check_limits(RISK_AMOUNT_USD) and position_size_usdt_entry >= 10:
-                    account.enter_position(current_entry_price, signal == 'LONG', position_size_usdt_entry, stop_loss_level, take_profit_level, margin_usdt=RISK_AMOUNT_USD) 
+            trade_on_candle(account, signal, current_price, entry_price_for_next_candle_raw)
             
             account.generate_report(current_price)
+
+            # Теневые варианты на тех же закрытых свечах
+            if shadow:
+                shadow.on_candle({INTERVAL: buffers[INTERVAL].columns()}, current_price, ts=close_ts)
+            botlog.latency(log, 'on_candle', started, symbol=SYMBOL, interval=interval)
     except Exception as e:
-        print(f"WebSocket message error: {e}")
+        log.exception("WebSocket message error: %s", e)
         # send_telegram_message(f"Error processing WebSocket message: {e}") # УДАЛЕНО
 
-# --- ОСТАЛЬНЫЕ ФУНКЦИИ (Копируем из bot.py) ---
+# --- run_websocket (МОДИФИЦИРОВАНО) ---
+def run_websocket(account):
+    from klines import KlineBuffer
+    from ws_stream import KlineStream
+    import indicators
 
-def on_error(ws, error):
-    print(f"WebSocket error: {error}")
-    # send_telegram_message(f"WebSocket error: {error}") # УДАЛЕНО
+    # Компиляция/загрузка ядер индикаторов до первой свечи
+    indicators.warmup()
 
-def on_close(ws, close_status_code, close_msg):
-    print("WebSocket closed")
-    # send_telegram_message("WebSocket connection closed.") # УДАЛЕНО
+    # Начальная загрузка истории один раз, далее буфер пополняется из потока
+    buffers = {INTERVAL: KlineBuffer(INTERVAL)}
+    buffers[INTERVAL].load(get_data(SYMBOL, INTERVAL))
 
-def on_open(ws):
-    print("WebSocket opened")
-    ws.send(json.dumps({
-        "method": "SUBSCRIBE",
-        "params": [f"{SYMBOL.lower()}@kline_{INTERVAL}"],
-        "id": 1
-    }))
+    shadow = make_shadow(account) if SHADOW_MODE else None
 
-# --- run_websocket (МОДИФИЦИРОВАНО) ---
-def run_websocket(account):
-    websocket_url = "wss://stream.binance.com:9443/ws"
-    ws = websocket.WebSocketApp(
-        websocket_url,
-        on_message=lambda ws, msg: on_message(ws, msg, account),
-        on_error=on_error,
-        on_close=on_close,
-        on_open=on_open
-    )
-    ws_thread = threading.Thread(target=ws.run_forever)
-    ws_thread.daemon = True
-    ws_thread.start()
+    on_candle_cb = lambda interval: on_candle(interval, buffers, account, shadow)
+    stream = KlineStream(SYMBOL, buffers, fetch_klines, on_candle_cb)
+    stream.start()
 
     # --- ПРОВЕРКА КОМАНДЫ СТОП ЧЕРЕЗ REDIS ---
+    last_heartbeat = time.time()
     while account.session_started:
         time.sleep(1)
+        if time.time() - last_heartbeat >= STATUS_HEARTBEAT:
+            account.update_redis_status()
+            last_heartbeat = time.time()
         try:
+            command = r.get(f'command:{BOT_ID}')
             # Если в Redis есть команда STOP для этого бота, останавливаем
-            if r.get(f'command:{BOT_ID}') == 'STOP':
-                print(f"Received STOP command from Redis for {BOT_ID}.")
+            if command == 'STOP':
+                log.info("Received STOP command from Redis for %s.", BOT_ID)
                 r.delete(f'command:{BOT_ID}') # Удаляем команду
                 account.session_started = False
                 break
+            # Профилирование работающего бота на N секунд
+            if command and command.startswith('PROFILE'):
+                r.delete(f'command:{BOT_ID}')
+                get_profiler().handle_command(command)
         except Exception as e:
-            print(f"Redis command check error: {e}")
+            log.warning("Redis command check error: %s", e)
             
-        if not ws_thread.is_alive():
-            print("WebSocket thread died, restarting...")
+        if not stream.is_alive():
+            log.warning("WebSocket stream died, restarting...")
             # send_telegram_message("WebSocket connection lost, attempting to restart...") # УДАЛЕНО
-            ws_thread = threading.Thread(target=ws.run_forever)
-            ws_thread.daemon = True
-            ws_thread.start()
+            stream.stop()
+            stream = KlineStream(SYMBOL, buffers, fetch_klines, on_candle_cb)
+            stream.start()
     # --- КОНЕЦ ПРОВЕРКИ ---
 
     # При остановке (либо по команде, либо по MAX_DRAWDOWN)
     if not account.session_started:
-        ws.close()
+        stream.stop()
         # При остановке получаем актуальную цену с API для закрытия
         try:
-            current_price = float(client.get_symbol_ticker(symbol=SYMBOL)['price'])
+            current_price = float(get_client().get_symbol_ticker(symbol=SYMBOL)['price'])
             if account.is_in_position:
                 account.close_position(current_price, "COMMAND_STOP")
             account.session_summary()
         except Exception as e:
-            print(f"Error during final closing: {e}")
+            log.error("Error during final closing: %s", e)
         
     account.update_redis_status() # Обновить статус в Redis на 'остановлен'
 
@@ -447,17 +534,20 @@ def run_websocket(account):
 
 # --- ЗАПУСК (МОДИФИЦИРОВАН) ---
 def run_bot(bot_id):
-    # При запуске проверяем Redis на команду START
-    if r.get(f'command:{bot_id}') == 'START':
-        r.delete(f'command:{bot_id}')
-        
+    # START, ожидающий при запуске, выполняется: его ставит воркер (worker.py),
+    # если последней командой панели для экземпляра был START
     demo_account = PaperAccount(initial_balance=100.00)
     
     # Основной цикл для ожидания команды START
     while True:
         try:
-            if r.get(f'command:{bot_id}') == 'START':
-                print(f"Received START command from Redis for {bot_id}. Starting...")
+            command = r.get(f'command:{bot_id}')
+            if command and command.startswith('PROFILE'):
+                # Профилируется только работающий бот: команда не ждет следующего START
+                r.delete(f'command:{bot_id}')
+                log.warning("PROFILE command ignored: bot %s is not running.", bot_id)
+            if command == 'START':
+                log.info("Received START command from Redis for %s. Starting...", bot_id)
                 r.delete(f'command:{bot_id}')
                 demo_account.session_started = True
                 demo_account.reset_daily()
@@ -465,10 +555,12 @@ def run_bot(bot_id):
                 demo_account.update_redis_status(is_running=True)
                 # Запускаем торговую логику
                 run_websocket(demo_account)
-                print(f"Bot {bot_id} finished run_websocket, waiting for next START command.")
+                # Сессия завершена (STOP или лимит): при перезапуске процесса торговля не возобновляется
+                registry.set_run_state(r, bot_id, 'STOP')
+                log.info("Bot %s finished run_websocket, waiting for next START command.", bot_id)
             
             # Обновление статуса 'ожидает' в Redis
-            r.hset(f'bot_status:{bot_id}', mapping={
+            publisher.hset(f'bot_status:{bot_id}', ttl=STATUS_TTL, mapping={
                 'running': 0,
                 'in_position': 0,
                 'last_update': time.time(),
@@ -477,14 +569,15 @@ def run_bot(bot_id):
             time.sleep(5) # Ожидание команды START
             
         except Exception as e:
-            print(f"Critical error in main loop: {e}")
+            log.exception("Critical error in main loop: %s", e)
             time.sleep(5)
 
 if __name__ == "__main__":
-    print(f"SQZMOM Бот {BOT_ID} запущен, ожидает команды START.")
+    botlog.setup(BOT_ID)
+    log.info("SQZMOM Бот %s запущен, ожидает команды START.", BOT_ID)
     # send_telegram_message("SQZMOM Бот запущен, ожидает команды...\n") # УДАЛЕНО
     try:
         run_bot(BOT_ID)
     except Exception as e:
-        print(f"Critical error: {e}")
+        log.critical("Critical error: %s", e, exc_info=True)
         sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,238 @@
+import atexit
+import gzip
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import threading
+import time
+
+# =========================================================================
+# --- НЕБЛОКИРУЮЩИЙ ЛОГ И ЖУРНАЛ СОБЫТИЙ ---
+# =========================================================================
+# Торговый поток только создает запись и кладет ее в очереди (единицы мкс).
+# Форматирование, вывод в stdout и запись журнала выполняют фоновые потоки
+# QueueListener, у stdout и журнала - свои очереди и потоки: медленный
+# потребитель stdout (supervisord) задерживает только свой поток. При
+# переполнении очереди записи отбрасываются со счетчиком, кроме входов и
+# выходов в очереди журнала (история сделок для robustness.py).
+# Журнал - JSON-строки logs/<имя>.jsonl, при ротации старые файлы сжимаются gzip.
+#
+# События (поле event): signal, entry, exit, latency, error; прочие записи - log.
+#   log = logging.getLogger('bot')
+#   botlog.event(log, 'entry', "Enter %s at %.2f", side, price, side=side, price=price)
+
+LOG_DIR = os.environ.get('LOG_DIR', 'logs')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+QUEUE_SIZE = 10000                    # Записей в очереди; при переполнении новые отбрасываются
+JOURNAL_MAX_BYTES = 20 * 1024 * 1024  # Размер журнала до ротации
+JOURNAL_BACKUPS = 10                  # Сжатых журналов <имя>.jsonl.N.gz
+ERROR_INTERVAL = 60.0                 # Окно ограничения предупреждений/ошибок одного места (сек)
+ERROR_BURST = 5                       # Записей одного места за окно, остальные только считаются
+KEEP_EVENTS = ('entry', 'exit')       # События, которые журнал не отбрасывает при переполнении
+
+ROOT_LOGGER = 'bot'
+
+_listeners = []
+_handler = None
+_limiter = None
+
+
+# --- ОГРАНИЧЕНИЕ ПОВТОРЯЮЩИХСЯ ОШИБОК ---
+class RateLimitFilter(logging.Filter):
+    """Не больше burst предупреждений/ошибок с одной строки кода за interval секунд.
+
+    Отброшенные записи считаются; первая запись следующего окна несет
+    их число в поле suppressed. INFO и ниже не ограничиваются. Фильтр
+    вызывается из всех потоков процесса, окна меняются под lock.
+    """
+
+    def __init__(self, interval=ERROR_INTERVAL, burst=ERROR_BURST):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.windows = {}   # (файл, строка) -> [начало окна, записей в окне, отброшено]
+        self.suppressed = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or record.created - window[0] >= self.interval:
+                if window and window[2]:
+                    record.suppressed = window[2]
+                self.windows[key] = [record.created, 1, 0]
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            self.suppressed += 1
+            return False
+
+
+# --- ОЧЕРЕДЬ ---
+class DropQueueHandler(logging.handlers.QueueHandler):
+    """put_nowait без форматирования: сообщение собирается уже в фоновом потоке.
+
+    queue.SimpleQueue (реализация на C) вдвое-втрое дешевле queue.Queue, размер
+    ограничивается проверкой qsize(). Аргументы сообщения передаются как есть,
+    поэтому в лог следует передавать числа и строки, а не изменяемые объекты.
+    queues - [(очередь, события keep)]: запись кладется в очередь каждого
+    потребителя, события keep - и сверх maxsize.
+    """
+
+    def __init__(self, queues, maxsize=QUEUE_SIZE):
+        super().__init__(queues[0][0] if queues else None)
+        self.queues = queues
+        self.maxsize = maxsize
+        self.dropped = 0
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        event = getattr(record, 'event', None)
+        for q, keep in self.queues:
+            if q.qsize() >= self.maxsize and event not in keep:
+                self.dropped += 1
+            else:
+                q.put_nowait(record)
+
+
+# --- ФОРМАТЫ ---
+class ConsoleFormatter(logging.Formatter):
+    """Строка для stdout: время, уровень, сообщение."""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(message)s')
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            text += f" (+{suppressed} similar suppressed)"
+        return text
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: общие поля и поля события."""
+
+    def __init__(self, source):
+        super().__init__()
+        self.source = source
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 6),
+            'source': self.source,
+            'logger': record.name,
+            'level': record.levelname,
+            'event': getattr(record, 'event', 'error' if record.levelno >= logging.ERROR else 'log'),
+            'msg': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', ()))
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            entry['suppressed'] = suppressed
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+# --- ЖУРНАЛ ---
+def _gzip_rotator(source, dest):
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
+
+class GzipRotatingFileHandler(logging.handlers.RotatingFileHandler):
+    """RotatingFileHandler, сжимающий ротированные файлы: <имя>.1.gz, <имя>.2.gz, ..."""
+
+    def __init__(self, filename, max_bytes=JOURNAL_MAX_BYTES, backups=JOURNAL_BACKUPS):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        self.namer = lambda name: name + '.gz'
+        self.rotator = _gzip_rotator
+
+
+# --- ПОДКЛЮЧЕНИЕ ---
+def setup(source, level=LOG_LEVEL, log_dir=LOG_DIR, console=True, journal=True):
+    """Подключает к логгеру 'bot' очередь и фоновый поток вывода; возвращает логгер.
+
+    source - имя процесса (BOT_ID), им называется журнал. Модули пишут в
+    дочерние логгеры ('bot.ws', 'bot.redis'), записи всплывают в 'bot'.
+    Повторный вызов возвращает уже настроенный логгер.
+    """
+    global _listeners, _handler, _limiter
+    log = logging.getLogger(ROOT_LOGGER)
+    if _listeners:
+        return log
+
+    # (обработчик, события, которые не отбрасываются) - у каждого своя очередь и поток
+    outputs = []
+    if console:
+        stream = logging.StreamHandler(sys.stdout)
+        stream.setFormatter(ConsoleFormatter())
+        outputs.append((stream, ()))
+    if journal:
+        os.makedirs(log_dir, exist_ok=True)
+        journal_handler = GzipRotatingFileHandler(os.path.join(log_dir, f"{source}.jsonl"))
+        journal_handler.setFormatter(JsonFormatter(source))
+        outputs.append((journal_handler, KEEP_EVENTS))
+
+    queues = [(queue.SimpleQueue(), keep) for _, keep in outputs]
+    _limiter = RateLimitFilter()
+    _handler = DropQueueHandler(queues)
+    _handler.addFilter(_limiter)
+    log.addHandler(_handler)
+    log.setLevel(level)
+    log.propagate = False
+
+    _listeners = [logging.handlers.QueueListener(q, handler, respect_handler_level=True)
+                  for (q, _), (handler, _) in zip(queues, outputs)]
+    for listener in _listeners:
+        listener.start()
+    atexit.register(shutdown)
+    return log
+
+
+def shutdown():
+    """Дописывает очередь и закрывает журнал (вызывается при выходе)."""
+    global _listeners
+    if not _listeners:
+        return
+    listeners, _listeners = _listeners, []
+    for listener in listeners:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+    logging.getLogger(ROOT_LOGGER).removeHandler(_handler)
+
+
+def event(log, kind, msg, *args, level=logging.INFO, **fields):
+    """Структурированное событие: текст для stdout и поля для журнала."""
+    if log.isEnabledFor(level):
+        log.log(level, msg, *args, extra={'event': kind, 'fields': fields})
+
+
+def latency(log, name, started, **fields):
+    """Событие latency: время от started (time.perf_counter()) до сейчас, мс."""
+    ms = (time.perf_counter() - started) * 1000
+    event(log, 'latency', "%s: %.2f ms", name, ms, name=name, ms=round(ms, 3), **fields)
+    return ms
+
+
+def stats():
+    """Счетчики для отчета и бенчмарка."""
+    return {
+        'queued': sum(q.qsize() for q, _ in _handler.queues) if _handler else 0,
+        'dropped': _handler.dropped if _handler else 0,
+        'suppressed': _limiter.suppressed if _limiter else 0
+    }
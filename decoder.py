@@ -0,0 +1,126 @@
+from typing import Union
+import msgspec
+
+# Закрытая свеча в сообщениях Binance всегда содержит этот фрагмент (JSON без пробелов)
+CLOSED_MARKER = '"x":true'
+CLOSED_MARKER_BYTES = b'"x":true'
+
+
+# --- ТИПИЗИРОВАННЫЕ СОБЫТИЯ BINANCE ---
+# Числовые строки ("0.0010") приводятся к float самим декодером (strict=False)
+class Kline(msgspec.Struct):
+    t: int      # Время открытия
+    T: int      # Время закрытия
+    s: str
+    i: str
+    o: float
+    h: float
+    l: float
+    c: float
+    v: float
+    x: bool     # Свеча закрыта
+
+
+class KlineEvent(msgspec.Struct, tag_field='e', tag='kline'):
+    E: int
+    s: str
+    k: Kline
+
+
+class TradeEvent(msgspec.Struct, tag_field='e', tag='trade'):
+    E: int
+    s: str
+    t: int
+    p: float
+    q: float
+    T: int
+    m: bool
+
+
+class DepthEvent(msgspec.Struct, tag_field='e', tag='depthUpdate'):
+    E: int
+    s: str
+    U: int
+    u: int
+    b: list[tuple[float, float]]
+    a: list[tuple[float, float]]
+
+
+# Обновление незакрытой свечи для входа внутри бара: только интервал и цена,
+# остальные поля сообщения декодер пропускает без разбора
+class KlineTick(msgspec.Struct):
+    i: str
+    c: float
+
+
+class KlineTickEvent(msgspec.Struct, tag_field='e', tag='kline'):
+    k: KlineTick
+
+
+Event = Union[KlineEvent, TradeEvent, DepthEvent]
+
+
+class Envelope(msgspec.Struct):
+    """Сообщение комбинированного потока (/stream?streams=...)."""
+    stream: str
+    data: Event
+
+
+class KlineEnvelope(msgspec.Struct):
+    stream: str
+    data: KlineEvent
+
+
+class KlineTickEnvelope(msgspec.Struct):
+    stream: str
+    data: KlineTickEvent
+
+
+_event_decoder = msgspec.json.Decoder(Event, strict=False)
+_envelope_decoder = msgspec.json.Decoder(Envelope, strict=False)
+_kline_decoder = msgspec.json.Decoder(KlineEvent, strict=False)
+_kline_envelope_decoder = msgspec.json.Decoder(KlineEnvelope, strict=False)
+_tick_decoder = msgspec.json.Decoder(KlineTickEvent, strict=False)
+_tick_envelope_decoder = msgspec.json.Decoder(KlineTickEnvelope, strict=False)
+
+
+def is_closed_kline(message):
+    """Дешевая проверка до полного разбора."""
+    if isinstance(message, (bytes, bytearray, memoryview)):
+        return CLOSED_MARKER_BYTES in message
+    return CLOSED_MARKER in message
+
+
+def _is_envelope(message):
+    head = message[:10]
+    return head.startswith(b'{"stream"') if isinstance(head, bytes) else head.startswith('{"stream"')
+
+
+def decode_event(message):
+    """Разбирает событие свечи, сделки или стакана. None - служебное/неизвестное сообщение."""
+    try:
+        if _is_envelope(message):
+            return _envelope_decoder.decode(message).data
+        return _event_decoder.decode(message)
+    except msgspec.DecodeError:
+        return None
+
+
+def decode_kline(message):
+    """Разбирает только событие свечи и возвращает Kline или None."""
+    try:
+        if _is_envelope(message):
+            return _kline_envelope_decoder.decode(message).data.k
+        return _kline_decoder.decode(message).k
+    except msgspec.DecodeError:
+        return None
+
+
+def decode_tick(message):
+    """Разбирает обновление свечи до KlineTick (интервал и цена) или None."""
+    try:
+        if _is_envelope(message):
+            return _tick_envelope_decoder.decode(message).data.k
+        return _tick_decoder.decode(message).k
+    except msgspec.DecodeError:
+        return None
@@ -0,0 +1,276 @@
+import numpy as np
+from numba import njit
+
+# =========================================================================
+# --- ИНДИКАТОРЫ: ЯДРА NUMBA (массив на входе -> массив на выходе) ---
+# =========================================================================
+# Все функции принимают 1-D (одна серия) или 2-D (символы x бары) массивы и
+# считают вдоль последней оси. Ядра компилируются с nogil=True, поэтому
+# расчеты в разных потоках идут параллельно. Результаты совпадают с
+# pandas: ewm(span, adjust=False), rolling(n).mean()/std()/max()/min().
+
+
+@njit(nogil=True, cache=True)
+def _ema_kernel(x, alpha, out):
+    # Повторяет pandas ewm(adjust=False, ignore_na=False), включая ведущие NaN
+    old_wt_factor = 1.0 - alpha
+    for r in range(x.shape[0]):
+        weighted = x[r, 0]
+        out[r, 0] = weighted
+        old_wt = 1.0
+        for i in range(1, x.shape[1]):
+            cur = x[r, i]
+            is_observation = cur == cur
+            if weighted == weighted:
+                old_wt *= old_wt_factor
+                if is_observation:
+                    if old_wt == old_wt_factor:
+                        # Обычный шаг без пропусков: знаменатель равен 1
+                        weighted = old_wt_factor * weighted + alpha * cur
+                    elif weighted != cur:
+                        weighted = (old_wt * weighted + alpha * cur) / (old_wt + alpha)
+                    old_wt = 1.0
+            elif is_observation:
+                weighted = cur
+            out[r, i] = weighted
+    return out
+
+
+@njit(nogil=True, cache=True)
+def _rolling_mean_std_kernel(x, window, mean_out, std_out):
+    # Скользящие суммы отклонений от опорного значения ref за O(n); раз в window
+    # баров суммы пересчитываются заново, чтобы ошибка округления не накапливалась
+    for r in range(x.shape[0]):
+        ref = 0.0
+        s1 = 0.0
+        s2 = 0.0
+        nans = 0
+        for i in range(x.shape[1]):
+            if i < window - 1:
+                mean_out[r, i] = np.nan
+                std_out[r, i] = np.nan
+                continue
+            if (i - window + 1) % window == 0:
+                ref = x[r, i]
+                s1 = 0.0
+                s2 = 0.0
+                nans = 0
+                for j in range(i - window + 1, i + 1):
+                    v = x[r, j]
+                    if v == v:
+                        d = v - ref
+                        s1 += d
+                        s2 += d * d
+                    else:
+                        nans += 1
+            else:
+                v = x[r, i]
+                if v == v:
+                    d = v - ref
+                    s1 += d
+                    s2 += d * d
+                else:
+                    nans += 1
+                old = x[r, i - window]
+                if old == old:
+                    d = old - ref
+                    s1 -= d
+                    s2 -= d * d
+                else:
+                    nans -= 1
+            if nans > 0 or ref != ref:
+                mean_out[r, i] = np.nan
+                std_out[r, i] = np.nan
+                continue
+            mean_out[r, i] = ref + s1 / window
+            var = (s2 - s1 * s1 / window) / (window - 1) if window > 1 else np.nan
+            std_out[r, i] = np.sqrt(var) if var > 0.0 else 0.0
+    return mean_out, std_out
+
+
+@njit(nogil=True, cache=True)
+def _rolling_mean_kernel(x, window, out):
+    # Скользящая сумма; окна с NaN дают NaN, как rolling(window) в pandas
+    for r in range(x.shape[0]):
+        total = 0.0
+        nans = 0
+        for i in range(x.shape[1]):
+            v = x[r, i]
+            if v == v:
+                total += v
+            else:
+                nans += 1
+            if i >= window:
+                old = x[r, i - window]
+                if old == old:
+                    total -= old
+                else:
+                    nans -= 1
+            out[r, i] = total / window if i >= window - 1 and nans == 0 else np.nan
+    return out
+
+
+@njit(nogil=True, cache=True)
+def _rolling_extreme_kernel(x, window, is_max, out):
+    # Монотонная очередь индексов: O(n) независимо от длины окна
+    n = x.shape[1]
+    queue = np.empty(n, dtype=np.int64)
+    for r in range(x.shape[0]):
+        head = 0
+        tail = 0
+        nans = 0
+        for i in range(n):
+            v = x[r, i]
+            if v == v:
+                while tail > head and ((x[r, queue[tail - 1]] <= v) if is_max else (x[r, queue[tail - 1]] >= v)):
+                    tail -= 1
+                queue[tail] = i
+                tail += 1
+            else:
+                nans += 1
+            if i >= window:
+                if x[r, i - window] != x[r, i - window]:
+                    nans -= 1
+            while tail > head and queue[head] <= i - window:
+                head += 1
+            if i < window - 1 or nans > 0 or tail == head:
+                out[r, i] = np.nan
+            else:
+                out[r, i] = x[r, queue[head]]
+    return out
+
+
+@njit(nogil=True, cache=True)
+def _true_range_kernel(high, low, close, out):
+    for r in range(high.shape[0]):
+        out[r, 0] = high[r, 0] - low[r, 0]
+        for i in range(1, high.shape[1]):
+            prev_close = close[r, i - 1]
+            tr = high[r, i] - low[r, i]
+            hc = abs(high[r, i] - prev_close)
+            lc = abs(low[r, i] - prev_close)
+            # Сравнения пропускают NaN, как max(axis=1) в pandas
+            if hc > tr or tr != tr:
+                tr = hc
+            if lc > tr or tr != tr:
+                tr = lc
+            out[r, i] = tr
+    return out
+
+
+def _as_rows(x):
+    """Приводит вход к float64 (строки, бары) и возвращает исходную форму."""
+    x = np.ascontiguousarray(x, dtype=np.float64)
+    return x.reshape(-1, x.shape[-1]), x.shape
+
+
+# --- БАЗОВЫЕ ФУНКЦИИ ---
+def ema(x, span):
+    """EMA, эквивалент pandas ewm(span=span, adjust=False).mean()."""
+    rows, shape = _as_rows(x)
+    return _ema_kernel(rows, 2.0 / (span + 1.0), np.empty_like(rows)).reshape(shape)
+
+
+def sma(x, length):
+    """Скользящее среднее, эквивалент rolling(length).mean()."""
+    rows, shape = _as_rows(x)
+    return _rolling_mean_kernel(rows, length, np.empty_like(rows)).reshape(shape)
+
+
+def rolling_mean_std(x, length):
+    """Скользящие среднее и стандартное отклонение (ddof=1) за один проход."""
+    rows, shape = _as_rows(x)
+    mean, std = _rolling_mean_std_kernel(rows, length, np.empty_like(rows), np.empty_like(rows))
+    return mean.reshape(shape), std.reshape(shape)
+
+
+def rolling_std(x, length):
+    """Скользящее стандартное отклонение, эквивалент rolling(length).std()."""
+    return rolling_mean_std(x, length)[1]
+
+
+def rolling_max(x, length):
+    rows, shape = _as_rows(x)
+    return _rolling_extreme_kernel(rows, length, True, np.empty_like(rows)).reshape(shape)
+
+
+def rolling_min(x, length):
+    rows, shape = _as_rows(x)
+    return _rolling_extreme_kernel(rows, length, False, np.empty_like(rows)).reshape(shape)
+
+
+# --- СОСТАВНЫЕ ИНДИКАТОРЫ ---
+def true_range(high, low, close):
+    """Истинный диапазон; на первой свече - High - Low."""
+    high_rows, shape = _as_rows(high)
+    low_rows, _ = _as_rows(low)
+    close_rows, _ = _as_rows(close)
+    return _true_range_kernel(high_rows, low_rows, close_rows, np.empty_like(high_rows)).reshape(shape)
+
+
+def atr(high, low, close, period):
+    """ATR со сглаживанием EMA (как в bot-sqzmom.py)."""
+    return ema(true_range(high, low, close), period)
+
+
+def macd(close, fast, slow, signal):
+    """Возвращает (MACD, сигнальная линия)."""
+    line = ema(close, fast) - ema(close, slow)
+    return line, ema(line, signal)
+
+
+def ema_cloud(close, periods):
+    """Возвращает (верхняя, нижняя) границы облака EMA."""
+    emas = [ema(close, p) for p in periods]
+    return np.maximum.reduce(emas), np.minimum.reduce(emas)
+
+
+def ema_cloud_cross_levels(emas, periods, prev_close):
+    """Цены, при которых закрытие текущего бара пересечет облако EMA.
+
+    emas - значения EMA по periods на последнем закрытом баре, prev_close - его закрытие.
+    Из EMA_t = a*close + (1-a)*EMA_(t-1) следует: закрытие выше long_level дает
+    prev_close < верх облака < close, закрытие ниже short_level - пересечение вниз.
+    Возвращает (long_level, short_level).
+    """
+    crossings = []
+    for p, e in zip(periods, emas):
+        a = 2.0 / (p + 1.0)
+        crossings.append((prev_close - (1.0 - a) * e) / a)
+    long_level = max(max(emas), min(crossings))
+    short_level = min(min(emas), max(crossings))
+    return float(long_level), float(short_level)
+
+
+def bollinger(close, length, mult):
+    """Возвращает (средняя, верхняя, нижняя, stddev) полосы Боллинджера."""
+    mid, std = rolling_mean_std(close, length)
+    return mid, mid + mult * std, mid - mult * std, std
+
+
+def keltner(close, high, low, length, mult, atr_period):
+    """Возвращает (средняя, верхняя, нижняя) каналы Келтнера и ATR."""
+    mid = ema(close, length)
+    rng = atr(high, low, close, atr_period)
+    return mid, mid + mult * rng, mid - mult * rng, rng
+
+
+def squeeze_momentum(close, high, low, bb_length, bb_mult, kc_length, kc_mult, atr_period):
+    """Squeeze Momentum: возвращает (is_squeeze, momentum, atr)."""
+    _, kc_upper, kc_lower, rng = keltner(close, high, low, kc_length, kc_mult, atr_period)
+    _, bb_upper, bb_lower, std = bollinger(close, bb_length, bb_mult)
+    is_squeeze = (bb_upper < kc_upper) & (bb_lower > kc_lower)
+
+    highest_high = rolling_max(high, bb_length)
+    lowest_low = rolling_min(low, bb_length)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        val1 = (np.asarray(close) - (highest_high + lowest_low) / 2) / (bb_mult * std)
+    val2 = ema(val1, kc_length)
+    return is_squeeze, val2 - ema(val2, 10), rng
+
+
+def warmup():
+    """Компилирует ядра заранее (или загружает из кэша), чтобы первая свеча не ждала JIT."""
+    x = np.linspace(1.0, 2.0, 40)
+    squeeze_momentum(x, x + 0.1, x - 0.1, 20, 2.0, 20, 1.5, 14)
+    macd(x, 12, 26, 9)
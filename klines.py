@@ -0,0 +1,273 @@
+import time
+import numpy as np
+
+# Длительность интервалов Binance в миллисекундах
+INTERVAL_MS = {
+    '1m': 60_000,
+    '3m': 3 * 60_000,
+    '5m': 5 * 60_000,
+    '15m': 15 * 60_000,
+    '30m': 30 * 60_000,
+    '1h': 60 * 60_000,
+    '2h': 2 * 60 * 60_000,
+    '4h': 4 * 60 * 60_000,
+    '6h': 6 * 60 * 60_000,
+    '8h': 8 * 60 * 60_000,
+    '12h': 12 * 60 * 60_000,
+    '1d': 24 * 60 * 60_000,
+}
+
+# --- РАЗБОР ОТВЕТА REST API ---
+def parse_klines(rows):
+    """Разбирает свечи REST API Binance сразу в колонки NumPy.
+
+    Сохраняются только нужные колонки: времена в int64, цены и объем в float64.
+    """
+    n = len(rows)
+    return {
+        'open_time': np.fromiter((row[0] for row in rows), dtype=np.int64, count=n),
+        'Open': np.array([row[1] for row in rows], dtype=np.float64),
+        'High': np.array([row[2] for row in rows], dtype=np.float64),
+        'Low': np.array([row[3] for row in rows], dtype=np.float64),
+        'Close': np.array([row[4] for row in rows], dtype=np.float64),
+        'Volume': np.array([row[5] for row in rows], dtype=np.float64),
+        'close_time': np.fromiter((row[6] for row in rows), dtype=np.int64, count=n),
+    }
+
+# --- БУФЕР ЗАКРЫТЫХ СВЕЧЕЙ ---
+class KlineBuffer:
+    """Буфер закрытых свечей одного интервала, индексированный по времени открытия.
+
+    Добавление идемпотентно: повторные и устаревшие свечи отбрасываются,
+    поэтому после переподключения и докачки буфер остается точным.
+    Колонки хранятся в заранее выделенных массивах NumPy удвоенной длины:
+    добавление свечи - запись по индексу, сдвиг окна - один раз на maxlen свечей.
+    """
+
+    def __init__(self, interval, maxlen=500):
+        self.interval = interval
+        self.interval_ms = INTERVAL_MS[interval]
+        self.maxlen = maxlen
+        self.capacity = maxlen * 2
+        self._open_time = np.zeros(self.capacity, dtype=np.int64)
+        self._ohlcv = np.zeros((5, self.capacity), dtype=np.float64)
+        self._start = 0
+        self._end = 0
+        self.duplicates = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    # Представления (views) на актуальное окно, без копирования
+    @property
+    def open_time(self):
+        return self._open_time[self._start:self._end]
+
+    @property
+    def open(self):
+        return self._ohlcv[0, self._start:self._end]
+
+    @property
+    def high(self):
+        return self._ohlcv[1, self._start:self._end]
+
+    @property
+    def low(self):
+        return self._ohlcv[2, self._start:self._end]
+
+    @property
+    def close(self):
+        return self._ohlcv[3, self._start:self._end]
+
+    @property
+    def volume(self):
+        return self._ohlcv[4, self._start:self._end]
+
+    @property
+    def last_open_time(self):
+        return int(self._open_time[self._end - 1]) if self._end > self._start else None
+
+    def load(self, data):
+        """Заполняет буфер колонками parse_klines, отбрасывая незакрытую свечу."""
+        now_ms = int(time.time() * 1000)
+        closed = data['close_time'] < now_ms
+        n = min(int(closed.sum()), self.maxlen)
+        self._open_time[:n] = data['open_time'][closed][-n:] if n else []
+        for row, column in enumerate(('Open', 'High', 'Low', 'Close', 'Volume')):
+            self._ohlcv[row, :n] = data[column][closed][-n:] if n else []
+        self._start = 0
+        self._end = n
+
+    def add(self, open_time, o, h, l, c, v):
+        """Добавляет закрытую свечу. Возвращает True, если свеча новая."""
+        last = self.last_open_time
+        if last is not None and open_time <= last:
+            self.duplicates += 1
+            return False
+        if self._end == self.capacity:
+            # Переносим последние maxlen - 1 свечей в начало массивов
+            keep = self.maxlen - 1
+            self._open_time[:keep] = self._open_time[self._end - keep:self._end]
+            self._ohlcv[:, :keep] = self._ohlcv[:, self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        i = self._end
+        self._open_time[i] = open_time
+        ohlcv = self._ohlcv
+        ohlcv[0, i] = o
+        ohlcv[1, i] = h
+        ohlcv[2, i] = l
+        ohlcv[3, i] = c
+        ohlcv[4, i] = v
+        self._end = i + 1
+        if self._end - self._start > self.maxlen:
+            self._start += 1
+        return True
+
+    def add_kline(self, k):
+        """Добавляет свечу, разобранную decoder.Kline."""
+        return self.add(k.t, k.o, k.h, k.l, k.c, k.v)
+
+    def add_rows(self, rows, now_ms=None):
+        """Добавляет свечи в формате REST API Binance (только закрытые)."""
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        if not rows:
+            return 0
+        data = parse_klines(rows)
+        t, o, h, l, c, v = (data[k] for k in ('open_time', 'Open', 'High', 'Low', 'Close', 'Volume'))
+        added = 0
+        for i in np.flatnonzero(data['close_time'] < now_ms):
+            if self.add(int(t[i]), o[i], h[i], l[i], c[i], v[i]):
+                added += 1
+        return added
+
+    def missing_range(self, open_time):
+        """Диапазон пропущенных времен открытия перед open_time или None."""
+        last = self.last_open_time
+        if last is None or open_time <= last + self.interval_ms:
+            return None
+        return last + self.interval_ms, open_time - self.interval_ms
+
+    def columns(self):
+        """Колонки актуального окна для расчета индикаторов (views, без копирования)."""
+        return {
+            'open_time': self.open_time,
+            'Open': self.open,
+            'High': self.high,
+            'Low': self.low,
+            'Close': self.close,
+            'Volume': self.volume,
+        }
+
+
+# --- МАТРИЦА СВЕЧЕЙ МНОГИХ СИМВОЛОВ ---
+def _ffill(a):
+    """Заполняет NaN предыдущим значением вдоль последней оси."""
+    valid = ~np.isnan(a)
+    idx = np.where(valid, np.arange(a.shape[-1]), 0)
+    np.maximum.accumulate(idx, axis=-1, out=idx)
+    return np.take_along_axis(a, idx, axis=-1)
+
+
+class KlineMatrix:
+    """Закрытые свечи многих символов одного интервала: матрицы (символы x бары).
+
+    Все символы выровнены по общей сетке времен открытия. Новый столбец
+    заполняется ценой закрытия предыдущего бара, пока не придет свеча символа,
+    поэтому редко торгуемые пары не выпадают из расчета.
+    """
+
+    def __init__(self, symbols, interval, bars=300):
+        self.symbols = list(symbols)
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.interval = interval
+        self.interval_ms = INTERVAL_MS[interval]
+        self.bars = bars
+        self.capacity = bars * 2
+        self._open_time = np.zeros(self.capacity, dtype=np.int64)
+        self._hlc = np.full((3, len(self.symbols), self.capacity), np.nan)
+        self._start = 0
+        self._end = 0
+
+    def __len__(self):
+        return self._end - self._start
+
+    @property
+    def open_time(self):
+        return self._open_time[self._start:self._end]
+
+    @property
+    def high(self):
+        return self._hlc[0, :, self._start:self._end]
+
+    @property
+    def low(self):
+        return self._hlc[1, :, self._start:self._end]
+
+    @property
+    def close(self):
+        return self._hlc[2, :, self._start:self._end]
+
+    @property
+    def last_open_time(self):
+        return int(self._open_time[self._end - 1]) if self._end > self._start else None
+
+    def reset(self, now_ms=None):
+        """Сетка из bars последних закрытых баров, значения - NaN до загрузки."""
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        last_closed = (now_ms // self.interval_ms - 1) * self.interval_ms
+        self._open_time[:self.bars] = last_closed - np.arange(self.bars - 1, -1, -1) * self.interval_ms
+        self._hlc[:] = np.nan
+        self._start, self._end = 0, self.bars
+
+    def load(self, symbol, data):
+        """Раскладывает колонки parse_klines символа по сетке времен."""
+        row = self.index[symbol]
+        cols = (data['open_time'] - self._open_time[self._start]) // self.interval_ms
+        ok = (cols >= 0) & (cols < len(self))
+        cols = cols[ok] + self._start
+        self._hlc[0, row, cols] = data['High'][ok]
+        self._hlc[1, row, cols] = data['Low'][ok]
+        self._hlc[2, row, cols] = data['Close'][ok]
+
+    def fill_gaps(self):
+        """После загрузки истории: пропуски заполняются последним закрытием."""
+        window = self._hlc[:, :, self._start:self._end]
+        close = _ffill(window[2])
+        window[0] = np.where(np.isnan(window[0]), close, window[0])
+        window[1] = np.where(np.isnan(window[1]), close, window[1])
+        window[2] = close
+
+    def _new_column(self):
+        if self._end == self.capacity:
+            keep = self.bars - 1
+            self._open_time[:keep] = self._open_time[self._end - keep:self._end]
+            self._hlc[:, :, :keep] = self._hlc[:, :, self._end - keep:self._end]
+            self._start, self._end = 0, keep
+        i = self._end
+        self._open_time[i] = self._open_time[i - 1] + self.interval_ms
+        self._hlc[:, :, i] = self._hlc[2, :, i - 1]
+        self._end = i + 1
+        if self._end - self._start > self.bars:
+            self._start += 1
+
+    def add(self, symbol, open_time, h, l, c):
+        """Записывает закрытую свечу символа. Возвращает True, если начат новый бар."""
+        row = self.index.get(symbol)
+        last = self.last_open_time
+        if row is None or last is None:
+            return False
+        new_bar = False
+        while open_time > last:
+            self._new_column()
+            last += self.interval_ms
+            new_bar = True
+        col = (open_time - int(self._open_time[self._start])) // self.interval_ms
+        if col < 0:
+            return False
+        col += self._start
+        self._hlc[0, row, col] = h
+        self._hlc[1, row, col] = l
+        self._hlc[2, row, col] = c
+        return new_bar
@@ -0,0 +1,188 @@
+import collections
+import logging
+import math
+import os
+import sys
+import threading
+import time
+
+# =========================================================================
+# --- СЭМПЛИРУЮЩИЙ ПРОФАЙЛЕР ПО КОМАНДЕ ---
+# =========================================================================
+# Включается командой PROFILE:<сек> в command:<bot_id> (кнопка на панели).
+# Фоновый поток раз в PROFILE_INTERVAL снимает стеки всех потоков процесса
+# (sys._current_frames) и считает одинаковые стеки. Результат - свернутые
+# стеки (collapsed stacks: "поток;функция;...;функция N"), формат
+# flamegraph.pl / speedscope / inferno: файл profiles/<bot_id>-<время>.folded
+# и hash bot_profile:<bot_id>, который отдает app.py.
+# В выключенном состоянии профайлер ничего не делает: потока нет, торговый
+# код не содержит хуков.
+
+PROFILE_INTERVAL = 0.01          # Период сэмплирования (сек), 100 стеков в секунду на поток
+PROFILE_SECONDS = 30             # Длительность по умолчанию
+MAX_PROFILE_SECONDS = 300
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_TTL = 24 * 3600          # Результат в Redis (сек)
+
+log = logging.getLogger('bot.profiler')
+
+
+class SamplingProfiler:
+    """Снимает стеки всех потоков на таймере, пока идет сбор."""
+
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.sample_time = 0.0   # Время в сэмплировании (сек), накладные расходы сбора
+        self.started = 0.0
+        self.finished = 0.0
+        self.thread = None
+        self._stop = threading.Event()
+        self._labels = {}        # code -> "функция (файл:строка)"
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, seconds, on_done=None):
+        """Сбор в течение seconds; on_done(profiler) вызывается из потока профайлера.
+
+        Возвращает False, если сбор уже идет.
+        """
+        if self.is_running():
+            return False
+        self.stacks = collections.Counter()
+        self.samples = 0
+        self.sample_time = 0.0
+        self.started = time.time()
+        self.finished = 0.0
+        self._stop.clear()
+        self.thread = threading.Thread(target=self._run, args=(seconds, on_done), name='profiler', daemon=True)
+        self.thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = self._labels[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        return label
+
+    def sample(self):
+        """Один снимок: стек каждого потока (кроме своего) с именем потока в корне."""
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            stack.reverse()
+            self.stacks[';'.join(stack)] += 1
+        self.samples += 1
+
+    def _run(self, seconds, on_done):
+        deadline = time.perf_counter() + seconds
+        next_at = time.perf_counter()
+        while not self._stop.is_set():
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            self.sample()
+            self.sample_time += time.perf_counter() - now
+            next_at += self.interval
+            self._stop.wait(max(next_at - time.perf_counter(), 0))
+        self.finished = time.time()
+        if on_done:
+            try:
+                on_done(self)
+            except Exception as e:
+                log.error("Profiler result error: %s", e)
+
+    def collapsed(self):
+        """Свернутые стеки: одна строка "стек количество" на уникальный стек."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def overhead_percent(self):
+        elapsed = (self.finished or time.time()) - self.started
+        return 100 * self.sample_time / elapsed if elapsed > 0 else 0.0
+
+
+# --- ПРОФАЙЛЕР БОТА ---
+class BotProfiler:
+    """SamplingProfiler бота с публикацией результата в Redis и файл.
+
+    publisher - RedisPublisher бота; ключ bot_profile:<bot_id> (hash): state
+    ('running'/'done'), seconds, started, finished, samples, overhead_pct, file
+    и stacks - свернутые стеки.
+    """
+
+    def __init__(self, publisher, bot_id, profile_dir=PROFILE_DIR, ttl=PROFILE_TTL):
+        self.publisher = publisher
+        self.bot_id = bot_id
+        self.key = f'bot_profile:{bot_id}'
+        self.profile_dir = profile_dir
+        self.ttl = ttl
+        self.sampler = SamplingProfiler()
+
+    def start(self, seconds=PROFILE_SECONDS):
+        seconds = min(max(float(seconds), 1.0), MAX_PROFILE_SECONDS)
+        if not self.sampler.start(seconds, self._done):
+            log.warning("Profiler is already running")
+            return False
+        self.publisher.delete(self.key)
+        self.publisher.hset(self.key, {
+            'state': 'running',
+            'seconds': seconds,
+            'started': self.sampler.started
+        }, ttl=self.ttl)
+        log.info("Profiler started for %.0fs", seconds)
+        return True
+
+    def handle_command(self, command):
+        """Команда PROFILE или PROFILE:<сек> из command:<bot_id>."""
+        _, _, seconds = command.partition(':')
+        try:
+            seconds = float(seconds) if seconds else PROFILE_SECONDS
+        except ValueError:
+            seconds = PROFILE_SECONDS
+        # nan проходит через min/max без изменений: сбор не закончился бы никогда
+        if not math.isfinite(seconds):
+            log.warning("Invalid profile duration: %s", command)
+            return False
+        return self.start(seconds)
+
+    def save(self, text):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.sampler.started))
+        path = os.path.join(self.profile_dir, f"{self.bot_id}-{stamp}.folded")
+        tmp = path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(tmp, path)
+        return path
+
+    def _done(self, sampler):
+        text = sampler.collapsed()
+        try:
+            path = self.save(text)
+        except OSError as e:
+            log.error("Profile save error: %s", e)
+            path = ''
+        self.publisher.hset(self.key, {
+            'state': 'done',
+            'finished': sampler.finished,
+            'samples': sampler.samples,
+            'overhead_pct': f"{sampler.overhead_percent():.2f}",
+            'file': path,
+            'stacks': text
+        }, ttl=self.ttl)
+        log.info("Profiler finished: %d samples, %d stacks, overhead %.2f%%, %s",
+                 sampler.samples, len(sampler.stacks), sampler.overhead_percent(), path)
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+
+import redis
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError
+from redis.retry import Retry
+
+# =========================================================================
+# --- ОБЩИЕ ПУЛЫ СОЕДИНЕНИЙ REDIS ---
+# =========================================================================
+# Один пул на имя (bot, app, worker, ...) и процесс. Пул ограничен
+# (BlockingConnectionPool): поток ждет свободное соединение не дольше
+# POOL_TIMEOUT, у соединений таймауты сокета и подключения, PING перед
+# командой после простоя HEALTH_CHECK_INTERVAL и повтор с переподключением
+# при обрыве. Сбой Redis оборачивается ограниченной задержкой и исключением
+# вместо зависшего потока.
+# После fork (воркеры gunicorn, процессы пула) унаследованные пулы
+# отбрасываются: клиент создает в дочернем процессе свой пул при первой команде.
+
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 8))
+POOL_TIMEOUT = 2.0           # Ожидание свободного соединения пула (сек)
+SOCKET_TIMEOUT = 2.0         # Ожидание ответа на команду (сек)
+CONNECT_TIMEOUT = 2.0
+HEALTH_CHECK_INTERVAL = 15   # PING перед командой на соединении, простаивавшем дольше (сек)
+RETRIES = 2                  # Повторы команды с переподключением при обрыве соединения
+RETRY_BACKOFF_BASE = 0.05
+RETRY_BACKOFF_CAP = 0.5
+
+_pools = {}     # имя -> MeteredPool текущего процесса
+_clients = {}   # имя -> redis.Redis поверх пула
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # Сокеты родителя не закрываются: ими продолжает пользоваться родитель
+    global _lock
+    _pools.clear()
+    _clients.clear()
+    _lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class MeteredPool(redis.BlockingConnectionPool):
+    """BlockingConnectionPool со счетчиками занятости и ожидания соединения.
+
+    Ожидание - время get_connection: очередь пула, а для нового или
+    простаивавшего соединения еще подключение и проверка PING.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0          # Пул исчерпан дольше timeout
+        self.errors = 0            # Не удалось подключиться
+        self.wait_total = 0.0
+        self.wait_max = 0.0        # С последнего summary()
+        self.in_use_peak = 0       # С последнего summary()
+
+    def in_use(self):
+        # В очереди лежат свободные соединения и заглушки None для еще не созданных
+        return self.max_connections - self.pool.qsize()
+
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            connection = super().get_connection(*args, **kwargs)
+        except ConnectionError as e:
+            with self.stats_lock:
+                if 'No connection available' in str(e):
+                    self.timeouts += 1
+                else:
+                    self.errors += 1
+            raise
+        waited = time.perf_counter() - start
+        in_use = self.in_use()
+        with self.stats_lock:
+            self.checkouts += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+            self.in_use_peak = max(self.in_use_peak, in_use)
+        return connection
+
+    def stats(self):
+        with self.stats_lock:
+            return {
+                'max_connections': self.max_connections,
+                'in_use': self.in_use(),
+                'in_use_peak': self.in_use_peak,
+                'checkouts': self.checkouts,
+                'wait_ms_avg': round(1000 * self.wait_total / self.checkouts, 3) if self.checkouts else 0.0,
+                'wait_ms_max': round(1000 * self.wait_max, 3),
+                'timeouts': self.timeouts,
+                'errors': self.errors
+            }
+
+    def reset_window(self):
+        with self.stats_lock:
+            self.wait_max = 0.0
+            self.in_use_peak = self.in_use()
+
+
+def make_pool(host=REDIS_HOST, port=REDIS_PORT, db=0, max_connections=MAX_CONNECTIONS, pool_timeout=POOL_TIMEOUT,
+              socket_timeout=SOCKET_TIMEOUT, socket_connect_timeout=CONNECT_TIMEOUT,
+              health_check_interval=HEALTH_CHECK_INTERVAL, retries=RETRIES, decode_responses=True):
+    # Повтор только при обрыве (перезапуск Redis, закрытый сокет): таймаут не
+    # повторяется, иначе зависший Redis задерживал бы команду в (retries + 1)
+    # раз дольше socket_timeout
+    retry = Retry(ExponentialBackoff(cap=RETRY_BACKOFF_CAP, base=RETRY_BACKOFF_BASE), retries,
+                  supported_errors=(ConnectionError,))
+    return MeteredPool(
+        max_connections=max_connections, timeout=pool_timeout,
+        host=host, port=port, db=db, decode_responses=decode_responses,
+        socket_timeout=socket_timeout, socket_connect_timeout=socket_connect_timeout, socket_keepalive=True,
+        health_check_interval=health_check_interval,
+        retry=retry
+    )
+
+
+def get_redis(name='default', **options):
+    """redis.Redis на пуле name текущего процесса; options (make_pool) - при первом вызове."""
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                _pools[name] = make_pool(**options)
+                client = _clients[name] = redis.Redis(connection_pool=_pools[name])
+    return client
+
+
+class LazyRedis:
+    """Клиент для глобальной переменной модуля: пул создается при первой команде.
+
+    Импорт модуля не открывает соединений, а после fork команды идут через
+    новый пул дочернего процесса.
+    """
+
+    def __init__(self, name, **options):
+        self._name = name
+        self._options = options
+
+    def __getattr__(self, attr):
+        return getattr(get_redis(self._name, **self._options), attr)
+
+
+def client(name='default', **options):
+    return LazyRedis(name, **options)
+
+
+# --- МЕТРИКИ ---
+def stats():
+    """Счетчики всех пулов процесса: {имя: {...}}."""
+    return {name: pool.stats() for name, pool in list(_pools.items())}
+
+
+def summary(name):
+    """Плоские поля для bot_status: занятость пула и ожидание соединения с прошлого вызова."""
+    pool = _pools.get(name)
+    if pool is None:
+        return {}
+    s = pool.stats()
+    pool.reset_window()
+    return {
+        'redis_pool': f"{s['in_use_peak']}/{s['max_connections']}",
+        'redis_wait_ms_avg': s['wait_ms_avg'],
+        'redis_wait_ms_max': s['wait_ms_max'],
+        'redis_pool_timeouts': s['timeouts'],
+        'redis_connect_errors': s['errors']
+    }
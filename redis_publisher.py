@@ -0,0 +1,169 @@
+import logging
+import queue
+import threading
+import time
+
+# =========================================================================
+# --- ФОНОВАЯ ЗАПИСЬ В REDIS (без ожидания Redis в торговом потоке) ---
+# =========================================================================
+# Бот кладет изменения состояния в ограниченную очередь и сразу продолжает
+# работу. Фоновый поток собирает накопившиеся изменения, объединяет их по
+# ключу (последнее значение поля побеждает) и отправляет одним pipeline.
+# При недоступности Redis изменения копятся в объединенном виде (не больше
+# одной записи на ключ) и уходят после восстановления связи.
+
+QUEUE_SIZE = 1000    # Очередь изменений; при переполнении новые изменения отбрасываются
+LINGER = 0.05        # Ожидание остальных изменений той же свечи перед отправкой (сек)
+RETRY_DELAY = 1.0
+RETRY_MAX_DELAY = 30.0
+
+log = logging.getLogger('bot.redis')
+
+
+class RedisPublisher:
+    """Неблокирующая запись: hset/set/delete кладут изменение в очередь и возвращаются сразу.
+
+    ttl (сек) ставится на ключ после записи, чтобы данные остановленного или
+    упавшего процесса не висели в Redis бесконечно.
+    """
+
+    def __init__(self, r, queue_size=QUEUE_SIZE, linger=LINGER):
+        self.r = r
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.linger = linger
+        self.pending = {}   # ключ -> [удалить сначала, 'hset'/'set'/None, значение, ttl]
+        self.thread = None
+        self.lock = threading.Lock()
+        self.running = False
+        # Счетчики для отчета и бенчмарка
+        self.updates = 0
+        self.dropped = 0
+        self.round_trips = 0
+        self.errors = 0
+
+    # --- API ДЛЯ ТОРГОВОГО ПОТОКА ---
+    def hset(self, key, mapping, ttl=None):
+        self._put(('hset', key, dict(mapping), ttl))
+
+    def set(self, key, value, ttl=None):
+        self._put(('set', key, value, ttl))
+
+    def delete(self, key):
+        self._put(('delete', key, None, None))
+
+    def _put(self, op):
+        self.start()
+        try:
+            self.queue.put_nowait(op)
+            self.updates += 1
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                log.warning("Redis publisher queue full, dropped %d updates", self.dropped)
+
+    # --- ФОНОВЫЙ ПОТОК ---
+    def start(self):
+        if self.running:
+            return
+        with self.lock:
+            if not self.running:
+                self.running = True
+                self.thread = threading.Thread(target=self._run, name='redis-publisher', daemon=True)
+                self.thread.start()
+
+    def stop(self, timeout=2.0):
+        """Останавливает поток, попытавшись отправить оставшиеся изменения."""
+        if not self.running:
+            return
+        self.running = False
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def flush(self, timeout=2.0):
+        """Ждет отправки всего, что уже поставлено в очередь (для остановки и тестов)."""
+        deadline = time.time() + timeout
+        while (self.queue.unfinished_tasks or self.pending) and time.time() < deadline:
+            time.sleep(0.01)
+        return not (self.queue.unfinished_tasks or self.pending)
+
+    def _apply(self, op):
+        kind, key, value, ttl = op
+        current = self.pending.get(key)
+        if kind == 'delete':
+            self.pending[key] = [True, None, None, None]
+        elif kind == 'hset' and current and current[1] == 'hset':
+            current[2].update(value)
+            current[3] = ttl or current[3]
+        else:
+            self.pending[key] = [bool(current and current[0]), kind, value, ttl]
+
+    def _drain(self, timeout):
+        """Забирает изменения из очереди; возвращает False при остановке."""
+        try:
+            op = self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return True
+        if op is None:
+            self.queue.task_done()
+            return False
+        self._apply(op)
+        self.queue.task_done()
+        if self.linger:
+            time.sleep(self.linger)
+        while True:
+            try:
+                op = self.queue.get_nowait()
+            except queue.Empty:
+                return True
+            if op is None:
+                self.queue.task_done()
+                return False
+            self._apply(op)
+            self.queue.task_done()
+
+    def _send(self):
+        pipe = self.r.pipeline(transaction=False)
+        for key, (delete_first, kind, value, ttl) in self.pending.items():
+            if delete_first:
+                pipe.delete(key)
+            if kind == 'hset':
+                pipe.hset(key, mapping=value)
+            elif kind == 'set':
+                pipe.set(key, value)
+            if ttl and kind:
+                pipe.expire(key, ttl)
+        pipe.execute()
+        self.round_trips += 1
+        self.pending = {}
+
+    def _run(self):
+        delay = RETRY_DELAY
+        next_attempt = 0.0
+        alive = True
+        while alive or self.pending:
+            timeout = max(next_attempt - time.time(), 0.01) if self.pending else 1.0
+            alive = self._drain(timeout) and alive
+            if not self.pending or time.time() < next_attempt:
+                continue
+            try:
+                self._send()
+                delay = RETRY_DELAY
+                next_attempt = 0.0
+            except Exception as e:
+                self.errors += 1
+                if self.errors == 1 or self.errors % 100 == 0:
+                    log.error("Redis publisher error (%d): %s", self.errors, e)
+                if not alive:
+                    break
+                # Пока Redis недоступен, изменения продолжают объединяться в pending
+                next_attempt = time.time() + delay
+                delay = min(delay * 2, RETRY_MAX_DELAY)
+
+    def stats(self):
+        return {
+            'updates': self.updates,
+            'round_trips': self.round_trips,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'queued': self.queue.qsize()
+        }
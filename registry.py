@@ -0,0 +1,157 @@
+# Реестр экземпляров ботов и аренда (lease) экземпляров воркерами через Redis.
+#   python registry.py list
+#   python registry.py add btc_macd bot-macd.py BTCUSDT
+#   python registry.py remove btc_macd
+import json
+import sys
+import time
+
+# --- КЛЮЧИ REDIS ---
+REGISTRY_KEY = 'bot_registry'          # hash: id экземпляра -> JSON {script, symbol}
+SEEDED_KEY = 'bot_registry_seeded'     # Реестр уже заполнялся экземплярами по умолчанию
+RUN_STATE_KEY = 'bot_run_state'        # hash: id экземпляра -> START/STOP (последняя команда панели)
+LEASE_PREFIX = 'bot_lease:'            # строка с TTL: id воркера, который запускает экземпляр
+WORKERS_KEY = 'bot_workers'            # zset: id воркера -> время последнего heartbeat (мс)
+WORKER_INFO_PREFIX = 'bot_worker:'     # hash с TTL: хост, pid, емкость, экземпляры воркера
+
+# --- ТАЙМИНГИ ---
+HEARTBEAT_INTERVAL = 2.0   # Продление аренды и heartbeat воркера (сек)
+LEASE_TTL = 5.0            # Аренда умершего воркера освобождается не позже чем через LEASE_TTL
+
+# Экземпляры по умолчанию (как раньше в supervisord.conf)
+DEFAULT_BOTS = {
+    'macd_bot': {'script': 'bot-macd.py', 'symbol': 'ETHUSDT'},
+    'sqzmom_bot': {'script': 'bot-sqzmom.py', 'symbol': 'ETHUSDT'},
+}
+
+# Продление и освобождение только своей аренды (значение ключа - id воркера)
+_RENEW_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_LUA = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def lease_key(bot_id):
+    return f'{LEASE_PREFIX}{bot_id}'
+
+
+# --- РЕЕСТР ---
+def ensure_defaults(r):
+    """Заполняет пустой реестр экземплярами по умолчанию один раз (метка SEEDED_KEY).
+
+    Экземпляры, удаленные потом через remove, не возвращаются.
+    """
+    if r.set(SEEDED_KEY, 1, nx=True) and not r.exists(REGISTRY_KEY):
+        r.hset(REGISTRY_KEY, mapping={bot_id: json.dumps(spec) for bot_id, spec in DEFAULT_BOTS.items()})
+
+
+def list_bots(r):
+    """Экземпляры из реестра: {id: {'script': ..., 'symbol': ...}}, отсортированные по id."""
+    return {bot_id: json.loads(spec) for bot_id, spec in sorted(r.hgetall(REGISTRY_KEY).items())}
+
+
+def add_bot(r, bot_id, script, symbol):
+    r.hset(REGISTRY_KEY, bot_id, json.dumps({'script': script, 'symbol': symbol}))
+
+
+def remove_bot(r, bot_id):
+    r.hdel(REGISTRY_KEY, bot_id)
+    r.hdel(RUN_STATE_KEY, bot_id)
+
+
+# --- ЖЕЛАЕМОЕ СОСТОЯНИЕ ---
+# Команда START/STOP из панели сохраняется и после того, как бот ее прочитал:
+# воркер, запускающий экземпляр (после сбоя процесса или другого воркера),
+# повторяет START, и торговля продолжается без оператора
+def set_run_state(r, bot_id, state):
+    r.hset(RUN_STATE_KEY, bot_id, state)
+
+
+def run_state(r, bot_id):
+    """'START', 'STOP' или None (команд еще не было)."""
+    return r.hget(RUN_STATE_KEY, bot_id)
+
+
+# --- АРЕНДА ---
+def lease_owners(r, bot_ids):
+    """{id экземпляра: id воркера или None}."""
+    bot_ids = list(bot_ids)
+    if not bot_ids:
+        return {}
+    return dict(zip(bot_ids, r.mget([lease_key(b) for b in bot_ids])))
+
+
+def acquire_lease(r, bot_id, worker_id, ttl=LEASE_TTL):
+    return bool(r.set(lease_key(bot_id), worker_id, nx=True, px=int(ttl * 1000)))
+
+
+def renew_leases(r, bot_ids, worker_id, ttl=LEASE_TTL):
+    """Продлевает аренду одним pipeline; возвращает множество экземпляров, аренда которых сохранилась."""
+    bot_ids = list(bot_ids)
+    if not bot_ids:
+        return set()
+    pipe = r.pipeline(transaction=False)
+    for bot_id in bot_ids:
+        pipe.eval(_RENEW_LUA, 1, lease_key(bot_id), worker_id, int(ttl * 1000))
+    return {bot_id for bot_id, ok in zip(bot_ids, pipe.execute()) if ok}
+
+
+def release_lease(r, bot_id, worker_id):
+    r.eval(_RELEASE_LUA, 1, lease_key(bot_id), worker_id)
+
+
+# --- ВОРКЕРЫ ---
+def heartbeat_worker(r, worker_id, info, ttl=LEASE_TTL):
+    """Отмечает воркер живым и возвращает список живых воркеров."""
+    now_ms = int(time.time() * 1000)
+    pipe = r.pipeline(transaction=False)
+    pipe.zadd(WORKERS_KEY, {worker_id: now_ms})
+    pipe.zremrangebyscore(WORKERS_KEY, 0, now_ms - int(ttl * 1000))
+    pipe.hset(f'{WORKER_INFO_PREFIX}{worker_id}', mapping=info)
+    pipe.pexpire(f'{WORKER_INFO_PREFIX}{worker_id}', int(ttl * 1000))
+    pipe.zrange(WORKERS_KEY, 0, -1)
+    return pipe.execute()[-1]
+
+
+def remove_worker(r, worker_id):
+    r.zrem(WORKERS_KEY, worker_id)
+    r.delete(f'{WORKER_INFO_PREFIX}{worker_id}')
+
+
+def target_share(worker_id, workers, instances):
+    """До скольких экземпляров воркер забирает свободные: поровну, остаток - первым по id.
+
+    Все воркеры считают доли по одному списку, сумма долей равна числу экземпляров.
+    Работающие экземпляры ради равенства не переносятся.
+    """
+    workers = sorted(workers)
+    if worker_id not in workers:
+        return 0
+    base, extra = divmod(instances, len(workers))
+    return base + (1 if workers.index(worker_id) < extra else 0)
+
+
+if __name__ == '__main__':
+    import redis_pool
+    r = redis_pool.get_redis('registry')
+    ensure_defaults(r)
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'add' and len(sys.argv) == 5:
+        add_bot(r, sys.argv[2], sys.argv[3], sys.argv[4])
+    elif command == 'remove' and len(sys.argv) == 3:
+        remove_bot(r, sys.argv[2])
+    elif command != 'list':
+        print("Usage: registry.py list | add <bot_id> <script> <symbol> | remove <bot_id>")
+        sys.exit(1)
+    bots = list_bots(r)
+    for bot_id, owner in lease_owners(r, bots).items():
+        print(f"{bot_id:20s} {bots[bot_id]['script']:16s} {bots[bot_id]['symbol']:10s} "
+              f"{run_state(r, bot_id) or '-':6s} {owner or '-'}")
@@ -0,0 +1,359 @@
+# Устойчивость стратегии: Monte Carlo по сделкам и walk-forward на истории.
+#   python robustness.py montecarlo logs/macd_bot.jsonl --paths 100000 --trades 1000
+#   python robustness.py walkforward bot-macd.py --symbol ETHUSDT --is-days 60 --oos-days 20
+# Сделки берутся из журнала бота (botlog.py: события exit - это trade_history
+# PaperAccount, включая ротированные .gz) или из прогона вариантов бота на
+# истории (backfill.py, data/<SYMBOL>_<interval>.npz). Monte Carlo перемешивает
+# сделки (bootstrap с возвращением или перестановка) и считает по каждому пути
+# просадку, нарушения дневного лимита убытка и разорение; пути - строки матрицы
+# NumPy, блоки матрицы считаются параллельно в потоках (NumPy отпускает GIL).
+# Walk-forward: на каждом окне in-sample выбирается лучший вариант параметров,
+# его сделки на следующем окне out-of-sample идут в итог; окна считаются в
+# отдельных процессах.
+import argparse
+import glob
+import gzip
+import importlib.util
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from backfill import DATA_DIR, load_store, store_path
+from klines import INTERVAL_MS
+from shadow import make_variants
+
+# --- НАСТРОЙКИ (по умолчанию - как в ботах) ---
+INITIAL_BALANCE = 100.0
+DAILY_MAX_LOSS_PERCENT = 0.05
+MAX_DRAWDOWN_PERCENT = 0.20
+RUIN_PERCENT = 0.50         # Разорение: потеря этой доли начального баланса
+PATHS = 10000
+CHUNK_ELEMENTS = 2_000_000  # Элементов матрицы путей в одном блоке (~16 МБ float64)
+WINDOW = 500                # Свечей в окне индикаторов при прогоне (как KlineBuffer)
+IS_DAYS = 60
+OOS_DAYS = 20
+DAY_SECONDS = 86400
+
+
+# --- СДЕЛКИ ---
+def journal_files(path):
+    """Журнал и его ротированные части, от старых к новым: .N.gz, ..., .1.gz, сам файл."""
+    rotated = glob.glob(glob.escape(path) + '.*.gz')
+    rotated.sort(key=lambda p: int(p[len(path) + 1:-3]) if p[len(path) + 1:-3].isdigit() else 0, reverse=True)
+    return rotated + ([path] if os.path.exists(path) else [])
+
+
+def load_journal(path):
+    """Сделки из событий exit журнала: (время закрытия в сек, PnL в USDT), по времени."""
+    ts, pnl = [], []
+    for name in journal_files(path):
+        opener = gzip.open if name.endswith('.gz') else open
+        with opener(name, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if '"exit"' not in line:
+                    continue
+                entry = json.loads(line)
+                if entry.get('event') == 'exit' and 'pnl_usdt' in entry:
+                    ts.append(entry['ts'])
+                    pnl.append(entry['pnl_usdt'])
+    order = np.argsort(ts, kind='stable')
+    return np.asarray(ts, dtype=np.float64)[order], np.asarray(pnl, dtype=np.float64)[order]
+
+
+def trades_per_day(ts):
+    """Среднее число сделок в торговый день (дни без сделок не считаются)."""
+    if len(ts) == 0:
+        return 1.0
+    return len(ts) / len(np.unique(ts // DAY_SECONDS))
+
+
+# --- MONTE CARLO ---
+def _simulate(pnl, seed, paths, trades, method, day_starts, balance, max_drawdown, daily_max_loss, ruin):
+    """Один блок путей: матрица (paths, trades) сделок и метрики по строкам."""
+    rng = np.random.default_rng(seed)
+    if method == 'permutation':
+        sample = rng.permuted(np.tile(pnl, (paths, 1)), axis=1)
+    else:
+        sample = pnl[rng.integers(0, len(pnl), size=(paths, trades))]
+
+    equity = np.cumsum(sample, axis=1)
+    equity += balance
+    # Дневной результат и баланс на начало дня (как daily_start_balance бота)
+    day_pnl = np.add.reduceat(sample, day_starts, axis=1)
+    day_start_equity = np.empty_like(day_pnl)
+    day_start_equity[:, 0] = balance
+    day_start_equity[:, 1:] = equity[:, day_starts[1:] - 1]
+    daily_breaches = np.count_nonzero(-day_pnl >= day_start_equity * daily_max_loss, axis=1)
+
+    min_equity = equity.min(axis=1)
+    final_pnl = equity[:, -1] - balance
+    ruined = equity <= balance * (1 - ruin)
+    ruin_trade = np.where(ruined.any(axis=1), ruined.argmax(axis=1), -1)
+
+    # Просадка от пика, пик не ниже начального баланса; буфер sample переиспользуется
+    peak = np.maximum.accumulate(equity, axis=1, out=sample)
+    np.maximum(peak, balance, out=peak)
+    drawdown = np.subtract(peak, equity, out=equity)
+    drawdown /= peak
+    max_drawdown_path = drawdown.max(axis=1)
+
+    return {
+        'max_drawdown': max_drawdown_path,
+        'final_pnl': final_pnl,
+        'min_equity': min_equity,
+        'limit_hit': min_equity <= balance * (1 - max_drawdown),
+        'daily_breaches': daily_breaches,
+        'ruin_trade': ruin_trade
+    }
+
+
+def monte_carlo(pnl, paths=PATHS, trades=None, method='bootstrap', per_day=1.0, balance=INITIAL_BALANCE,
+                max_drawdown=MAX_DRAWDOWN_PERCENT, daily_max_loss=DAILY_MAX_LOSS_PERCENT, ruin=RUIN_PERCENT,
+                seed=0, workers=None, chunk_elements=CHUNK_ELEMENTS):
+    """Распределения по paths путям из trades сделок; возвращает массивы метрик по путям.
+
+    method: 'bootstrap' - выборка с возвращением (trades любое), 'permutation' -
+    перестановка всех сделок (trades = len(pnl)). per_day - сделок в день для
+    деления пути на дни (дневной лимит). Результат не зависит от workers:
+    у каждого блока свой seed из SeedSequence.
+    """
+    pnl = np.asarray(pnl, dtype=np.float64)
+    if len(pnl) == 0:
+        raise ValueError("No trades")
+    if method == 'permutation':
+        trades = len(pnl)
+    trades = trades or len(pnl)
+    day_id = (np.arange(trades) / max(per_day, 1e-9)).astype(np.int64)
+    day_starts = np.flatnonzero(np.diff(day_id, prepend=-1))
+
+    chunk = max(1, min(paths, chunk_elements // trades))
+    sizes = [min(chunk, paths - i) for i in range(0, paths, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = (trades, method, day_starts, balance, max_drawdown, daily_max_loss, ruin)
+    with ThreadPoolExecutor(workers or min(os.cpu_count() or 1, 8)) as pool:
+        parts = list(pool.map(lambda job: _simulate(pnl, job[0], job[1], *args), zip(seeds, sizes)))
+    return {key: np.concatenate([p[key] for p in parts]) for key in parts[0]}
+
+
+def summarize(result):
+    """Сводка распределений: квантили просадки и PnL, вероятности срабатывания лимитов."""
+    ruined = result['ruin_trade'] >= 0
+    q = (50, 90, 95, 99)
+    return {
+        'paths': len(ruined),
+        'max_drawdown_pct': dict(zip(q, np.round(np.percentile(result['max_drawdown'], q) * 100, 2))),
+        'final_pnl': dict(zip((5, 25, 50, 75, 95), np.round(np.percentile(result['final_pnl'], (5, 25, 50, 75, 95)), 2))),
+        'p_loss': float(np.mean(result['final_pnl'] < 0)),
+        'p_max_drawdown_limit': float(np.mean(result['limit_hit'])),
+        'p_daily_loss_breach': float(np.mean(result['daily_breaches'] > 0)),
+        'daily_breaches_mean': float(np.mean(result['daily_breaches'])),
+        'p_ruin': float(np.mean(ruined)),
+        'ruined_paths': int(ruined.sum()),
+        'ruin_trade_median': float(np.median(result['ruin_trade'][ruined])) if ruined.any() else None
+    }
+
+
+def print_summary(s, title):
+    print(title)
+    print(f"  paths {s['paths']}")
+    print("  max drawdown %  " + '  '.join(f"p{k} {v}" for k, v in s['max_drawdown_pct'].items()))
+    print("  final PnL USDT  " + '  '.join(f"p{k} {v}" for k, v in s['final_pnl'].items()))
+    print(f"  P(loss) {s['p_loss']:.3f}   P(MAX_DRAWDOWN limit) {s['p_max_drawdown_limit']:.3f}   "
+          f"P(daily loss breach) {s['p_daily_loss_breach']:.3f} (mean {s['daily_breaches_mean']:.2f} days/path)")
+    ruin_at = f", median at trade {s['ruin_trade_median']:.0f}" if s['ruin_trade_median'] is not None else ''
+    print(f"  P(ruin) {s['p_ruin']:.5f} ({s['ruined_paths']} paths{ruin_at})")
+
+
+# --- ПРОГОН НА ИСТОРИИ ---
+def load_bot(path):
+    """Модуль бота из файла (bot-macd.py и т.п.): shadow_runner, live_params, SHADOW_VARIANTS."""
+    spec = importlib.util.spec_from_file_location('strategy_' + os.path.basename(path).replace('-', '_')[:-3], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bot_intervals(bot):
+    return [bot.INTERVAL] + ([bot.HIGHER_INTERVAL] if bot.HIGHER_INTERVAL != bot.INTERVAL else [])
+
+
+def load_history(symbol, intervals, data_dir=DATA_DIR):
+    history = {}
+    for interval in intervals:
+        data = load_store(store_path(data_dir, symbol, interval))
+        if data is None:
+            raise FileNotFoundError(f"No {symbol} {interval} history in {data_dir}, run backfill.py first")
+        history[interval] = data
+    return history
+
+
+def replay(bot, history, variants, start_ms, end_ms, balance=INITIAL_BALANCE, window=WINDOW):
+    """Прогон вариантов на закрытых свечах рабочего интервала с открытием в [start_ms, end_ms).
+
+    Каждой свече передаются окна последних window свечей всех интервалов,
+    закрытых к ее закрытию (как буферы бота); дневной лимит убытка счетов
+    сбрасывается по времени закрытия свечей. Возвращает {вариант: (ts, pnl)}.
+    """
+    import indicators
+    indicators.warmup()
+    runner = bot.shadow_runner(None, variants, balance, record_trades=True)
+    main = history[bot.INTERVAL]
+    main_ms = INTERVAL_MS[bot.INTERVAL]
+    open_time = main['open_time']
+    first = max(int(np.searchsorted(open_time, start_ms)), window - 1)
+    last = int(np.searchsorted(open_time, end_ms))
+    others = [(interval, data, INTERVAL_MS[interval]) for interval, data in history.items() if interval != bot.INTERVAL]
+
+    for i in range(first, last):
+        close_ms = int(open_time[i]) + main_ms
+        datasets = {bot.INTERVAL: {k: v[i + 1 - window:i + 1] for k, v in main.items()}}
+        for interval, data, ms in others:
+            end = int(np.searchsorted(data['open_time'], close_ms - ms, side='right'))
+            datasets[interval] = {k: v[max(end - window, 0):end] for k, v in data.items()}
+        runner.on_candle(datasets, main['Close'][i], ts=close_ms / 1000)
+
+    return {ledger.name: (np.array([t for t, _ in ledger.history], dtype=np.float64),
+                          np.array([p for _, p in ledger.history], dtype=np.float64))
+            for ledger in runner.ledgers}
+
+
+# --- WALK-FORWARD ---
+_worker_state = {}
+
+
+def _run_fold(bot_path, symbol, data_dir, variants, start_ms, split_ms, end_ms, balance):
+    """Одно окно в процессе пула: прогон всех вариантов на in-sample и out-of-sample.
+
+    Out-of-sample начинается с новых счетов (индикаторы - по истории до границы):
+    счет, остановленный лимитом просадки на in-sample, не обнуляет окно.
+    """
+    key = (bot_path, symbol, data_dir)
+    if key not in _worker_state:
+        bot = load_bot(bot_path)
+        _worker_state[key] = (bot, load_history(symbol, bot_intervals(bot), data_dir))
+    bot, history = _worker_state[key]
+    in_sample = replay(bot, history, variants, start_ms, split_ms, balance)
+    out_of_sample = replay(bot, history, variants, split_ms, end_ms, balance)
+    return {name: {'is': in_sample[name][1], 'oos': pnl, 'oos_ts': ts}
+            for name, (ts, pnl) in out_of_sample.items()}
+
+
+def make_folds(start_ms, end_ms, is_days=IS_DAYS, oos_days=OOS_DAYS):
+    """Скользящие окна (начало, граница IS/OOS, конец); шаг - длина OOS."""
+    is_ms, oos_ms = is_days * DAY_SECONDS * 1000, oos_days * DAY_SECONDS * 1000
+    folds = []
+    start = start_ms
+    while start + is_ms + oos_ms <= end_ms:
+        folds.append((start, start + is_ms, start + is_ms + oos_ms))
+        start += oos_ms
+    return folds
+
+
+def walk_forward(bot_path, symbol, variants, folds, data_dir=DATA_DIR, balance=INITIAL_BALANCE, workers=None):
+    """Окна параллельно в процессах; на каждом - лучший по PnL in-sample вариант.
+
+    Возвращает (строки по окнам, время и PnL сделок out-of-sample выбранных вариантов).
+    """
+    with ProcessPoolExecutor(workers or os.cpu_count()) as pool:
+        futures = [pool.submit(_run_fold, bot_path, symbol, data_dir, variants, *fold, balance) for fold in folds]
+        results = [f.result() for f in futures]
+
+    rows, oos_ts, oos_pnl = [], [], []
+    for fold, result in zip(folds, results):
+        best = max(result, key=lambda name: (result[name]['is'].sum(), name == 'live'))
+        chosen = result[best]
+        rows.append({
+            'start': fold[0], 'split': fold[1], 'end': fold[2], 'best': best,
+            'is_pnl': float(chosen['is'].sum()), 'is_trades': len(chosen['is']),
+            'oos_pnl': float(chosen['oos'].sum()), 'oos_trades': len(chosen['oos']),
+            'live_oos_pnl': float(result['live']['oos'].sum()) if 'live' in result else None
+        })
+        oos_ts.append(chosen['oos_ts'])
+        oos_pnl.append(chosen['oos'])
+    return rows, np.concatenate(oos_ts), np.concatenate(oos_pnl)
+
+
+# --- CLI ---
+def _date(ms):
+    return time.strftime('%Y-%m-%d', time.gmtime(ms / 1000))
+
+
+def _risk_args(parser):
+    parser.add_argument('--paths', type=int, default=PATHS)
+    parser.add_argument('--trades', type=int, default=None, help='сделок в пути, по умолчанию - как в логе')
+    parser.add_argument('--method', choices=('bootstrap', 'permutation'), default='bootstrap')
+    parser.add_argument('--balance', type=float, default=INITIAL_BALANCE)
+    parser.add_argument('--max-drawdown', type=float, default=MAX_DRAWDOWN_PERCENT)
+    parser.add_argument('--daily-max-loss', type=float, default=DAILY_MAX_LOSS_PERCENT)
+    parser.add_argument('--ruin', type=float, default=RUIN_PERCENT)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+
+
+def _run_monte_carlo(args, ts, pnl, title):
+    started = time.perf_counter()
+    result = monte_carlo(pnl, args.paths, args.trades, args.method, trades_per_day(ts), args.balance,
+                         args.max_drawdown, args.daily_max_loss, args.ruin, args.seed, args.workers)
+    elapsed = time.perf_counter() - started
+    trades = len(pnl) if args.method == 'permutation' else (args.trades or len(pnl))
+    print_summary(summarize(result),
+                  f"{title}: {len(pnl)} trades, {args.method} {args.paths} paths x {trades} trades in {elapsed:.2f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Monte Carlo и walk-forward по сделкам стратегии')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    mc = commands.add_parser('montecarlo', help='Monte Carlo по журналу бота (logs/<bot_id>.jsonl)')
+    mc.add_argument('journal')
+    _risk_args(mc)
+
+    wf = commands.add_parser('walkforward', help='walk-forward вариантов бота на истории backfill.py')
+    wf.add_argument('bot', help='файл бота, например bot-macd.py')
+    wf.add_argument('--symbol', default='ETHUSDT')
+    wf.add_argument('--dir', default=DATA_DIR)
+    wf.add_argument('--is-days', type=float, default=IS_DAYS)
+    wf.add_argument('--oos-days', type=float, default=OOS_DAYS)
+    wf.add_argument('--variants', default=None, help='JSON-файл вариантов (формат shadow_variants), по умолчанию - SHADOW_VARIANTS бота')
+    _risk_args(wf)
+    args = parser.parse_args(argv)
+
+    if args.command == 'montecarlo':
+        ts, pnl = load_journal(args.journal)
+        _run_monte_carlo(args, ts, pnl, args.journal)
+        return
+
+    bot = load_bot(args.bot)
+    if args.variants:
+        with open(args.variants, encoding='utf-8') as f:
+            variants = make_variants(bot.live_params(), json.load(f))
+    else:
+        variants = make_variants(bot.live_params(), bot.SHADOW_VARIANTS)
+    main_times = load_history(args.symbol, [bot.INTERVAL], args.dir)[bot.INTERVAL]['open_time']
+    # Первые WINDOW свечей - разгон индикаторов
+    folds = make_folds(int(main_times[min(WINDOW, len(main_times) - 1)]), int(main_times[-1]), args.is_days, args.oos_days)
+    if not folds:
+        raise ValueError(f"History is shorter than {args.is_days} + {args.oos_days} days")
+
+    started = time.perf_counter()
+    rows, ts, pnl = walk_forward(args.bot, args.symbol, variants, folds, args.dir, args.balance, args.workers)
+    print(f"{args.bot} {args.symbol}: {len(variants)} variants, {len(folds)} folds in {time.perf_counter() - started:.1f}s")
+    for row in rows:
+        live = f"{row['live_oos_pnl']:8.2f}" if row['live_oos_pnl'] is not None else '       -'
+        print(f"  {_date(row['start'])} .. {_date(row['split'])} .. {_date(row['end'])}  best {row['best']:12s} "
+              f"IS {row['is_pnl']:8.2f} ({row['is_trades']:3d})  OOS {row['oos_pnl']:8.2f} ({row['oos_trades']:3d})  live OOS {live}")
+    print(f"  out-of-sample total {pnl.sum():.2f} USDT over {len(pnl)} trades")
+    if len(pnl):
+        _run_monte_carlo(args, ts, pnl, 'walk-forward out-of-sample')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f"Critical error: {e}")
+        sys.exit(1)
@@ -0,0 +1,238 @@
+# Тяжелые модули (numpy, numba, python-binance, websocket) импортируются при запуске сканера
+import time
+import threading
+import sys
+import os
+import json
+import logging
+import botlog
+import redis_pool
+from redis_publisher import RedisPublisher
+
+# --- НАСТРОЙКИ СКАНЕРА (SQZMOM / MACD / EMA Cloud по всем USDT парам) ---
+INTERVAL = '15m'
+BARS = 300          # Глубина истории на символ
+MAX_SYMBOLS = 400   # Пары с наибольшим оборотом за 24ч
+TOP_N = 20          # Кандидатов в списке для панели
+SCAN_DELAY = 2.0    # Ожидание закрытых свечей остальных пар после первой (сек)
+LOAD_WORKERS = 8
+
+# Параметры индикаторов (как в bot-sqzmom.py и bot-macd.py)
+SQZ_BB_ДЛИНА = 30
+SQZ_BB_МУЛЬТИФАКТОР = 1.8
+SQZ_KC_ДЛИНА = 30
+SQZ_KC_МУЛЬТИФАКТОР = 1.9
+SQZ_ATR_ПЕРИОД = 14
+MACD_FAST = 20
+MACD_SLOW = 30
+MACD_SIGNAL = 9
+EMA_PERIODS = [50, 100]
+
+# --- НАСТРОЙКИ REDIS ---
+SCANNER_ID = 'scanner'
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+r = redis_pool.client('scanner', host=REDIS_HOST, port=REDIS_PORT)
+# Запись результатов через фоновый поток (redis_publisher.py), как у ботов
+publisher = RedisPublisher(r)
+SCANNER_TTL = 2 * 15 * 60  # Результат без обновлений дольше двух баров INTERVAL - сканер не работает
+
+log = logging.getLogger('bot')
+
+API_KEY = ''
+API_SECRET = ''
+client = None # Создается при запуске (см. get_client)
+
+def get_client():
+    """Ленивое создание клиента: Client() импортирует python-binance и пингует API."""
+    global client
+    if client is None:
+        from binance.client import Client
+        client = Client(API_KEY, API_SECRET)
+    return client
+
+# Retry для API
+def retry_api(max_attempts=3, delay=2):
+    def decorator(func):
+        def wrapper(*args, **kwargs):
+            for attempt in range(max_attempts):
+                try:
+                    return func(*args, **kwargs)
+                except Exception as e:
+                    log.warning("Retry %d/%d: %s", attempt + 1, max_attempts, e)
+                    time.sleep(delay * (2 ** attempt))
+            raise Exception("Max retries exceeded")
+        return wrapper
+    return decorator
+
+# --- ДАННЫЕ ---
+@retry_api()
+def get_usdt_symbols(limit=MAX_SYMBOLS):
+    """USDT пары, отсортированные по обороту за 24ч."""
+    tickers = get_client().get_ticker()
+    usdt = [t for t in tickers if t['symbol'].endswith('USDT') and float(t['quoteVolume']) > 0]
+    usdt.sort(key=lambda t: float(t['quoteVolume']), reverse=True)
+    return [t['symbol'] for t in usdt[:limit]]
+
+@retry_api()
+def fetch_history(symbol):
+    from klines import parse_klines
+    return parse_klines(get_client().get_klines(symbol=symbol, interval=INTERVAL, limit=BARS + 1))
+
+def load_matrix(matrix):
+    """Загружает историю всех символов параллельно и выравнивает по сетке."""
+    from concurrent.futures import ThreadPoolExecutor
+    matrix.reset()
+    with ThreadPoolExecutor(LOAD_WORKERS) as pool:
+        for symbol, data in zip(matrix.symbols, pool.map(fetch_history, matrix.symbols)):
+            matrix.load(symbol, data)
+    matrix.fill_gaps()
+    log.info("Loaded %d symbols x %d bars", len(matrix.symbols), len(matrix))
+
+# --- РАСЧЕТ ПО МАТРИЦЕ ---
+def scan(close, high, low):
+    """Один векторный проход по матрицам (символы x бары).
+
+    Возвращает массивы по символам: direction (1 лонг, -1 шорт, 0 нет сигнала),
+    strength (число совпавших условий), momentum, is_squeeze, macd_dir.
+    """
+    import numpy as np
+    import indicators
+
+    is_squeeze, momentum, _ = indicators.squeeze_momentum(
+        close, high, low,
+        SQZ_BB_ДЛИНА, SQZ_BB_МУЛЬТИФАКТОР,
+        SQZ_KC_ДЛИНА, SQZ_KC_МУЛЬТИФАКТОР,
+        SQZ_ATR_ПЕРИОД
+    )
+    macd_line, macd_signal = indicators.macd(close, MACD_FAST, MACD_SLOW, MACD_SIGNAL)
+    cloud_high, cloud_low = indicators.ema_cloud(close, EMA_PERIODS)
+
+    mom = momentum[:, -1]
+    macd_dir = np.nan_to_num(np.sign(macd_line[:, -1] - macd_signal[:, -1])).astype(np.int8)
+    prev_close, last_close = close[:, -2], close[:, -1]
+
+    # SQZMOM: выход из сжатия, направление по импульсу
+    release = is_squeeze[:, -2] & ~is_squeeze[:, -1]
+    sqz_dir = np.where(release, np.sign(np.nan_to_num(mom)), 0).astype(np.int8)
+
+    # EMA Cloud: пересечение облака по направлению фильтра MACD
+    cross_up = (prev_close < cloud_high[:, -1]) & (last_close > cloud_high[:, -1]) & (macd_dir > 0)
+    cross_down = (prev_close > cloud_low[:, -1]) & (last_close < cloud_low[:, -1]) & (macd_dir < 0)
+    ema_dir = cross_up.astype(np.int8) - cross_down.astype(np.int8)
+
+    direction = np.where(sqz_dir != 0, sqz_dir, ema_dir)
+    strength = (sqz_dir != 0).astype(np.int8) + (ema_dir != 0) + ((direction != 0) & (macd_dir == direction))
+    return {
+        'direction': direction,
+        'strength': strength,
+        'momentum': mom,
+        'is_squeeze': is_squeeze[:, -1],
+        'macd_dir': macd_dir,
+    }
+
+def rank_candidates(symbols, result, last_close, top_n=TOP_N):
+    """Кандидаты с сигналом: по числу совпавших условий, затем по |momentum|."""
+    import numpy as np
+    idx = np.flatnonzero(result['direction'] != 0)
+    order = np.lexsort((-np.abs(np.nan_to_num(result['momentum'][idx])), -result['strength'][idx]))
+    candidates = []
+    for i in idx[order][:top_n]:
+        candidates.append({
+            'symbol': symbols[i],
+            'signal': 'LONG' if result['direction'][i] > 0 else 'SHORT',
+            'strength': int(result['strength'][i]),
+            'momentum': round(float(result['momentum'][i]), 4),
+            'macd': 'UP' if result['macd_dir'][i] > 0 else 'DOWN',
+            'price': float(last_close[i]),
+        })
+    return candidates
+
+def publish(candidates, scan_ms, bar_time, symbols_count):
+    publisher.set(f'{SCANNER_ID}:candidates', json.dumps(candidates), ttl=SCANNER_TTL)
+    publisher.hset(f'{SCANNER_ID}:status', ttl=SCANNER_TTL, mapping={
+        'last_update': time.time(),
+        'bar_time': bar_time,
+        'scan_ms': f"{scan_ms:.2f}",
+        'symbols': symbols_count
+    })
+
+# --- ПОТОК СВЕЧЕЙ ВСЕХ СИМВОЛОВ ---
+def make_stream(matrix, on_bar):
+    from ws_stream import KlineStream
+
+    class ScannerStream(KlineStream):
+        """KlineStream для многих символов: свечи пишутся в KlineMatrix."""
+
+        def __init__(self):
+            super().__init__(None, {}, None, None)
+
+        def stream_names(self):
+            return [f"{s.lower()}@kline_{matrix.interval}" for s in matrix.symbols]
+
+        def backfill_all(self):
+            # Пропущенные за время разрыва бары - перезагрузка истории целиком
+            last = matrix.last_open_time
+            if last is None or int(time.time() * 1000) - last >= 2 * matrix.interval_ms:
+                try:
+                    with self.lock:
+                        load_matrix(matrix)
+                except Exception as e:
+                    log.error("Scanner reload error: %s", e)
+
+        def handle_kline(self, k):
+            if not k.x:
+                return
+            with self.lock:
+                new_bar = matrix.add(k.s, k.t, k.h, k.l, k.c)
+            if new_bar:
+                on_bar()
+
+    return ScannerStream()
+
+def run_scanner():
+    from klines import KlineMatrix
+    import indicators
+
+    indicators.warmup()
+    symbols = get_usdt_symbols()
+    matrix = KlineMatrix(symbols, INTERVAL, bars=BARS)
+    load_matrix(matrix)
+
+    def run_scan():
+        with stream.lock:
+            close, high, low = matrix.close.copy(), matrix.high.copy(), matrix.low.copy()
+            bar_time = matrix.last_open_time
+        start = time.perf_counter()
+        result = scan(close, high, low)
+        candidates = rank_candidates(symbols, result, close[:, -1])
+        scan_ms = (time.perf_counter() - start) * 1000
+        publish(candidates, scan_ms, bar_time, len(symbols))
+        botlog.event(log, 'latency', "Scan %d symbols: %.1f ms, %d candidates", len(symbols), scan_ms, len(candidates),
+                     name='scan', ms=round(scan_ms, 3), symbols=len(symbols), candidates=len(candidates))
+
+    # Скан запускается через SCAN_DELAY после первой закрытой свечи нового бара
+    def on_bar():
+        timer = threading.Timer(SCAN_DELAY, run_scan)
+        timer.daemon = True
+        timer.start()
+
+    stream = make_stream(matrix, on_bar)
+    run_scan()
+    stream.start()
+    while True:
+        time.sleep(5)
+        if not stream.is_alive():
+            log.warning("Scanner stream died, restarting...")
+            stream.stop()
+            stream = make_stream(matrix, on_bar)
+            stream.start()
+
+if __name__ == "__main__":
+    botlog.setup(SCANNER_ID)
+    log.info("Сканер %s запущен (%s, до %d пар).", SCANNER_ID, INTERVAL, MAX_SYMBOLS)
+    try:
+        run_scanner()
+    except Exception as e:
+        log.critical("Critical error: %s", e, exc_info=True)
+        sys.exit(1)
@@ -0,0 +1,249 @@
+import json
+import logging
+import time
+
+import numpy as np
+
+import indicators
+from triggers import TriggerWatcher
+
+# =========================================================================
+# --- ТЕНЕВОЙ РЕЖИМ: ВАРИАНТЫ ПАРАМЕТРОВ НА ОДНОМ ПОТОКЕ СВЕЧЕЙ ---
+# =========================================================================
+# Бот считает свою рабочую стратегию и рядом N вариантов параметров. У каждого
+# варианта свой бумажный счет (ShadowLedger), сделки не влияют на основной счет.
+# Общие расчеты (EMA одного периода, скользящие окна, ATR) выполняются один раз
+# на свечу и переиспользуются всеми вариантами через IndicatorCache.
+
+SHADOW_TTL = 7 * 24 * 3600  # Итоги вариантов в Redis после последнего обновления (сек)
+
+log = logging.getLogger('bot.shadow')
+# Логгер счетов вариантов: их входы, выходы и срабатывания лимитов не попадают
+# в вывод и журнал сделок бота (robustness.py читает оттуда сделки основного счета)
+account_log = logging.getLogger('bot.shadow.account')
+account_log.addHandler(logging.NullHandler())
+account_log.propagate = False
+
+
+# --- ОБЩИЙ КЭШ ИНДИКАТОРОВ НА ОДНУ СВЕЧУ ---
+class IndicatorCache:
+    """Мемоизация индикаторов по колонкам закрытых свечей (KlineBuffer.columns)."""
+
+    def __init__(self, data):
+        self.data = data
+        self.close = data['Close']
+        self._memo = {}
+
+    def _get(self, key, func, *args):
+        if key not in self._memo:
+            self._memo[key] = func(*args)
+        return self._memo[key]
+
+    def ema(self, span):
+        return self._get(('ema', span), indicators.ema, self.close, span)
+
+    def mean_std(self, length):
+        return self._get(('mean_std', length), indicators.rolling_mean_std, self.close, length)
+
+    def highest(self, length):
+        return self._get(('max', length), indicators.rolling_max, self.data['High'], length)
+
+    def lowest(self, length):
+        return self._get(('min', length), indicators.rolling_min, self.data['Low'], length)
+
+    def true_range(self):
+        return self._get(('tr',), indicators.true_range, self.data['High'], self.data['Low'], self.close)
+
+    def atr(self, period):
+        return self._get(('atr', period), lambda: indicators.ema(self.true_range(), period))
+
+    def macd(self, fast, slow, signal):
+        """Возвращает (MACD, сигнальная линия); EMA периодов fast/slow общие для вариантов."""
+        def calc():
+            line = self.ema(fast) - self.ema(slow)
+            return line, indicators.ema(line, signal)
+        return self._get(('macd', fast, slow, signal), calc)
+
+    def ema_cloud(self, periods):
+        """Возвращает (верхняя, нижняя) границы облака EMA."""
+        def calc():
+            emas = [self.ema(p) for p in periods]
+            return np.maximum.reduce(emas), np.minimum.reduce(emas)
+        return self._get(('cloud', tuple(periods)), calc)
+
+    def _momentum_base(self, bb_length, kc_length):
+        # Импульс при bb_mult = 1: EMA линейна, поэтому импульс для любого
+        # множителя получается делением, окна и EMA считаются один раз
+        def calc():
+            mid = (self.highest(bb_length) + self.lowest(bb_length)) / 2
+            with np.errstate(divide='ignore', invalid='ignore'):
+                val1 = (self.close - mid) / self.mean_std(bb_length)[1]
+            val2 = indicators.ema(val1, kc_length)
+            return val2 - indicators.ema(val2, 10)
+        return self._get(('momentum', bb_length, kc_length), calc)
+
+    def squeeze_momentum(self, bb_length, bb_mult, kc_length, kc_mult, atr_period):
+        """Возвращает (is_squeeze, momentum), как indicators.squeeze_momentum."""
+        def calc():
+            kc_mid, rng = self.ema(kc_length), self.atr(atr_period)
+            bb_mid, std = self.mean_std(bb_length)
+            is_squeeze = (bb_mid + bb_mult * std < kc_mid + kc_mult * rng) & (bb_mid - bb_mult * std > kc_mid - kc_mult * rng)
+            return is_squeeze, self._momentum_base(bb_length, kc_length) / bb_mult
+        return self._get(('sqz', bb_length, bb_mult, kc_length, kc_mult, atr_period), calc)
+
+
+# --- СЧЕТ ВАРИАНТА ---
+class ShadowLedger:
+    """Вариант: параметры, бумажный счет с правилами бота и уровни входа внутри бара.
+
+    account - PaperAccount бота (ShadowAccount): проверки маржи, лимитов дневного
+    убытка и просадки и комиссии те же, что у основного счета.
+    """
+
+    def __init__(self, name, params, account):
+        self.name = name
+        self.params = params
+        self.account = account
+        self.history = None   # [(время закрытия, PnL)], если ShadowRunner записывает сделки
+        self.recorded = 0     # Сделок account.trade_history уже в history
+        self.watcher = TriggerWatcher()
+
+    def record(self, ts):
+        trades = self.account.trade_history
+        self.history.extend((ts, t['pnl_usdt']) for t in trades[self.recorded:])
+        self.recorded = len(trades)
+
+    def stats(self, price):
+        account = self.account
+        trades = account.trade_history
+        wins = sum(1 for t in trades if t['pnl_usdt'] > 0)
+        equity = account.equity(price)
+        return {
+            'params': self.params,
+            'balance': round(account.balance_usdt, 2),
+            'equity': round(equity, 2),
+            'pnl': round(equity - account.initial_balance, 2),
+            'trades': len(trades),
+            'win_rate': round(100 * wins / len(trades), 1) if trades else 0.0,
+            'position': ('LONG' if account.is_long else 'SHORT') if account.is_in_position else ''
+        }
+
+
+# --- ВАРИАНТЫ ---
+def load_variants(r, bot_id, base_params, defaults):
+    """Список (имя, параметры): рабочий набор 'live' и варианты.
+
+    Варианты берутся из Redis (shadow_variants:<bot_id>, JSON-список словарей с
+    ключом 'name' и переопределяемыми настройками), иначе - defaults из бота.
+    """
+    variants = defaults
+    try:
+        raw = r.get(f'shadow_variants:{bot_id}')
+        if raw:
+            variants = json.loads(raw)
+    except Exception as e:
+        log.warning("Shadow variants load error: %s", e)
+    return make_variants(base_params, variants)
+
+
+def make_variants(base_params, variants):
+    """('live', base_params) и варианты: словари с 'name' и переопределяемыми настройками."""
+    result = [('live', dict(base_params))]
+    for i, variant in enumerate(variants):
+        overrides = {k: v for k, v in variant.items() if k in base_params}
+        result.append((variant.get('name', f'v{i + 1}'), {**base_params, **overrides}))
+    return result
+
+
+# --- ИСПОЛНЕНИЕ ВАРИАНТОВ ---
+class ShadowRunner:
+    """Прогоняет все варианты на закрытых свечах (и тиках) основного потока.
+
+    evaluate(caches, params) -> (signal, levels): сигнал на закрытой свече
+    ('LONG'/'SHORT'/None) и уровни входа внутри бара (long, short, direction)
+    либо None. caches - IndicatorCache по интервалам, общий для всех вариантов.
+    Счета и сделки - те же функции, что у основного счета бота:
+    make_account(balance) создает счет варианта, on_signal(account, signal, price)
+    выполняет выход/вход на закрытой свече, on_trigger(account, signal, price) -
+    вход внутри бара (None - без входов на тиках).
+    publisher - RedisPublisher бота, итоги пишутся в bot_shadow:<bot_id>;
+    None - без публикации (прогон на истории, robustness.py). record_trades
+    сохраняет сделки каждого варианта в ledger.history.
+    """
+
+    def __init__(self, publisher, bot_id, variants, balance, evaluate, make_account, on_signal, on_trigger=None,
+                 ttl=SHADOW_TTL, record_trades=False):
+        self.publisher = publisher
+        self.ttl = ttl
+        self.key = f'bot_shadow:{bot_id}'
+        self.ledgers = []
+        for name, params in variants:
+            account = make_account(balance)
+            account.log = account_log
+            self.ledgers.append(ShadowLedger(name, params, account))
+        if record_trades:
+            for ledger in self.ledgers:
+                ledger.history = []
+        self.evaluate = evaluate
+        self.on_signal = on_signal
+        self.on_trigger = on_trigger
+        self.last_price = 0.0
+        self.last_time = 0.0
+        self.last_eval_ms = 0.0
+
+    def on_candle(self, datasets, price, ts=None):
+        """datasets - колонки закрытых свечей по интервалам; price - закрытие последней свечи.
+
+        ts - время закрытия свечи (сек) для истории сделок и смены дня UTC (дневной
+        лимит убытка счетов, PaperAccount.roll_day), по умолчанию - текущее.
+        """
+        start = time.perf_counter()
+        price = float(price)
+        self.last_time = time.time() if ts is None else ts
+        caches = {interval: IndicatorCache(data) for interval, data in datasets.items()}
+        for ledger in self.ledgers:
+            # Счет, остановленный лимитом просадки, больше не торгует (как бот до нового START)
+            if not ledger.account.session_started:
+                ledger.watcher.disarm()
+                continue
+            ledger.account.roll_day(self.last_time)
+            signal, levels = self.evaluate(caches, ledger.params)
+            self.on_signal(ledger.account, signal, price)
+            if ledger.history is not None:
+                ledger.record(self.last_time)
+            if levels:
+                ledger.watcher.update(*levels)
+            else:
+                ledger.watcher.disarm()
+        self.last_price = price
+        self.last_eval_ms = (time.perf_counter() - start) * 1000
+        if self.publisher is not None:
+            self.publish()
+
+    def on_tick(self, price):
+        """Вход внутри бара по уровням каждого варианта: два сравнения на вариант."""
+        if self.on_trigger is None:
+            return
+        price = float(price)
+        for ledger in self.ledgers:
+            account = ledger.account
+            if account.session_started and not account.is_in_position:
+                signal = ledger.watcher.check(price)
+                if signal:
+                    self.on_trigger(account, signal, price)
+
+    def disarm(self):
+        """Снимает уровни входа всех вариантов до следующей закрытой свечи."""
+        for ledger in self.ledgers:
+            ledger.watcher.disarm()
+
+    def publish(self):
+        """Итоги всех вариантов одним HSET: поле - имя варианта, значение - JSON."""
+        price = self.last_price
+        mapping = {ledger.name: json.dumps(ledger.stats(price)) for ledger in self.ledgers}
+        mapping['_meta'] = json.dumps({'eval_ms': round(self.last_eval_ms, 2), 'last_update': time.time()})
+        self.publisher.hset(self.key, mapping, ttl=self.ttl)
+
+    def reset(self):
+        """Удаляет итоги прошлой сессии (варианты могли измениться)."""
+        self.publisher.delete(self.key)
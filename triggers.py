@@ -0,0 +1,35 @@
+INF = float('inf')
+
+
+# --- ТРИГГЕРНЫЕ УРОВНИ ВХОДА ВНУТРИ БАРА ---
+class TriggerWatcher:
+    """Хранит уровни входа текущего бара, рассчитанные после закрытия предыдущего.
+
+    Проверка тика - два сравнения, стратегия на каждом тике не пересчитывается.
+    После срабатывания уровни сбрасываются до следующего бара.
+    """
+
+    def __init__(self):
+        self.long_level = INF
+        self.short_level = -INF
+        self.direction = None
+
+    def update(self, long_level, short_level, direction):
+        """direction - направление фильтра ('LONG', 'SHORT' или None)."""
+        self.direction = direction
+        self.long_level = long_level if direction == 'LONG' else INF
+        self.short_level = short_level if direction == 'SHORT' else -INF
+
+    def disarm(self):
+        self.long_level = INF
+        self.short_level = -INF
+
+    def check(self, price):
+        """Возвращает 'LONG'/'SHORT' при пересечении уровня, иначе None."""
+        if price > self.long_level:
+            self.disarm()
+            return 'LONG'
+        if price < self.short_level:
+            self.disarm()
+            return 'SHORT'
+        return None
@@ -0,0 +1,164 @@
+# Воркер: запускает экземпляры ботов из реестра (registry.py), арендуя их через Redis.
+# Воркеров может быть сколько угодно на любых хостах; свободные экземпляры
+# каждый забирает до своей доли (поровну, но не больше WORKER_CAPACITY).
+# Работающие экземпляры не переносятся: новый воркер берет только свободные.
+# Экземпляры остановленного или умершего воркера забирают остальные после
+# истечения аренды и, если последней командой панели был START, запускают
+# в них торговлю (registry.run_state).
+import logging
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import botlog
+import redis_pool
+import registry
+
+# --- НАСТРОЙКИ ---
+WORKER_ID = os.environ.get('WORKER_ID') or f"{socket.gethostname()}-{os.getpid()}"
+WORKER_CAPACITY = int(os.environ.get('WORKER_CAPACITY', 4))
+STOP_TIMEOUT = 5  # Ожидание завершения процесса бота перед SIGKILL (сек)
+
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', 6379))
+r = redis_pool.client('worker', host=REDIS_HOST, port=REDIS_PORT, max_connections=2,
+                      socket_timeout=registry.HEARTBEAT_INTERVAL, socket_connect_timeout=registry.HEARTBEAT_INTERVAL)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+log = logging.getLogger('bot')
+
+
+def _die_with_parent():
+    # Процессы ботов завершаются вместе с воркером, даже если он убит SIGKILL:
+    # иначе после перехода аренды экземпляр работал бы дважды
+    try:
+        import ctypes
+        ctypes.CDLL('libc.so.6').prctl(1, signal.SIGTERM)  # PR_SET_PDEATHSIG
+    except Exception:
+        pass
+
+
+class Worker:
+    def __init__(self, worker_id=WORKER_ID, capacity=WORKER_CAPACITY):
+        self.worker_id = worker_id
+        self.capacity = capacity
+        self.processes = {}   # id экземпляра -> subprocess.Popen
+        self.running = True
+        self.seeded = False
+        self.last_renew = time.time()
+
+    # --- ПРОЦЕССЫ БОТОВ ---
+    def spawn(self, bot_id, spec):
+        # Экземпляр, запущенный из панели, продолжает торговлю на новом месте
+        if registry.run_state(r, bot_id) == 'START':
+            r.set(f'command:{bot_id}', 'START')
+        env = dict(os.environ, BOT_ID=bot_id, SYMBOL=spec['symbol'])
+        self.processes[bot_id] = subprocess.Popen(
+            [sys.executable, spec['script']], cwd=BASE_DIR, env=env,
+            preexec_fn=_die_with_parent if sys.platform.startswith('linux') else None
+        )
+        log.info("Worker %s: started %s (%s %s), pid %d", self.worker_id, bot_id, spec['script'], spec['symbol'],
+                 self.processes[bot_id].pid)
+
+    def stop_bot(self, bot_id, reason):
+        process = self.processes.pop(bot_id)
+        process.terminate()
+        try:
+            process.wait(STOP_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+        log.info("Worker %s: stopped %s (%s)", self.worker_id, bot_id, reason)
+
+    def stop_all(self, reason):
+        for bot_id in list(self.processes):
+            self.stop_bot(bot_id, reason)
+
+    # --- ОДИН ЦИКЛ ПЛАНИРОВЩИКА ---
+    def tick(self):
+        if not self.seeded:
+            registry.ensure_defaults(r)
+            self.seeded = True
+        bots = registry.list_bots(r)
+
+        # 1. Продление аренды; потерянные экземпляры уже может запускать другой воркер
+        held = registry.renew_leases(r, self.processes, self.worker_id)
+        self.last_renew = time.time()
+        for bot_id in set(self.processes) - held:
+            self.stop_bot(bot_id, 'lease lost')
+        for bot_id in set(self.processes) - set(bots):
+            self.stop_bot(bot_id, 'removed from registry')
+            registry.release_lease(r, bot_id, self.worker_id)
+
+        # 2. Heartbeat и доля экземпляров на живой воркер
+        workers = registry.heartbeat_worker(r, self.worker_id, {
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'capacity': self.capacity,
+            'instances': ','.join(sorted(self.processes)),
+            'last_update': time.time()
+        })
+        share = min(self.capacity, registry.target_share(self.worker_id, workers, len(bots)))
+
+        # 3. Свободные экземпляры забираются до своей доли. Работающие сверх доли
+        # (появились новые воркеры) не отдаются: остановка прервала бы торговлю
+        if len(self.processes) < share:
+            for bot_id, owner in registry.lease_owners(r, bots).items():
+                if len(self.processes) >= share:
+                    break
+                if owner is None and registry.acquire_lease(r, bot_id, self.worker_id):
+                    self.spawn(bot_id, bots[bot_id])
+
+        # 4. Упавшие процессы перезапускаются (аренда за воркером сохраняется)
+        for bot_id, process in list(self.processes.items()):
+            if process.poll() is not None:
+                log.info("Worker %s: %s exited with code %d, restarting", self.worker_id, bot_id, process.returncode)
+                self.spawn(bot_id, bots[bot_id])
+
+    def run(self):
+        log.info("Worker %s started (capacity %d).", self.worker_id, self.capacity)
+        while self.running:
+            started = time.time()
+            try:
+                self.tick()
+            except Exception as e:
+                log.exception("Worker tick error: %s", e)
+                # Без связи с Redis аренду не продлить: до ее истечения боты останавливаются
+                if self.processes and time.time() - self.last_renew >= registry.LEASE_TTL - registry.HEARTBEAT_INTERVAL:
+                    self.stop_all('Redis unavailable')
+            time.sleep(max(registry.HEARTBEAT_INTERVAL - (time.time() - started), 0))
+        self.shutdown()
+
+    def shutdown(self):
+        """Остановка с освобождением аренды: экземпляры сразу забирают другие воркеры."""
+        for bot_id in list(self.processes):
+            self.stop_bot(bot_id, 'worker shutdown')
+            try:
+                registry.release_lease(r, bot_id, self.worker_id)
+            except Exception as e:
+                log.exception("Redis lease release error: %s", e)
+        try:
+            registry.remove_worker(r, self.worker_id)
+        except Exception as e:
+            log.exception("Redis worker remove error: %s", e)
+
+
+if __name__ == "__main__":
+    botlog.setup(WORKER_ID)
+    worker = Worker()
+
+    def handle_stop(signum, frame):
+        worker.running = False
+
+    signal.signal(signal.SIGTERM, handle_stop)
+    signal.signal(signal.SIGINT, handle_stop)
+    try:
+        worker.run()
+    except Exception as e:
+        log.critical("Critical error: %s", e, exc_info=True)
+        worker.stop_all('critical error')
+        sys.exit(1)
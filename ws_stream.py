@@ -0,0 +1,177 @@
+import websocket
+import json
+import logging
+import time
+import threading
+from decoder import is_closed_kline, decode_kline, decode_tick
+
+log = logging.getLogger('bot.ws')
+
+# --- НАСТРОЙКИ СОЕДИНЕНИЯ ---
+WEBSOCKET_URL = "wss://stream.binance.com:9443/ws"
+PING_INTERVAL = 20          # Интервал ping от клиента (сек)
+PING_TIMEOUT = 10           # Ожидание pong (сек)
+STALL_TIMEOUT = 30          # Нет сообщений дольше - соединение считается зависшим
+MAX_CONNECTION_AGE = 23 * 3600 + 50 * 60  # Binance рвет соединения через 24ч, переподключаемся заранее
+RECONNECT_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+SUBSCRIBE_CHUNK = 200       # Потоков в одном SUBSCRIBE (Binance: не более 5 сообщений/с)
+
+
+# --- МЕНЕДЖЕР WEBSOCKET-СОЕДИНЕНИЯ ---
+class KlineStream:
+    """Поддерживает подписку на свечи одного символа и докачивает пропуски.
+
+    buffers - словарь {интервал: KlineBuffer}, fetch(symbol, interval, start_ms, end_ms)
+    возвращает свечи REST API, on_candle(interval) вызывается после каждой новой
+    закрытой свечи, пришедшей из потока. Необязательный on_tick(interval, price)
+    получает цену из обновлений незакрытой свечи.
+    """
+
+    def __init__(self, symbol, buffers, fetch, on_candle, on_tick=None):
+        self.symbol = symbol
+        self.buffers = buffers
+        self.fetch = fetch
+        self.on_candle = on_candle
+        self.on_tick = on_tick
+        self.lock = threading.Lock()
+        self.ws = None
+        self.running = False
+        self.connected_at = 0.0
+        self.last_message = 0.0
+        self.reconnects = 0
+        self.backfilled = 0
+        self._threads = []
+
+    def start(self):
+        self.running = True
+        for target in (self._run, self._watchdog):
+            thread = threading.Thread(target=target)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self.running = False
+        if self.ws:
+            self.ws.close()
+
+    def is_alive(self):
+        return self.running and all(t.is_alive() for t in self._threads)
+
+    def _run(self):
+        delay = RECONNECT_DELAY
+        while self.running:
+            self.ws = websocket.WebSocketApp(
+                WEBSOCKET_URL,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close,
+                on_open=self._on_open
+            )
+            self.connected_at = time.time()
+            self.last_message = self.connected_at
+            try:
+                self.ws.run_forever(ping_interval=PING_INTERVAL, ping_timeout=PING_TIMEOUT)
+            except Exception as e:
+                log.error("WebSocket run error: %s", e)
+            if not self.running:
+                break
+            # Быстрое переподключение, если соединение успело поработать, иначе - backoff
+            if time.time() - self.connected_at > STALL_TIMEOUT:
+                delay = RECONNECT_DELAY
+            log.info("WebSocket reconnecting in %ss...", delay)
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+            self.reconnects += 1
+
+    def _watchdog(self):
+        while self.running:
+            time.sleep(1)
+            ws = self.ws
+            if ws is None or ws.sock is None or not ws.sock.connected:
+                continue
+            now = time.time()
+            if now - self.last_message > STALL_TIMEOUT:
+                log.warning("WebSocket stalled (%.0fs without messages), reconnecting...", now - self.last_message)
+                ws.close()
+            elif now - self.connected_at > MAX_CONNECTION_AGE:
+                log.info("WebSocket connection is close to 24h limit, reconnecting...")
+                ws.close()
+
+    def stream_names(self):
+        return [f"{self.symbol.lower()}@kline_{interval}" for interval in self.buffers]
+
+    def _on_open(self, ws):
+        log.info("WebSocket opened")
+        names = self.stream_names()
+        for i in range(0, len(names), SUBSCRIBE_CHUNK):
+            if i:
+                time.sleep(0.25)
+            ws.send(json.dumps({
+                "method": "SUBSCRIBE",
+                "params": names[i:i + SUBSCRIBE_CHUNK],
+                "id": i // SUBSCRIBE_CHUNK + 1
+            }))
+        self.backfill_all()
+
+    def backfill_all(self):
+        """Докачка свечей, закрывшихся пока соединения не было."""
+        for interval, buffer in self.buffers.items():
+            try:
+                with self.lock:
+                    self._backfill(interval, buffer, int(time.time() * 1000))
+            except Exception as e:
+                log.error("Backfill error (%s): %s", interval, e)
+
+    def _backfill(self, interval, buffer, until_ms):
+        """Докачивает ровно пропущенный диапазон времен открытия."""
+        if buffer.last_open_time is None:
+            return
+        start_ms = buffer.last_open_time + buffer.interval_ms
+        if start_ms >= until_ms:
+            return
+        added = buffer.add_rows(self.fetch(self.symbol, interval, start_ms, until_ms - 1))
+        if added:
+            self.backfilled += added
+            log.info("Backfilled %d %s candles", added, interval)
+
+    def _on_message(self, ws, message):
+        self.last_message = time.time()
+        try:
+            # Незакрытые обновления свечи (~каждые 2с): без on_tick отбрасываются без
+            # разбора JSON, с on_tick разбираются только интервал и цена
+            if not is_closed_kline(message):
+                if self.on_tick is not None:
+                    tick = decode_tick(message)
+                    if tick is not None and tick.i in self.buffers:
+                        self.on_tick(tick.i, tick.c)
+                return
+            k = decode_kline(message)
+            if k is not None:
+                self.handle_kline(k)
+        except Exception as e:
+            log.exception("WebSocket message error: %s", e)
+
+    def handle_kline(self, k):
+        buffer = self.buffers.get(k.i)
+        if buffer is None:
+            return
+        if not k.x:
+            if self.on_tick is not None:
+                self.on_tick(k.i, k.c)
+            return
+
+        with self.lock:
+            # Проверка последовательности: пропуск -> докачка, повтор/старое -> игнор
+            if buffer.missing_range(k.t):
+                self._backfill(k.i, buffer, k.t)
+            added = buffer.add_kline(k)
+        if added:
+            self.on_candle(k.i)
+
+    def _on_error(self, ws, error):
+        log.error("WebSocket error: %s", error)
+
+    def _on_close(self, ws, close_status_code, close_msg):
+        log.info("WebSocket closed")